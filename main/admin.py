@@ -194,12 +194,8 @@ class BlockHeightAdmin(admin.ModelAdmin):
 
     
     def process(self, request, queryset):
-        for trans in queryset:
-            pending_blocks = json.loads(REDIS_STORAGE.get('PENDING-BLOCKS'))
-            pending_blocks.append(trans.number)
-            pending_blocks = list(set(pending_blocks))
-            BlockHeight.objects.filter(number=trans.number).update(processed=False)
-            REDIS_STORAGE.set('PENDING-BLOCKS', json.dumps(pending_blocks))
+        # manage_blocks picks up blocks with processed=False
+        queryset.update(processed=False, requires_full_scan=True)
 
     def get_actions(self, request):
         actions = super().get_actions(request)
@@ -564,8 +560,8 @@ class WalletAdmin(DynamicRawIDMixin, admin.ModelAdmin):
                     
                     # Count caches before clearing
                     bch_balance_key = f'wallet:balance:bch:{wallet_hash}'
-                    token_balance_keys = cache.keys(f'wallet:balance:token:{wallet_hash}:*')
-                    history_keys = cache.keys(f'wallet:history:{wallet_hash}:*')
+                    token_balance_keys = list(cache.scan_iter(match=f'wallet:balance:token:{wallet_hash}:*'))
+                    history_keys = list(cache.scan_iter(match=f'wallet:history:{wallet_hash}:*'))
                     
                     bch_balance_exists = cache.exists(bch_balance_key)
                     token_balance_count = len(token_balance_keys) if token_balance_keys else 0
@@ -578,11 +574,15 @@ class WalletAdmin(DynamicRawIDMixin, admin.ModelAdmin):
                     clear_wallet_history_cache(wallet_hash, asset_key=None)
                     if pubkey_hex:
                         clear_last_active(pubkey_hex)
+                    # entries of older cache generations would otherwise stay until they expire
+                    stale_keys = token_balance_keys + history_keys
+                    if stale_keys:
+                        cache.delete(*stale_keys)
                     
                     # Verify caches were cleared
                     bch_balance_exists_after = cache.exists(bch_balance_key)
-                    token_balance_keys_after = cache.keys(f'wallet:balance:token:{wallet_hash}:*')
-                    history_keys_after = cache.keys(f'wallet:history:{wallet_hash}:*')
+                    token_balance_keys_after = list(cache.scan_iter(match=f'wallet:balance:token:{wallet_hash}:*'))
+                    history_keys_after = list(cache.scan_iter(match=f'wallet:history:{wallet_hash}:*'))
                     
                     token_balance_count_after = len(token_balance_keys_after) if token_balance_keys_after else 0
                     history_count_after = len(history_keys_after) if history_keys_after else 0
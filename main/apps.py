@@ -7,11 +7,11 @@ class MainConfig(AppConfig):
         import main.signals
         from main.tasks import REDIS_STORAGE, populate_token_addresses
 
-        # Restart block scanning upon re-deployment
+        # Pending blocks are tracked in the database (see main.utils.block_catchup),
+        # clean up the keys of the old redis based block queue
         REDIS_STORAGE.delete('PENDING-BLOCKS')
         REDIS_STORAGE.delete('ACTIVE-BLOCK')
+        REDIS_STORAGE.delete('READY')
         REDIS_STORAGE.delete('BITDBQUERY_COUNT')
-        REDIS_STORAGE.delete('BITDBQUERY_COUNT')
-        REDIS_STORAGE.set('READY', 1)
 
         populate_token_addresses.delay()
@@ -7,7 +7,10 @@
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from main.mqtt import publish_message
-from bitcash import transaction
+from main.tasks import register_block
+from main.utils.queries.bchn import BCHN
+from main.utils.subscribed_scripts import SubscribedScripts
+from main.utils.tx_decoder import calc_txid
 import logging
 import binascii
 import zmq
@@ -24,11 +27,29 @@ class ZMQHandler():
         self.zmqSubSocket = self.zmqContext.socket(zmq.SUB)
         self.zmqSubSocket.setsockopt_string(zmq.SUBSCRIBE, "rawtx")
         self.zmqSubSocket.setsockopt_string(zmq.SUBSCRIBE, "hashds")
+        if settings.BLOCK_ZMQ_NOTIFICATIONS:
+            self.zmqSubSocket.setsockopt_string(zmq.SUBSCRIBE, "hashblock")
         self.zmqSubSocket.setsockopt(zmq.TCP_KEEPALIVE,1)
         self.zmqSubSocket.setsockopt(zmq.TCP_KEEPALIVE_CNT,10)
         self.zmqSubSocket.setsockopt(zmq.TCP_KEEPALIVE_IDLE,1)
         self.zmqSubSocket.setsockopt(zmq.TCP_KEEPALIVE_INTVL,1)
         self.zmqSubSocket.connect(self.url)
+        self.bchn = BCHN()
+
+        self.subscribed_scripts = None
+        if settings.MEMPOOL_PREFILTER:
+            self.subscribed_scripts = SubscribedScripts()
+            self.subscribed_scripts.reload()
+
+    def handle_new_block(self, block_hash):
+        try:
+            number = self.bchn.get_block_header(block_hash)["height"]
+            obj, created = register_block(number)
+            if created:
+                LOGGER.info(f'New block {number} ({block_hash}) queued for scanning')
+        except Exception as exception:
+            # get_latest_block polling picks up the block if this fails
+            LOGGER.exception(exception)
 
     def start(self):
         try:
@@ -38,15 +59,32 @@ class ZMQHandler():
                 body = msg[1]
 
                 if topic == "rawtx":
+                    addresses = None
+                    if self.subscribed_scripts is not None:
+                        try:
+                            self.subscribed_scripts.maybe_refresh()
+                        except Exception as exception:
+                            # keep matching against the last loaded set
+                            LOGGER.exception(exception)
+                        addresses = self.subscribed_scripts.match(body)
+                        if not addresses:
+                            continue
+
                     tx_hex = binascii.hexlify(body).decode()
-                    txid = transaction.calc_txid(tx_hex)
+                    txid = calc_txid(tx_hex)
                     data = {
                         'txid': txid,
                         'tx_hex': tx_hex
                     }
+                    if addresses is not None:
+                        data['addresses'] = addresses
                     publish_message('mempool', data, qos=1, message_type='mempool', retain=False)
                     LOGGER.info('New mempool tx pushed to MQTT: ' + txid)
 
+                if topic == "hashblock":
+                    block_hash = binascii.hexlify(body).decode()
+                    self.handle_new_block(block_hash)
+
                 if topic == "hashds":
                     hash_ds = binascii.hexlify(body).decode()
                     LOGGER.info('New double spend detected: ' + str(hash_ds))
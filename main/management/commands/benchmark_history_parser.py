@@ -0,0 +1,98 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from main.models import Transaction
+from main.utils.wallet import HistoryParser
+
+
+class Command(BaseCommand):
+    help = "Compare the aggregated query of HistoryParser.parse with the per row ORM parse"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--txid',
+            type=str,
+            action='append',
+            help='Transaction to parse (can be repeated). Defaults to a sample of recent transactions.'
+        )
+        parser.add_argument(
+            '--wallet',
+            type=str,
+            help='Wallet hash to parse the transactions for. Defaults to the wallets of each transaction.'
+        )
+        parser.add_argument(
+            '--sample',
+            type=int,
+            default=50,
+            help='Number of transactions sampled when none is given (default: 50)'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=5,
+            help='Number of times each parse runs per transaction/wallet (default: 5)'
+        )
+
+    def get_pairs(self, txids, wallet_hash, size):
+        """
+        (txid, wallet_hash) pairs of the transactions with wallet outputs
+        """
+        outputs = Transaction.objects.filter(wallet__isnull=False)
+        if txids:
+            outputs = outputs.filter(txid__in=txids)
+        if wallet_hash:
+            outputs = outputs.filter(wallet__wallet_hash=wallet_hash)
+        else:
+            outputs = outputs.order_by('-id')
+
+        pairs = outputs.values_list('txid', 'wallet__wallet_hash')
+        if not txids:
+            pairs = pairs[:size * 20]
+        return list(dict.fromkeys(pairs))[:size if not txids else None]
+
+    def measure(self, function, iterations):
+        durations = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            result = function()
+            durations.append((time.perf_counter() - start) * 1000)
+        return result, durations
+
+    def handle(self, *args, **options):
+        pairs = self.get_pairs(options['txid'], options['wallet'], options['sample'])
+        if not pairs:
+            raise CommandError('No transaction with wallet outputs found')
+
+        self.stdout.write(f'{len(pairs)} transaction/wallet pair(s), {options["iterations"]} iteration(s)')
+
+        durations = { 'orm': [], 'aggregated': [] }
+        queries = { 'orm': 0, 'aggregated': 0 }
+        mismatches = []
+        for txid, wallet_hash in pairs:
+            parser = HistoryParser(txid, wallet_hash=wallet_hash)
+            results = {}
+            for label, function in (('orm', parser.parse_with_orm), ('aggregated', parser.parse)):
+                with CaptureQueriesContext(connection) as captured:
+                    results[label], _durations = self.measure(function, options['iterations'])
+                durations[label] += _durations
+                queries[label] += len(captured) // options['iterations']
+
+            if results['orm'] != results['aggregated']:
+                mismatches.append((txid, wallet_hash))
+
+        for label, _durations in durations.items():
+            _durations.sort()
+            p95 = _durations[min(len(_durations) - 1, int(len(_durations) * 0.95))]
+            self.stdout.write(
+                f'{label:<12} median {statistics.median(_durations):8.2f}ms  '
+                f'p95 {p95:8.2f}ms  max {_durations[-1]:8.2f}ms  '
+                f'queries {queries[label] / len(pairs):.1f}/parse'
+            )
+
+        self.stdout.write(f'mismatches: {len(mismatches)}')
+        for txid, wallet_hash in mismatches:
+            self.stdout.write(f'  {txid} {wallet_hash}')
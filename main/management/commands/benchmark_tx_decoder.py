@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.tasks import NODE
+from main.utils.tx_decoder import decode_raw_transaction
+
+
+class Command(BaseCommand):
+    help = "Compare main.utils.tx_decoder against the node's decoderawtransaction RPC (speed and output)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('txids', nargs='*', type=str)
+        parser.add_argument(
+            '--block',
+            type=int,
+            help='Use the transactions of this block instead of txids'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=200,
+            help='Max number of transactions to decode (default: 200)'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=5,
+            help='Number of times each decoder runs over the transactions (default: 5)'
+        )
+
+    def handle(self, *args, **options):
+        bchn = NODE.BCH
+        if options['block'] is not None:
+            txs = bchn.get_block(options['block'], verbosity=2)
+            tx_hexes = [tx['hex'] for tx in txs]
+        elif options['txids']:
+            tx_hexes = [bchn._get_raw_transaction(txid, verbosity=0) for txid in options['txids']]
+        else:
+            raise CommandError('Provide txids or --block')
+
+        tx_hexes = tx_hexes[:options['limit']]
+        iterations = options['iterations']
+        self.stdout.write(f'Decoding {len(tx_hexes)} transaction(s) x {iterations} iteration(s)')
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            local_results = [decode_raw_transaction(tx_hex) for tx_hex in tx_hexes]
+        local_duration = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            rpc_results = [bchn._decode_raw_transaction(tx_hex) for tx_hex in tx_hexes]
+        rpc_duration = time.perf_counter() - start
+
+        mismatches = 0
+        for local_tx, rpc_tx in zip(local_results, rpc_results):
+            rpc_outputs = [bchn._parse_output(tx_output) for tx_output in rpc_tx['vout']]
+            if local_tx['txid'] != rpc_tx['txid'] or local_tx['outputs'] != rpc_outputs:
+                mismatches += 1
+                self.stdout.write(self.style.WARNING(f'Mismatch: {rpc_tx["txid"]}'))
+
+        count = len(tx_hexes) * iterations
+        self.stdout.write(f'local: {local_duration:.4f}s ({local_duration / count * 1000000:.1f}us/tx)')
+        self.stdout.write(f'rpc:   {rpc_duration:.4f}s ({rpc_duration / count * 1000000:.1f}us/tx)')
+        if local_duration:
+            self.stdout.write(f'speedup: {rpc_duration / local_duration:.1f}x')
+
+        if mismatches:
+            self.stdout.write(self.style.ERROR(f'{mismatches} transaction(s) decoded differently'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All transactions decoded the same'))
@@ -0,0 +1,123 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from main.models import Transaction, Wallet
+from main.views.view_balance import _get_bch_balance
+from main.views.view_utxo import _get_bch_utxos, _get_ct_utxos
+
+UNSPENT_INDEXES = ('main_txn_unspent_address_idx', 'main_txn_unspent_wallet_idx')
+
+
+class Command(BaseCommand):
+    help = "Measure the latency of the UTXO endpoint queries on the unspent output indexes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--wallet',
+            type=str,
+            action='append',
+            help='Wallet hash to query (can be repeated). Defaults to a sample of wallets with UTXOs.'
+        )
+        parser.add_argument(
+            '--address',
+            type=str,
+            action='append',
+            help='Address to query (can be repeated). Defaults to a sample of addresses with UTXOs.'
+        )
+        parser.add_argument(
+            '--sample',
+            type=int,
+            default=20,
+            help='Number of wallets and addresses sampled when none is given (default: 20)'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=5,
+            help='Number of times each query runs per wallet/address (default: 5)'
+        )
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Print the EXPLAIN ANALYZE plan of each query for the first wallet/address'
+        )
+
+    def sample(self, field, size):
+        """
+        Distinct `field` values of the most recent unspent outputs
+        """
+        values = Transaction.objects.filter(
+            spent=False,
+            **{ f'{field}__isnull': False },
+        ).order_by('-id').values_list(field, flat=True)[:size * 20]
+        return list(dict.fromkeys(values))[:size]
+
+    def get_queries(self, wallet_hashes, addresses):
+        """
+        Returns { label: [callables] } and { kind: queryset to explain }
+        """
+        queries = {}
+        explain = {}
+        for wallet in Wallet.objects.filter(wallet_hash__in=wallet_hashes):
+            query = Q(wallet=wallet) & Q(spent=False)
+            queries.setdefault('wallet bch utxos', []).append(lambda query=query: list(_get_bch_utxos(query)))
+            queries.setdefault('wallet ct utxos', []).append(lambda query=query: list(_get_ct_utxos(query)))
+            queries.setdefault('wallet spendable', []).append(
+                lambda query=query: _get_bch_balance(query, exclude_dust=False)
+            )
+            explain.setdefault('wallet', _get_bch_utxos(query))
+
+        for address in addresses:
+            query = Q(address__address=address) & Q(spent=False)
+            queries.setdefault('address bch utxos', []).append(lambda query=query: list(_get_bch_utxos(query)))
+            queries.setdefault('address ct utxos', []).append(lambda query=query: list(_get_ct_utxos(query)))
+            queries.setdefault('address balance', []).append(lambda query=query: _get_bch_balance(query))
+            explain.setdefault('address', _get_bch_utxos(query))
+        return queries, explain
+
+    def handle(self, *args, **options):
+        wallet_hashes = options['wallet'] or []
+        addresses = options['address'] or []
+        if not wallet_hashes and not addresses:
+            wallet_hashes = self.sample('wallet__wallet_hash', options['sample'])
+            addresses = self.sample('address__address', options['sample'])
+
+        if not wallet_hashes and not addresses:
+            raise CommandError('No wallet or address with unspent outputs found')
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = 'main_transaction'")
+            estimated_rows = cursor.fetchone()[0]
+            cursor.execute(
+                "SELECT indexname FROM pg_indexes WHERE tablename = 'main_transaction' AND indexname IN %s",
+                [UNSPENT_INDEXES],
+            )
+            indexes = [row[0] for row in cursor.fetchall()]
+
+        self.stdout.write(f'main_transaction: ~{estimated_rows} rows')
+        self.stdout.write(f"unspent indexes: {', '.join(indexes) or 'none'}")
+        self.stdout.write(f'{len(wallet_hashes)} wallet(s), {len(addresses)} address(es), {options["iterations"]} iteration(s)')
+
+        queries, explain = self.get_queries(wallet_hashes, addresses)
+        if options['explain']:
+            for qs in explain.values():
+                self.stdout.write(qs.explain(analyze=True, buffers=True))
+
+        for label, functions in queries.items():
+            durations = []
+            for function in functions:
+                for _ in range(options['iterations']):
+                    start = time.perf_counter()
+                    function()
+                    durations.append((time.perf_counter() - start) * 1000)
+
+            durations.sort()
+            p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+            self.stdout.write(
+                f'{label:<20} median {statistics.median(durations):8.2f}ms  '
+                f'p95 {p95:8.2f}ms  max {durations[-1]:8.2f}ms'
+            )
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.utils.cache_codec import CODEC_STATS_KEY, get_codec_stats
+
+
+class Command(BaseCommand):
+    help = "Show the memory saved by the compact encoding of cached API responses (main.utils.cache_codec)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after showing them'
+        )
+
+    def handle(self, *args, **options):
+        stats = get_codec_stats()
+        raw_bytes = stats.get('raw_bytes', 0)
+        stored_bytes = stats.get('stored_bytes', 0)
+
+        self.stdout.write(f"entries written: {stats.get('entries', 0)} ({stats.get('compressed_entries', 0)} compressed)")
+        self.stdout.write(f'uncompressed: {raw_bytes} bytes')
+        self.stdout.write(f'stored: {stored_bytes} bytes')
+        if raw_bytes:
+            ratio = stored_bytes / raw_bytes
+            self.stdout.write(self.style.SUCCESS(
+                f"saved: {stats['saved_bytes']} bytes ({(1 - ratio) * 100:.1f}%, ratio {ratio:.2f})"
+            ))
+
+        if options['reset']:
+            settings.REDISKV.delete(CODEC_STATS_KEY)
@@ -9,16 +9,16 @@ class Command(BaseCommand):
 
         # delete balance caches
         cache = settings.REDISKV
-        balance_keys = cache.keys(f'wallet:balance:*')
+        balance_keys = list(cache.scan_iter(match='wallet:balance:*'))
         if balance_keys:
             cache.delete(*balance_keys)
 
         # delete wallet history caches
-        history_cache_keys = cache.keys(f'wallet:history:*')
+        history_cache_keys = list(cache.scan_iter(match='wallet:history:*'))
         if history_cache_keys:
             cache.delete(*history_cache_keys)
 
         # delete last active caches
-        last_active_keys = cache.keys(f'last_active:*')
+        last_active_keys = list(cache.scan_iter(match='last_active:*'))
         if last_active_keys:
             cache.delete(*last_active_keys)
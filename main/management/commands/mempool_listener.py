@@ -12,7 +12,7 @@ from main.tasks import (
     process_mempool_transaction_fast,
     process_mempool_transaction_throttled
 )
-from main.utils.queries.bchn import BCHN
+from main.utils.tx_decoder import decode_raw_transaction
 from main.utils.redis_address_manager import BCHAddressManager
 
 
@@ -40,22 +40,9 @@ def on_connect(client, userdata, flags, rc):
 
 
 def _addresses_subscribed(tx_hex):
-    bchn = BCHN()
     subscribed = False
-    tx_addresses = []
-    tx = bchn._decode_raw_transaction(tx_hex)
-    for tx_in in tx['vin']:
-        if 'address' in tx_in.keys():
-            tx_addresses.append(tx_in['address'])
-    for tx_out in tx['vout']:
-        scriptPubKey = tx_out.get('scriptPubKey', {})
-        _addrs = scriptPubKey.get('addresses')
-        if _addrs:
-            tx_addresses += _addrs
-        else:
-            _addr = scriptPubKey.get('address')
-            if _addr:
-                tx_addresses.append(_addr)
+    tx = decode_raw_transaction(tx_hex)
+    tx_addresses = [tx_out['address'] for tx_out in tx['outputs'] if 'address' in tx_out]
     
     # Check Redis for actively-listening addresses first (fastest)
     if BCHAddressManager.is_any_address_active(tx_addresses):
@@ -80,7 +67,11 @@ def on_message(client, userdata, msg):
             subscribed = False
             if 'tx_hex' in payload.keys():
                 tx_hex = payload['tx_hex']
-                subscribed = _addresses_subscribed(tx_hex)
+                if 'addresses' in payload.keys():
+                    # already matched against subscribed addresses by bchn_zmq_listener
+                    subscribed = bool(payload['addresses'])
+                else:
+                    subscribed = _addresses_subscribed(tx_hex)
             if subscribed:
                 process_mempool_transaction_fast.delay(txid, tx_hex, True)
             else:
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.utils.queries.raw_tx_cache import RAW_TX_STATS_KEY, get_raw_tx_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show the hit ratio of the raw transaction cache (main.utils.queries.raw_tx_cache)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after showing them'
+        )
+
+    def handle(self, *args, **options):
+        stats = get_raw_tx_cache_stats()
+        lookups = stats['lookups']
+
+        self.stdout.write(f'lookups: {lookups}')
+        for field in ('local_hits', 'redis_hits', 'misses'):
+            share = f" ({stats[field] / lookups * 100:.1f}%)" if lookups else ''
+            self.stdout.write(f"{field.replace('_', ' ')}: {stats[field]}{share}")
+        if lookups:
+            self.stdout.write(self.style.SUCCESS(f"hit ratio: {stats['hit_ratio']:.2f}"))
+
+        if options['reset']:
+            settings.REDISKV.delete(RAW_TX_STATS_KEY)
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Wallet
+from main.utils.wallet_balance import reconcile_wallet_balances
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the WalletBalance ledger from unspent Transaction rows where it differs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--wallet',
+            type=str,
+            action='append',
+            help='Only reconcile this wallet hash (can be repeated). Defaults to all wallets.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the wallets whose ledger differs without fixing them',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of wallets reconciled per DB transaction (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+        batch_size = options.get('batch_size', 500)
+
+        queryset = Wallet.objects.order_by('id')
+        if options.get('wallet'):
+            queryset = queryset.filter(wallet_hash__in=options['wallet'])
+
+        wallet_ids = list(queryset.values_list('id', flat=True))
+        self.stdout.write(f"Reconciling the balance ledger of {len(wallet_ids)} wallet(s)")
+
+        mismatched = []
+        for i in range(0, len(wallet_ids), batch_size):
+            mismatched += reconcile_wallet_balances(wallet_ids[i:i + batch_size], fix=not dry_run)
+            self.stdout.write(f"  {min(i + batch_size, len(wallet_ids))}/{len(wallet_ids)} wallets checked")
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS('Ledger matches the transactions'))
+            return
+
+        wallet_hashes = Wallet.objects.filter(id__in=mismatched).values_list('wallet_hash', flat=True)
+        for wallet_hash in wallet_hashes:
+            self.stdout.write(f"  {wallet_hash}")
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f"{len(mismatched)} wallet(s) differ (dry run, nothing changed)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt the ledger of {len(mismatched)} wallet(s)"))
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.utils.task_dedupe import DEDUPE_STATS_KEY, get_dedupe_stats
+
+
+class Command(BaseCommand):
+    help = "Show the queued and deduplicated requests of the deduplicated tasks (main.utils.task_dedupe)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after showing them'
+        )
+
+    def handle(self, *args, **options):
+        stats = get_dedupe_stats()
+        if not stats:
+            self.stdout.write('no deduplicated task requests yet')
+
+        for task_name, counters in sorted(stats.items()):
+            requested = counters['queued'] + counters['deduplicated']
+            share = f" ({counters['deduplicated'] / requested * 100:.1f}%)" if requested else ''
+            self.stdout.write(
+                f"{task_name}: requested {requested}, queued {counters['queued']}, "
+                f"deduplicated {counters['deduplicated']}{share}"
+            )
+
+        if options['reset']:
+            settings.REDISKV.delete(DEDUPE_STATS_KEY)
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0130_remove_walletactivity_amount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='address',
+            name='scripthash_status',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
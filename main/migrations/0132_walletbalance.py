@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+# Asset of an unspent output, rows without one (walletless, NFT only cashtoken outputs) are not counted
+ASSET_SQL = """
+    CASE
+        WHEN txn.cashtoken_ft_id IS NOT NULL THEN 'ct/' || txn.cashtoken_ft_id
+        WHEN lower(token.name) = 'bch' THEN 'bch'
+        ELSE 'slp/' || token.tokenid
+    END
+"""
+
+COUNTED_SQL = f"""
+    txn.wallet_id IS NOT NULL AND NOT txn.spent AND (
+        txn.cashtoken_ft_id IS NOT NULL OR
+        lower(token.name) = 'bch' OR
+        token.tokenid NOT IN ('', '{settings.WT_DEFAULT_CASHTOKEN_ID}')
+    )
+"""
+
+# Adds the signed contributions of `rows` (sign, transaction columns) to the balances,
+# in (wallet, asset) order so concurrent writers lock the balance rows in the same order
+APPLY_DELTAS_SQL = f"""
+    INSERT INTO main_walletbalance (wallet_id, asset, value, amount, utxo_count, date_updated)
+    SELECT
+        txn.wallet_id,
+        {ASSET_SQL} AS asset,
+        SUM(txn.sign * txn.value),
+        SUM(txn.sign * COALESCE(txn.amount, 0)),
+        SUM(txn.sign),
+        now()
+    FROM ({{rows}}) AS txn
+    JOIN main_token AS token ON token.id = txn.token_id
+    WHERE {COUNTED_SQL}
+    GROUP BY txn.wallet_id, asset
+    HAVING SUM(txn.sign * txn.value) <> 0 OR SUM(txn.sign * COALESCE(txn.amount, 0)) <> 0 OR SUM(txn.sign) <> 0
+    ORDER BY txn.wallet_id, asset
+    ON CONFLICT (wallet_id, asset) DO UPDATE SET
+        value = main_walletbalance.value + EXCLUDED.value,
+        amount = main_walletbalance.amount + EXCLUDED.amount,
+        utxo_count = main_walletbalance.utxo_count + EXCLUDED.utxo_count,
+        date_updated = EXCLUDED.date_updated;
+"""
+
+NEW_ROWS = "SELECT 1 AS sign, * FROM new_rows"
+OLD_ROWS = "SELECT -1 AS sign, * FROM old_rows"
+
+CREATE_TRIGGERS_SQL = f"""
+    CREATE OR REPLACE FUNCTION main_walletbalance_sync() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            {APPLY_DELTAS_SQL.format(rows=NEW_ROWS)}
+        ELSIF TG_OP = 'UPDATE' THEN
+            {APPLY_DELTAS_SQL.format(rows=OLD_ROWS + " UNION ALL " + NEW_ROWS)}
+        ELSE
+            {APPLY_DELTAS_SQL.format(rows=OLD_ROWS)}
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER main_walletbalance_insert
+        AFTER INSERT ON main_transaction
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE main_walletbalance_sync();
+
+    CREATE TRIGGER main_walletbalance_update
+        AFTER UPDATE ON main_transaction
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE main_walletbalance_sync();
+
+    CREATE TRIGGER main_walletbalance_delete
+        AFTER DELETE ON main_transaction
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE main_walletbalance_sync();
+"""
+
+DROP_TRIGGERS_SQL = """
+    DROP TRIGGER IF EXISTS main_walletbalance_insert ON main_transaction;
+    DROP TRIGGER IF EXISTS main_walletbalance_update ON main_transaction;
+    DROP TRIGGER IF EXISTS main_walletbalance_delete ON main_transaction;
+    DROP FUNCTION IF EXISTS main_walletbalance_sync();
+"""
+
+# Writes to main_transaction wait until the backfill commits, so none is missed
+BACKFILL_SQL = "LOCK TABLE main_transaction IN SHARE MODE;" + APPLY_DELTAS_SQL.format(
+    rows="SELECT 1 AS sign, * FROM main_transaction WHERE wallet_id IS NOT NULL AND NOT spent"
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0131_address_scripthash_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletBalance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asset', models.CharField(max_length=110)),
+                ('value', models.BigIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=0, default=0, max_digits=78)),
+                ('utxo_count', models.IntegerField(default=0)),
+                ('date_updated', models.DateTimeField(default=django.utils.timezone.now)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='main.Wallet')),
+            ],
+            options={
+                'unique_together': {('wallet', 'asset')},
+            },
+        ),
+        migrations.RunSQL(sql=CREATE_TRIGGERS_SQL, reverse_sql=DROP_TRIGGERS_SQL),
+        migrations.RunSQL(sql=BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,35 @@
+# Partial covering indexes over the unspent outputs (the hot UTXO set), so the UTXO
+# and balance endpoints don't scan the outputs of the whole transaction history.
+# Postgres keeps them in sync with `spent` on every write, rows leave them when spent.
+
+from django.db import migrations
+
+UNSPENT_INDEX_INCLUDE = "txid, index, value, amount, token_id, cashtoken_ft_id, cashtoken_nft_id, blockheight_id"
+
+
+class Migration(migrations.Migration):
+    # Disable atomic to allow CONCURRENTLY index creation
+    atomic = False
+
+    dependencies = [
+        ('main', '0132_walletbalance'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS main_txn_unspent_address_idx
+            ON main_transaction (address_id) INCLUDE ({UNSPENT_INDEX_INCLUDE})
+            WHERE spent = false;
+            """,
+            reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS main_txn_unspent_address_idx;",
+        ),
+        migrations.RunSQL(
+            sql=f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS main_txn_unspent_wallet_idx
+            ON main_transaction (wallet_id) INCLUDE ({UNSPENT_INDEX_INCLUDE})
+            WHERE spent = false AND wallet_id IS NOT NULL;
+            """,
+            reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS main_txn_unspent_wallet_idx;",
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Index of the keyset pagination of wallet history (main.utils.history_pagination).
+# wallet_history_wallet_time_idx sorts null timestamps first and has no unique tie-break,
+# so the (tx_timestamp desc nulls last, date_created desc, id desc) seek can't stop early on it.
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Disable atomic to allow CONCURRENTLY index creation
+    atomic = False
+
+    dependencies = [
+        ('main', '0133_transaction_unspent_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS wallet_history_wallet_seek_idx
+            ON main_wallethistory (
+                wallet_id,
+                (COALESCE(tx_timestamp, '-infinity'::timestamptz)) DESC,
+                date_created DESC,
+                id DESC
+            )
+            WHERE wallet_id IS NOT NULL;
+            """,
+            reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS wallet_history_wallet_seek_idx;",
+        ),
+    ]
@@ -0,0 +1,117 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+# Rows of a statement's transition tables as (wallet_id, id, key, deleted),
+# moving a row to another wallet is a deletion for the previous one
+INSERT_ROWS = "SELECT wallet_id, id, {key} AS key, false AS deleted FROM new_rows AS rec WHERE wallet_id IS NOT NULL"
+DELETE_ROWS = "SELECT wallet_id, id, {key} AS key, true AS deleted FROM old_rows AS rec WHERE wallet_id IS NOT NULL"
+UPDATE_ROWS = INSERT_ROWS + """
+    UNION ALL
+    SELECT rec.wallet_id, rec.id, {key}, true FROM old_rows AS rec
+    JOIN new_rows ON new_rows.id = rec.id
+    WHERE rec.wallet_id IS NOT NULL AND rec.wallet_id IS DISTINCT FROM new_rows.wallet_id
+"""
+
+# Bumps the sequence of each changed wallet once, in wallet order so concurrent writers
+# lock the sequence rows in the same order, and logs the rows under it
+LOG_CHANGES_SQL = """
+    WITH changed AS ({rows}),
+    bumped AS (
+        INSERT INTO main_walletchangesequence (wallet_id, sequence, pruned_sequence)
+        SELECT DISTINCT wallet_id, 1, 0 FROM changed
+        ORDER BY wallet_id
+        ON CONFLICT (wallet_id) DO UPDATE SET sequence = main_walletchangesequence.sequence + 1
+        RETURNING wallet_id, sequence
+    )
+    INSERT INTO main_walletchange (wallet_id, sequence, kind, object_id, key, deleted, date_created)
+    SELECT changed.wallet_id, bumped.sequence, '{kind}', changed.id, changed.key, changed.deleted, now()
+    FROM changed JOIN bumped ON bumped.wallet_id = changed.wallet_id;
+"""
+
+TABLES = (
+    # table, kind, key
+    ('main_transaction', 'transaction', "rec.txid || ':' || rec.index"),
+    ('main_wallethistory', 'history', "rec.txid"),
+)
+
+
+def create_triggers_sql(table, kind, key):
+    log_changes = lambda rows: LOG_CHANGES_SQL.format(rows=rows.format(key=key), kind=kind)
+    return f"""
+    CREATE OR REPLACE FUNCTION {table}_log_wallet_changes() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            {log_changes(INSERT_ROWS)}
+        ELSIF TG_OP = 'UPDATE' THEN
+            {log_changes(UPDATE_ROWS)}
+        ELSE
+            {log_changes(DELETE_ROWS)}
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER {table}_wallet_changes_insert
+        AFTER INSERT ON {table}
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE {table}_log_wallet_changes();
+
+    CREATE TRIGGER {table}_wallet_changes_update
+        AFTER UPDATE ON {table}
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE {table}_log_wallet_changes();
+
+    CREATE TRIGGER {table}_wallet_changes_delete
+        AFTER DELETE ON {table}
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE {table}_log_wallet_changes();
+    """
+
+
+def drop_triggers_sql(table, kind, key):
+    return f"""
+    DROP TRIGGER IF EXISTS {table}_wallet_changes_insert ON {table};
+    DROP TRIGGER IF EXISTS {table}_wallet_changes_update ON {table};
+    DROP TRIGGER IF EXISTS {table}_wallet_changes_delete ON {table};
+    DROP FUNCTION IF EXISTS {table}_log_wallet_changes();
+    """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0134_wallet_history_seek_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletChangeSequence',
+            fields=[
+                ('wallet', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='change_sequence', serialize=False, to='main.Wallet')),
+                ('sequence', models.BigIntegerField(default=0)),
+                ('pruned_sequence', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WalletChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.BigIntegerField()),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('key', models.CharField(max_length=80)),
+                ('deleted', models.BooleanField(default=False)),
+                ('date_created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('wallet', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='main.Wallet')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='walletchange',
+            index=models.Index(fields=['wallet', 'sequence'], name='wallet_change_sequence_idx'),
+        ),
+    ] + [
+        migrations.RunSQL(sql=create_triggers_sql(*table), reverse_sql=drop_triggers_sql(*table))
+        for table in TABLES
+    ]
@@ -0,0 +1,96 @@
+from importlib import import_module
+
+from django.db import migrations
+
+walletbalance = import_module('main.migrations.0132_walletbalance')
+
+
+# Asset of an unspent output, rows without one (walletless, NFT only cashtoken outputs) are not counted
+ASSET_SQL = """
+    CASE
+        WHEN txn.cashtoken_ft_id IS NOT NULL THEN 'ct/' || txn.cashtoken_ft_id
+        WHEN lower(token.name) = 'bch' THEN 'bch'
+        ELSE 'slp/' || token.tokenid
+    END
+"""
+
+# NFT only cashtoken outputs are told apart by their own columns instead of the cashtoken
+# token id, the triggers no longer depend on WT_DEFAULT_CASHTOKEN_ID at migration time
+COUNTED_SQL = """
+    txn.wallet_id IS NOT NULL AND NOT txn.spent AND (
+        txn.cashtoken_ft_id IS NOT NULL OR
+        lower(token.name) = 'bch' OR
+        (txn.cashtoken_nft_id IS NULL AND token.tokenid <> '')
+    )
+"""
+
+# Adds the signed contributions of `rows` (sign, transaction columns) to the balances,
+# in (wallet, asset) order so concurrent writers lock the balance rows in the same order
+APPLY_DELTAS_SQL = f"""
+    INSERT INTO main_walletbalance (wallet_id, asset, value, amount, utxo_count, date_updated)
+    SELECT
+        txn.wallet_id,
+        {ASSET_SQL} AS asset,
+        SUM(txn.sign * txn.value),
+        SUM(txn.sign * COALESCE(txn.amount, 0)),
+        SUM(txn.sign),
+        now()
+    FROM ({{rows}}) AS txn
+    JOIN main_token AS token ON token.id = txn.token_id
+    WHERE {COUNTED_SQL}
+    GROUP BY txn.wallet_id, asset
+    HAVING SUM(txn.sign * txn.value) <> 0 OR SUM(txn.sign * COALESCE(txn.amount, 0)) <> 0 OR SUM(txn.sign) <> 0
+    ORDER BY txn.wallet_id, asset
+    ON CONFLICT (wallet_id, asset) DO UPDATE SET
+        value = main_walletbalance.value + EXCLUDED.value,
+        amount = main_walletbalance.amount + EXCLUDED.amount,
+        utxo_count = main_walletbalance.utxo_count + EXCLUDED.utxo_count,
+        date_updated = EXCLUDED.date_updated;
+"""
+
+NEW_ROWS = "SELECT 1 AS sign, * FROM new_rows"
+OLD_ROWS = "SELECT -1 AS sign, * FROM old_rows"
+
+CREATE_TRIGGERS_SQL = f"""
+    CREATE OR REPLACE FUNCTION main_walletbalance_sync() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            {APPLY_DELTAS_SQL.format(rows=NEW_ROWS)}
+        ELSIF TG_OP = 'UPDATE' THEN
+            {APPLY_DELTAS_SQL.format(rows=OLD_ROWS + " UNION ALL " + NEW_ROWS)}
+        ELSE
+            {APPLY_DELTAS_SQL.format(rows=OLD_ROWS)}
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER main_walletbalance_insert
+        AFTER INSERT ON main_transaction
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE main_walletbalance_sync();
+
+    CREATE TRIGGER main_walletbalance_update
+        AFTER UPDATE ON main_transaction
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE main_walletbalance_sync();
+
+    CREATE TRIGGER main_walletbalance_delete
+        AFTER DELETE ON main_transaction
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE main_walletbalance_sync();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0135_walletchange'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=walletbalance.DROP_TRIGGERS_SQL + CREATE_TRIGGERS_SQL,
+            reverse_sql=walletbalance.DROP_TRIGGERS_SQL + walletbalance.CREATE_TRIGGERS_SQL,
+        ),
+    ]
@@ -223,6 +223,8 @@ class Address(PostgresModel):
     address_path = models.CharField(max_length=15, db_index=True)
     advance_subscription = models.BooleanField(default=False, db_index=True)
     date_created = models.DateTimeField(default=timezone.now)
+    # Electrum status hash of the address history as of its last utxo scan, see `rescan_utxos`
+    scripthash_status = models.CharField(max_length=64, null=True, blank=True)
 
     class Meta:
         verbose_name = 'Address'
@@ -1243,4 +1245,93 @@ class WalletActivity(PostgresModel):
         ]
 
     def __str__(self):
-        return f"{self.kind} {self.wallet.wallet_hash[:16]}... on {self.activity_date}"
\ No newline at end of file
+        return f"{self.kind} {self.wallet.wallet_hash[:16]}... on {self.activity_date}"
+
+class WalletBalance(PostgresModel):
+    """
+    Unspent balance of a wallet per asset, maintained by triggers on the transaction
+    table in the same DB transaction that creates or spends the outputs (migration 0136).
+    Rebuilt from Transaction by the `reconcile_wallet_balances` command.
+    """
+    ASSET_BCH = 'bch'
+
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.CASCADE,
+        related_name='balances',
+    )
+    # 'bch', 'ct/<category>' for fungible cashtokens or 'slp/<tokenid>'
+    asset = models.CharField(max_length=110)
+    # satoshis of the unspent outputs, token amounts can exceed a bigint once summed
+    value = models.BigIntegerField(default=0)
+    amount = models.DecimalField(max_digits=78, decimal_places=0, default=0)
+    utxo_count = models.IntegerField(default=0)
+    date_updated = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('wallet', 'asset')
+
+    @classmethod
+    def cashtoken_asset(cls, category):
+        return f'ct/{category}'
+
+    @classmethod
+    def slp_asset(cls, tokenid):
+        return f'slp/{tokenid}'
+
+    def __str__(self):
+        return f"{self.wallet_id} {self.asset}"
+
+
+class WalletChangeSequence(PostgresModel):
+    """
+    Change sequence of a wallet, bumped once per statement that writes its Transaction or
+    WalletHistory rows by triggers (migration 0135). Writers hold the row lock until commit,
+    so sequences of a wallet become visible in order.
+    """
+    # no FK constraint, rows of a wallet being deleted are still written while it cascades
+    wallet = models.OneToOneField(
+        Wallet,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='change_sequence',
+        db_constraint=False,
+    )
+    sequence = models.BigIntegerField(default=0)
+    # changes up to this sequence were pruned, clients behind it have to resync
+    pruned_sequence = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.wallet_id} {self.sequence}"
+
+
+class WalletChange(PostgresModel):
+    """
+    Feed of the Transaction and WalletHistory rows written per wallet change sequence,
+    read by the wallet changes endpoint and pruned after WALLET_CHANGE_RETENTION_DAYS.
+    """
+    KIND_TRANSACTION = 'transaction'
+    KIND_HISTORY = 'history'
+
+    wallet = models.ForeignKey(
+        Wallet,
+        on_delete=models.CASCADE,
+        related_name='changes',
+        db_constraint=False,
+    )
+    sequence = models.BigIntegerField()
+    kind = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    # 'txid:index' of transactions, txid of history records, kept for deleted rows
+    key = models.CharField(max_length=80)
+    # the row was deleted or moved out of the wallet
+    deleted = models.BooleanField(default=False)
+    date_created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', 'sequence'], name='wallet_change_sequence_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet_id} {self.sequence} {self.kind} {self.key}"
@@ -1,13 +1,109 @@
+import json
 from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connections
 from rest_framework import pagination, response
+from rest_framework.utils.urls import replace_query_param
+
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATE = 'estimate'
+COUNT_NONE = 'none'
+COUNT_MODES = (COUNT_EXACT, COUNT_ESTIMATE, COUNT_NONE)
+
+
+def get_planner_estimate(queryset):
+    """
+    Row count estimate of the planner for `queryset`, without running it
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimate_count(queryset, exact_limit):
+    """
+    Returns (count, is_exact)
+    Counts exactly up to `exact_limit` rows, larger results get the planner's estimate
+    """
+    capped_count = queryset.order_by()[:exact_limit].count()
+    if capped_count < exact_limit:
+        return capped_count, True
+    return max(get_planner_estimate(queryset), exact_limit), False
+
 
 class CustomLimitOffsetPagination(pagination.LimitOffsetPagination):
+    """
+    The `count_mode` query param (or the view's `pagination_count_mode`) selects the count of the response:
+        exact: COUNT(*) of the whole result
+        estimate: exact below PAGINATION_EXACT_COUNT_LIMIT rows, the planner's estimate above
+        none: no count, `next` tells whether there are more results
+    `count_exact` of the response says whether `count` is exact.
+    """
     default_limit = 10
     max_limit = 50
+    count_mode_query_param = 'count_mode'
+    default_count_mode = COUNT_EXACT
+
+    def get_count_mode(self, request, view=None):
+        count_mode = request.query_params.get(self.count_mode_query_param)
+        if count_mode in COUNT_MODES:
+            return count_mode
+        return getattr(view, 'pagination_count_mode', self.default_count_mode)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_mode = self.get_count_mode(request, view)
+        self.has_more = None
+        if self.count_mode == COUNT_EXACT or not hasattr(queryset, 'query'):
+            self.count_mode = COUNT_EXACT
+            self.count_exact = True
+            return super().paginate_queryset(queryset, request, view=view)
+
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.offset = self.get_offset(request)
+        self.request = request
+
+        # one more row than the page tells whether there is a next page, in place of the count
+        results = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_more = len(results) > self.limit
+        results = results[:self.limit]
+
+        self.count = None
+        self.count_exact = False
+        if self.count_mode == COUNT_ESTIMATE:
+            if not self.has_more and (results or not self.offset):
+                self.count, self.count_exact = self.offset + len(results), True
+            else:
+                self.count, self.count_exact = estimate_count(queryset, settings.PAGINATION_EXACT_COUNT_LIMIT)
+                if not self.count_exact:
+                    # the estimate can't be less than the rows seen
+                    self.count = max(self.count, self.offset + len(results) + int(self.has_more))
+
+        if self.count is not None and self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+        return results
+
+    def get_next_link(self):
+        if self.has_more is None:
+            return super().get_next_link()
+        if not self.has_more:
+            return None
+
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
 
     def get_paginated_response(self, data):
         return response.Response(OrderedDict([
             ('count', self.count),
+            ('count_exact', self.count_exact),
             ('limit', self.limit),
             ('offset', self.offset),
             ('next', self.get_next_link()),
@@ -22,6 +118,11 @@ class CustomLimitOffsetPagination(pagination.LimitOffsetPagination):
                 'count': {
                     'type': 'integer',
                     'example': 123,
+                    'nullable': True,
+                },
+                'count_exact': {
+                    'type': 'boolean',
+                    'example': True,
                 },
                 'limit': {
                     'type': 'integer',
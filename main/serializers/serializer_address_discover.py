@@ -16,7 +16,17 @@ class AddressDiscoverSetSerializer(serializers.Serializer):
 class WalletAddressDiscoverSerializer(serializers.Serializer):
     wallet_hash = serializers.CharField(max_length=200)
     project_id = serializers.CharField(max_length=200, required=False, allow_blank=True)
-    address_sets = AddressDiscoverSetSerializer(many=True)
+    address_sets = AddressDiscoverSetSerializer(many=True, required=False)
+    xpubkey = serializers.CharField(max_length=200, required=False)
+    gap_limit = serializers.IntegerField(min_value=1, max_value=1000, required=False)
+    start_index = serializers.IntegerField(min_value=0, default=0)
+
+    def validate(self, data):
+        if 'address_sets' not in data and not data.get('xpubkey'):
+            raise serializers.ValidationError(
+                "You must provide at least one of 'address_sets' or 'xpubkey'."
+            )
+        return data
 
 
 class AddressDiscoverResultSerializer(serializers.Serializer):
@@ -27,3 +37,5 @@ class AddressDiscoverResultSerializer(serializers.Serializer):
 
 class WalletAddressDiscoverResponseSerializer(serializers.Serializer):
     results = AddressDiscoverResultSerializer(many=True)
+    last_used_index = serializers.IntegerField(allow_null=True)
+    truncated = serializers.BooleanField()
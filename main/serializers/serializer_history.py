@@ -43,4 +43,6 @@ class PaginatedWalletHistorySerializer(serializers.Serializer):
     page_size = serializers.IntegerField()
     num_pages = serializers.IntegerField()
     has_next = serializers.BooleanField()    
+    next = serializers.CharField(required=False, allow_null=True)
+    count = serializers.IntegerField(required=False)
     history = WalletHistorySerializer(many=True)
@@ -1,13 +1,11 @@
 import logging
 from django.conf import settings
-from django.db import transaction
 from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
 from rest_framework.authtoken.models import Token
 from django.utils import timezone
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-from main.utils.redis_block_setter import *
 from main.utils.logging import log_signal_activity
 from main.models import (
     BlockHeight,
@@ -20,12 +18,9 @@ from main.models import (
     TransactionBroadcast,
     WalletActivity,
 )
-from main.tasks import (
-    transaction_post_save_task,
-    update_wallet_history_currency,
-)
+from main.tasks import update_wallet_history_currency
 from main.utils.cache import clear_wallet_history_cache, clear_wallet_balance_cache
-from main.utils.address_validator import is_bch_address
+from main.utils.cache_buffer import get_invalidation_buffer, schedule_flush
 from main.utils.wallet_activity import activity_kind_for_history
 
 
@@ -62,18 +57,8 @@ def blockheight_post_save(sender, instance=None, created=False, **kwargs):
             if instance.currentcount == instance.transactions_count:
                 BlockHeight.objects.filter(id=instance.id).update(processed=True, updated_datetime=timezone.now())
 
-    if created:
-        
-        # Make sure there are no missed blocks
-        # last_processed_block = BlockHeight.objects.filter(processed=True).last().number
-        # latest_block = BlockHeight.objects.last().number
-        
-        # for i in range(last_processed_block, latest_block):
-        #     obj, created = BlockHeight.objects.get_or_create(number=i)
-
-        # Queue to "PENDING-BLOCKS"
-        if instance.requires_full_scan:                
-            block_setter(instance.number)
+    # New blocks are picked up by manage_blocks through processed=False,
+    # see main.utils.block_catchup
         
 
 @receiver(post_save, sender=Transaction, dispatch_uid='main.tasks.transaction_post_save_task')
@@ -84,24 +69,17 @@ def transaction_post_save(sender, instance=None, created=False, **kwargs):
     if instance.blockheight:
         blockheight_id = instance.blockheight.id
 
+    # Invalidations and the post-save task are coalesced per DB transaction, see main.utils.cache_buffer
+    buffer = get_invalidation_buffer()
+
     # Invalidate address-based balance cache when a new transaction is saved or when marked as spent
     if instance.address:
-        cache = settings.REDISKV
-        # Invalidate both variants of the cache key (with and without include_token_sats)
-        if is_bch_address(address):
-            cache_key_false = f'address:balance:bch:{address}:False'
-            cache_key_true = f'address:balance:bch:{address}:True'
-            cache.delete(cache_key_false)
-            cache.delete(cache_key_true)
+        buffer.add_address_balance(address)
 
+    wallet_hash = None
     if instance.address.wallet:
         wallet_hash = instance.address.wallet.wallet_hash
 
-        # delete cached bch balance
-        cache = settings.REDISKV
-        bch_cache_key = f'wallet:balance:bch:{wallet_hash}'
-        cache.delete(bch_cache_key)
-
         # delete cached token balance
         category = None
         if instance.cashtoken_ft:
@@ -111,20 +89,16 @@ def transaction_post_save(sender, instance=None, created=False, **kwargs):
             spent_tx = Transaction.objects.filter(txid=instance.txid, index=instance.index).first()
             if spent_tx and spent_tx.cashtoken_ft:
                 category = spent_tx.cashtoken_ft.category
-        if category:
-            ct_cache_key = f'wallet:balance:token:{wallet_hash}:{category}'
-            cache.delete(ct_cache_key)
+
+        # delete cached bch and token balance
+        buffer.add_wallet_balance(wallet_hash, [category])
 
         # delete cached wallet history
-        asset_key = category or 'bch'
-        history_cache_keys = cache.keys(f'wallet:history:{wallet_hash}:{asset_key}:*')
-        if history_cache_keys:
-            cache.delete(*history_cache_keys)
+        buffer.add_wallet_history(wallet_hash, asset_key=category or 'bch')
 
     # Trigger the transaction post-save task
-    transaction.on_commit(
-        lambda: transaction_post_save_task.delay(address, instance.id, blockheight_id)
-    )
+    buffer.add_post_save_task(instance.txid, address, instance.id, blockheight_id, wallet_hash=wallet_hash)
+    schedule_flush()
 
 
 @receiver(pre_delete, sender=Transaction, dispatch_uid='main.signals.transaction_pre_delete')
@@ -260,4 +234,5 @@ def wallet_history_post_save(sender, instance=None, created=False, **kwargs):
                     asset_key = instance.token.info_id if instance.token.info_id else None
             
             # Clear cache for the specific asset, or all if asset_key is None
-            clear_wallet_history_cache(instance.wallet.wallet_hash, asset_key)
+            get_invalidation_buffer().add_wallet_history(instance.wallet.wallet_hash, asset_key)
+            schedule_flush()
@@ -2,6 +2,7 @@ import logging, json, requests
 from main.utils.webhook import send_webhook
 import pytz, time
 import math
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from datetime import datetime
 from urllib.parse import urlparse
@@ -33,9 +34,11 @@ from main.utils.nft import (
     find_minting_baton,
 )
 from main.utils.address_converter import bch_address_converter
+from main.utils import cashaddr
 from main.utils.address_scan import get_bch_transactions
 from main.utils.address_validator import is_bch_address
 from main.utils.wallet import HistoryParser
+from main.utils.history_builder import WalletHistoryBuilder, merge_build_requests, process_history_recpts_or_senders
 from main.utils.push_notification import (
     send_wallet_history_push_notification,
     send_wallet_history_push_notification_nft
@@ -47,6 +50,8 @@ from django.utils import timezone, dateparse
 from django.db import transaction as trans, connection
 from celery.exceptions import TimeoutError
 from main.utils.chunk import chunks
+from main.utils.single_flight import single_flight
+from main.utils.task_dedupe import DedupeTask
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from main.utils.queries.node import Node
@@ -63,7 +68,13 @@ import pytz
 
 import rampp2p.utils.transaction as rampp2p_utils
 from jpp.models import Invoice as JPPInvoice
-from main.utils.transaction_processing import mark_transaction_inputs_as_spent, mark_transactions_as_spent
+from main.utils.transaction_processing import (
+    mark_transaction_inputs_as_spent,
+    mark_transactions_as_spent,
+    mark_transaction_ids_spent,
+)
+from main.utils.block_catchup import BlockCatchup
+from main.utils.tx_decoder import decode_raw_transaction
 
 
 LOGGER = logging.getLogger(__name__)
@@ -89,7 +100,13 @@ def send_telegram_message(message, chat_id):
     return f"send notification to {chat_id}"
 
 
-@shared_task(bind=True, queue='client_acknowledgement', max_retries=3)
+@shared_task(
+    bind=True,
+    queue='client_acknowledgement',
+    max_retries=3,
+    base=DedupeTask,
+    dedupe={ 'args': ('tx_obj_id',) },
+)
 def client_acknowledgement(self, tx_obj_id):
     stack_frames = get_stack_frames(1, 5)
     trigger_info = "\n".join([format_stack_frame(frame) for frame in stack_frames])
@@ -837,81 +854,14 @@ def ready_to_accept(self, block_number, txs_count):
         transactions_count=txs_count,
         updated_datetime=timezone.now()
     )
-    REDIS_STORAGE.set('READY', 1)
-    REDIS_STORAGE.set('ACTIVE-BLOCK', '')
     return 'OK'
 
 
 @shared_task(bind=True, queue='manage_blocks')
 def manage_blocks(self):
-    if b'READY' not in REDIS_STORAGE.keys(): REDIS_STORAGE.set('READY', 1)
-    if b'ACTIVE-BLOCK' not in REDIS_STORAGE.keys(): REDIS_STORAGE.set('ACTIVE-BLOCK', '')
-    if b'PENDING-BLOCKS' not in REDIS_STORAGE.keys(): REDIS_STORAGE.set('PENDING-BLOCKS', json.dumps([]))
-    
-    pending_blocks = REDIS_STORAGE.get('PENDING-BLOCKS').decode()
-    blocks = json.loads(pending_blocks)
-    blocks.sort()
-
-    if len(blocks) == 0:
-        unscanned_blocks = BlockHeight.objects.filter(
-            processed=False,
-            requires_full_scan=True
-        ).values_list('number', flat=True)
-        blocks = list(unscanned_blocks)
-        REDIS_STORAGE.set('PENDING-BLOCKS', json.dumps(blocks))
-
-
-    if int(REDIS_STORAGE.get('READY').decode()): LOGGER.info('READY TO PROCESS ANOTHER BLOCK')
-    if not blocks: return 'NO PENDING BLOCKS'
-    
-    discard_block = False
-    if int(REDIS_STORAGE.get('READY').decode()):
-        try:
-            active_block = blocks[0]
-            block = BlockHeight.objects.get(number=active_block)
-        except BlockHeight.DoesNotExist:
-            discard_block = True   
-
-        if active_block in blocks:
-            blocks.remove(active_block)
-            blocks = list(set(blocks))  # Uniquify the list
-            blocks.sort()  # Then sort, ascending
-            pending_blocks = json.dumps(blocks)
-            REDIS_STORAGE.set('PENDING-BLOCKS', pending_blocks)
-
-        if not discard_block:
-            REDIS_STORAGE.set('ACTIVE-BLOCK', active_block)
-            REDIS_STORAGE.set('READY', 0)
-            try:
-                # TODO: handle block tracking for SLP testnet when BCH_NETWORK=chipnet
-                # (testnet has different block count with chipnet)
-                if settings.BCH_NETWORK == 'mainnet':
-                    pass
-                    
-                    #TODO: Disable block scanning in SLP, for now
-                    # transactions = NODE.SLP.get_block(block.number, full_transactions=False)
-                    # for tr in transactions:
-                    #     txid = bytearray(tr.transaction_hash[::-1]).hex()
-                    #     subtasks.append(query_transaction.si(txid, block.id, for_slp=True))
-
-                transactions = NODE.BCH.get_block(block.number, verbosity=3)
-                block_time = NODE.BCH.get_block_stats(block.number, stats=["time"])["time"]
-                block_age = timezone.now().timestamp() - block_time
-                LOGGER.info(f"Processing block {block.number} (age: {block_age:.1f}s, "
-                            f"txs: {len(transactions)})")
-                for tx in transactions:
-                    tx["time"] = block_time # tx is from .get_block() which doesn't return tx's timestamp
-                    parsed_tx = NODE.BCH._parse_transaction(tx)
-                    save_transaction(parsed_tx, block_id=block.id)
-
-                ready_to_accept(block.number, len(transactions))
-            finally:
-                REDIS_STORAGE.set('READY', 1)
-
-    active_block = REDIS_STORAGE.get('ACTIVE-BLOCK')
-    if active_block:
-        active_block = str(REDIS_STORAGE.get('ACTIVE-BLOCK').decode())
-        LOGGER.info(f'CURRENTLY PROCESSING BLOCK {str(active_block)}')
+    # Blocks pending a full scan are read from the database (processed=False),
+    # fetched/parsed in parallel and committed in height order
+    return BlockCatchup().run()
 
 
 def save_transaction(tx, block_id=None):
@@ -942,12 +892,24 @@ def save_transaction(tx, block_id=None):
             source=NODE.BCH.source,
         )
 
+def register_block(number):
+    """
+        Creates the BlockHeight row of a newly seen block and queues it for scanning
+        right away instead of waiting for the next manage_blocks beat.
+    """
+    obj, created = BlockHeight.objects.get_or_create(number=number)
+    if created:
+        manage_blocks.delay()
+    return obj, created
+
+
 @shared_task(bind=True, queue='get_latest_block')
 def get_latest_block(self):
-    # This task is intended to check new blockheight every 5 seconds
+    # New blocks are pushed by bchn_zmq_listener (hashblock), this is only a fallback
+    # in case a notification is missed. See BLOCK_POLL_FALLBACK_INTERVAL
     LOGGER.info('CHECKING THE LATEST BLOCK')
     number = NODE.BCH.get_latest_block()
-    obj, created = BlockHeight.objects.get_or_create(number=number)
+    obj, created = register_block(number)
     if created: return f'*** NEW BLOCK { obj.number } ***'
 
 
@@ -1029,21 +991,9 @@ def get_bch_utxos(self, address):
         # Mark transactions as spent
         if transactions_to_mark_spent:
             LOGGER.info(f"Marking {len(transactions_to_mark_spent)} transactions as spent for address {address}")
-            transactions_to_mark_spent_qs = Transaction.objects.filter(id__in=transactions_to_mark_spent)
-            clear_cache_for_spent_transactions(transactions_to_mark_spent_qs)
-            
-            with trans.atomic():
-                locked_qs = Transaction.objects.select_for_update().filter(
-                    id__in=transactions_to_mark_spent,
-                    spent=False
-                )
-                
-                transactions_to_update = list(locked_qs)
-                for txn in transactions_to_update:
-                    txn.spent = True
-                
-                Transaction.objects.bulk_update(transactions_to_update, ['spent'], batch_size=100)
-                LOGGER.info(f"Successfully marked {len(transactions_to_update)} transactions as spent for address {address}")
+            # single UPDATE, rows spent concurrently in the meantime are skipped
+            spent = mark_transaction_ids_spent(transactions_to_mark_spent)
+            LOGGER.info(f"Successfully marked {len(spent['transaction_ids'])} transactions as spent for address {address}")
         
         # Clear advance_subscription flag if address has UTXOs
         # This marks the address as actively used
@@ -1255,7 +1205,12 @@ def download_image(token_id, url, resize=False):
     return resp.status_code, image_file_name
 
 
-@shared_task(queue='token_metadata', max_retries=3)
+@shared_task(
+    queue='token_metadata',
+    max_retries=3,
+    base=DedupeTask,
+    dedupe={ 'args': ('token_id', 'document_url') },
+)
 def download_token_metadata_image(token_id, document_url=None):
     token_obj = Token.objects.get(tokenid=token_id)
 
@@ -1318,7 +1273,13 @@ def download_token_metadata_image(token_id, document_url=None):
     return image_url
 
 
-@shared_task(bind=True, queue='token_metadata', max_retries=3)
+@shared_task(
+    bind=True,
+    queue='token_metadata',
+    max_retries=3,
+    base=DedupeTask,
+    dedupe={ 'args': ('token_id', 'async_image_download') },
+)
 def get_token_meta_data(self, token_id, async_image_download=False):
     try:
         if token_id != settings.WT_DEFAULT_CASHTOKEN_ID:
@@ -1449,8 +1410,8 @@ def update_nft_owner(tokenid):
 def _get_wallet_hash(tx_hex):
     wallet_hash = None
     try:
-        tx = NODE.BCH._decode_raw_transaction(tx_hex)
-        input0 = tx['vin'][0]
+        tx = decode_raw_transaction(tx_hex)
+        input0 = tx['inputs'][0]
         input0_tx = NODE.BCH._get_raw_transaction(input0['txid'])
         vout_data = input0_tx['vout'][input0['vout']]
         if vout_data['scriptPubKey']['type'] == 'pubkeyhash':
@@ -1549,45 +1510,6 @@ def send_post_broadcast_notifications_task(transaction, extra_data=None):
         raise
 
 
-def process_history_recpts_or_senders(_list, key, BCH_OR_SLP):
-    processed_list = []
-    if _list:
-        processed_list = []
-        for _, val in enumerate(_list):
-            elem = [
-                val[0],
-                val[1]
-            ]
-            if key != BCH_OR_SLP:
-                try:
-                    cashtoken_data = val[2]
-                    if cashtoken_data:
-                        elem.append(cashtoken_data['category'])
-                        elem.append(cashtoken_data['amount'])
-
-                        if 'nft' in cashtoken_data.keys():
-                            nft_data = cashtoken_data['nft']
-                            elem.append(nft_data['capability'])
-                            elem.append(nft_data['commitment'])
-                except IndexError:
-                    pass
-                
-            '''mask remaining fields with None (incurs Django error for non-uniform ArrayField(ArrayField) length for senders/recipients)
-            [
-                address,
-                bch/slp amount,
-                ct category/token ID, (can be None)
-                ct amount,            (can be None)
-                ct capability         (can be None)
-                ct commitment         (can be None)
-            ]'''
-            for x in range(0, 6 - len(elem)):
-                elem.append(None)
-
-            processed_list.append(elem)
-    return processed_list
-
-
 @shared_task(queue='contract_history')
 def parse_contract_history(txid, address, tx_fee=None, senders=None, recipients=None):
     BCH_OR_SLP = 'bch_or_slp'
@@ -1765,378 +1687,478 @@ def parse_contract_history(txid, address, tx_fee=None, senders=None, recipients=
                 LOGGER.exception(exc)
 
 
-@shared_task(bind=True, queue='wallet_history_1')
+def update_merchant_wallets(wallet_hashes):
+    """
+    Marks the merchants of the wallets active and refreshes the latest history of their POS devices
+    """
+    merchants = Merchant.objects.filter(wallet_hash__in=wallet_hashes)
+    for merchant in merchants:
+        merchant.last_update = timezone.now()
+        merchant.active = True
+        merchant.save()
+
+        # update latest_transaction in POS devices
+        pos_devices = PosDevice.objects.filter(merchant=merchant)
+        for device in pos_devices:
+            device.populate_latest_history_record()
+
+
+def update_history_token_records(wallet, txn, record_type):
+    """
+    Token metadata and NFT ownership updates of a wallet history record resolved from `txn`
+    """
+    # for older token records
+    if (
+        txn and
+        txn.token and
+        txn.token.tokenid and
+        txn.token.tokenid != settings.WT_DEFAULT_CASHTOKEN_ID and
+        (txn.token.token_type is None or txn.token.mint_amount is None)
+    ):
+        # Check if token already has metadata before fetching
+        if not txn.token.token_type or not txn.token.mint_amount:
+            # Only fetch if metadata is missing - make it async so it doesn't block
+            get_token_meta_data.delay(txn.token.tokenid, async_image_download=True)
+        # Don't refresh from DB here since we're not waiting for the async task
+
+    if txn and txn.token and txn.token.is_nft:
+        if record_type == 'incoming':
+            wallet_nft_token, created = WalletNftToken.objects.get_or_create(
+                wallet=wallet,
+                token=txn.token,
+                acquisition_transaction=txn
+            )
+        elif record_type == 'outgoing':
+            wallet_nft_token_check = WalletNftToken.objects.filter(
+                wallet=wallet,
+                token=txn.token,
+                date_dispensed__isnull=True
+            )
+            if wallet_nft_token_check.exists():
+                wallet_nft_token = wallet_nft_token_check.last()
+                wallet_nft_token.date_dispensed = txn.date_created
+                wallet_nft_token.dispensation_transaction = txn
+                wallet_nft_token.save()
+
+        update_nft_owner.delay(txn.token.tokenid)
+
+
+def parse_wallet_history_key(txid, wallet_handle):
+    return f"parse_wallet_history:{txid}:{wallet_handle}"
+
+
+# the requests for the same txid and wallet within WALLET_HISTORY_DEBOUNCE seconds are
+# merged into one run at the end of the window
+@shared_task(
+    bind=True,
+    queue='wallet_history_1',
+    base=DedupeTask,
+    dedupe={
+        'args': ('txid', 'wallet_handle'),
+        'window': settings.WALLET_HISTORY_DEBOUNCE,
+        'debounce': True,
+    },
+)
+@single_flight(
+    lambda self, txid, wallet_handle, *args, **kwargs: parse_wallet_history_key(txid, wallet_handle),
+    ttl=settings.WALLET_HISTORY_LOCK_TTL,
+)
 def parse_wallet_history(self, txid, wallet_handle, tx_fee=None, senders=[], recipients=[], proceed_with_zero_amount=False):
     stack_frames = get_stack_frames(1, 5)
     trigger_info = "\n\t >> ".join([format_stack_frame(frame) for frame in stack_frames])
     LOGGER.info(f"PARSING WALLET HISTORY | {txid} | {wallet_handle}\nTriggered from {trigger_info}")
     wallet_hash = wallet_handle.split('|')[1]
+
+    wallet = Wallet.objects.get(wallet_hash=wallet_hash)
+
+    # Do not record wallet history record if all senders and recipients are from the same wallet (i.e. UTXO consolidation txs)
+    # Optimized: Use values_list with flat=True for better performance
+    sender_addresses = set([i[0] for i in senders if i[0]])
+    recipient_addresses = set([i[0] for i in recipients if i[0]])
     
-    # Redis-based deduplication: prevent concurrent execution for the same txid+wallet
-    # This ensures the task runs only once even if triggered multiple times
-    _REDIS_KEY_TTL = 300  # 5 minutes
-    _REDIS_NAME__WALLET_HISTORY_PARSING = 'wallet_history:parsing'
-    lock_key = f"{txid}:{wallet_hash}"
-    
-    # Check if this task is already running
-    active_parsing = REDIS_STORAGE.smembers(_REDIS_NAME__WALLET_HISTORY_PARSING)
-    if isinstance(active_parsing, set):
-        active_parsing = {item.decode() if isinstance(item, bytes) else item for item in active_parsing}
-    else:
-        active_parsing = set()
-    
-    if lock_key in active_parsing:
-        LOGGER.info(f"Wallet history parsing for {txid} | {wallet_handle} is already being processed by another task, skipping")
-        return f"already_parsing: {lock_key}"
-    
-    # Add to active parsing set
-    REDIS_STORAGE.sadd(_REDIS_NAME__WALLET_HISTORY_PARSING, lock_key)
-    REDIS_STORAGE.expire(_REDIS_NAME__WALLET_HISTORY_PARSING, _REDIS_KEY_TTL)
+    if sender_addresses and recipient_addresses:
+        # Optimized: Single query to check if all addresses belong to this wallet
+        sender_wallet_addresses = set(
+            Address.objects.filter(address__in=sender_addresses, wallet=wallet)
+            .values_list('address', flat=True)
+        )
+        recipient_wallet_addresses = set(
+            Address.objects.filter(address__in=recipient_addresses, wallet=wallet)
+            .values_list('address', flat=True)
+        )
+        
+        if len(sender_addresses) == len(sender_wallet_addresses):
+            if len(recipient_addresses) == len(recipient_wallet_addresses):
+                # Remove wallet history record of this, if any
+                WalletHistory.objects.filter(txid=txid, wallet=wallet).delete()
+                return
+
+    parser = HistoryParser(txid, wallet_hash=wallet_hash)
+    parsed_history = parser.parse()
+
+    if type(tx_fee) is str:
+        tx_fee = float(tx_fee)
     
-    try:
-        wallet = Wallet.objects.get(wallet_hash=wallet_hash)
+    BCH_OR_SLP = 'bch_or_slp'
+
+    # Optimized: Batch TransactionBroadcast lookup once per txid (before loop)
+    txn_broadcast = TransactionBroadcast.objects.select_related('price_log').filter(txid=txid).first()
+    txn_broadcast_price_log = txn_broadcast.price_log if txn_broadcast and txn_broadcast.price_log else None
 
-        # Do not record wallet history record if all senders and recipients are from the same wallet (i.e. UTXO consolidation txs)
-        # Optimized: Use values_list with flat=True for better performance
-        sender_addresses = set([i[0] for i in senders if i[0]])
-        recipient_addresses = set([i[0] for i in recipients if i[0]])
+    # parsed_history.keys() = ['bch_or_slp', 'ct', 'ct_nft']
+    for key in parsed_history.keys():
+        ct_category = None
+        is_nft_key = False
+        nft_category = None
+        nft_capability = None
+        nft_commitment = None
         
-        if sender_addresses and recipient_addresses:
-            # Optimized: Single query to check if all addresses belong to this wallet
-            sender_wallet_addresses = set(
-                Address.objects.filter(address__in=sender_addresses, wallet=wallet)
-                .values_list('address', flat=True)
-            )
-            recipient_wallet_addresses = set(
-                Address.objects.filter(address__in=recipient_addresses, wallet=wallet)
-                .values_list('address', flat=True)
-            )
-            
-            if len(sender_addresses) == len(sender_wallet_addresses):
-                if len(recipient_addresses) == len(recipient_wallet_addresses):
-                    # Remove wallet history record of this, if any
-                    WalletHistory.objects.filter(txid=txid, wallet=wallet).delete()
-                    return
+        if key.startswith("ct_nft/"):
+            is_nft_key = True
+            # Parse: ct_nft/{category}/{capability}/{commitment}
+            parts = key.split("ct_nft/")[1].split("/")
+            nft_category = parts[0] if len(parts) > 0 else None
+            nft_capability = parts[1] if len(parts) > 1 and parts[1] else None
+            nft_commitment = parts[2] if len(parts) > 2 and parts[2] else None
+        elif key.startswith("ct/"):
+            ct_category = key.split("ct/")[1]
+
+        data = parsed_history[key]
+        record_type = data['record_type']
+        amount = data['diff']
+        change_address = data['change_address']
+        
+        # For NFT keys, extract additional metadata if available
+        if is_nft_key:
+            nft_category = data.get('category', nft_category)
+            nft_capability = data.get('capability', nft_capability)
+            nft_commitment = data.get('commitment', nft_commitment)
 
-        parser = HistoryParser(txid, wallet_hash=wallet_hash)
-        parsed_history = parser.parse()
+        _recipients = None
+        if change_address:
+            _recipients = [info for info in recipients if info[0] != change_address]
 
-        if type(tx_fee) is str:
-            tx_fee = float(tx_fee)
-        
-        BCH_OR_SLP = 'bch_or_slp'
-
-        # Optimized: Batch TransactionBroadcast lookup once per txid (before loop)
-        txn_broadcast = TransactionBroadcast.objects.select_related('price_log').filter(txid=txid).first()
-        txn_broadcast_price_log = txn_broadcast.price_log if txn_broadcast and txn_broadcast.price_log else None
-
-        # parsed_history.keys() = ['bch_or_slp', 'ct', 'ct_nft']
-        for key in parsed_history.keys():
-            ct_category = None
-            is_nft_key = False
-            nft_category = None
-            nft_capability = None
-            nft_commitment = None
-            
-            if key.startswith("ct_nft/"):
-                is_nft_key = True
-                # Parse: ct_nft/{category}/{capability}/{commitment}
-                parts = key.split("ct_nft/")[1].split("/")
-                nft_category = parts[0] if len(parts) > 0 else None
-                nft_capability = parts[1] if len(parts) > 1 and parts[1] else None
-                nft_commitment = parts[2] if len(parts) > 2 and parts[2] else None
-            elif key.startswith("ct/"):
-                ct_category = key.split("ct/")[1]
-
-            data = parsed_history[key]
-            record_type = data['record_type']
-            amount = data['diff']
-            change_address = data['change_address']
-            
-            # For NFT keys, extract additional metadata if available
+        processed_recipients = process_history_recpts_or_senders(_recipients or recipients, key, BCH_OR_SLP)
+        processed_senders = process_history_recpts_or_senders(senders, key, BCH_OR_SLP)
+
+        if wallet.wallet_type == 'bch':
+            # For NFTs, set amount to 1.0 or -1.0 (counted, not summed)
             if is_nft_key:
-                nft_category = data.get('category', nft_category)
-                nft_capability = data.get('capability', nft_capability)
-                nft_commitment = data.get('commitment', nft_commitment)
-
-            _recipients = None
-            if change_address:
-                _recipients = [info for info in recipients if info[0] != change_address]
-
-            processed_recipients = process_history_recpts_or_senders(_recipients or recipients, key, BCH_OR_SLP)
-            processed_senders = process_history_recpts_or_senders(senders, key, BCH_OR_SLP)
-
-            if wallet.wallet_type == 'bch':
-                # For NFTs, set amount to 1.0 or -1.0 (counted, not summed)
-                if is_nft_key:
-                    if record_type == 'incoming':
-                        amount = 1.0
-                    elif record_type == 'outgoing':
-                        amount = -1.0
-                    else:
-                        amount = float(amount)  # Keep as-is if record_type is empty
-                
-                # Correct the amount for outgoing, subtract the miner fee if given and maintain negative sign
-                if record_type == 'outgoing':
-                    if key == BCH_OR_SLP:
-                        amount = abs(amount) - ((tx_fee / 100000000) or 0)
-                        amount = round(amount, 8)
-                    elif not is_nft_key:  # NFTs already have correct amount set above
-                        amount = abs(amount) * -1
-
-                # Don't save a record if resulting amount is zero
-                is_zero_amount = amount == 0
-                if is_zero_amount and not proceed_with_zero_amount:
-                    # skip this key and continue with the next key
-                    continue
+                if record_type == 'incoming':
+                    amount = 1.0
+                elif record_type == 'outgoing':
+                    amount = -1.0
+                else:
+                    amount = float(amount)  # Keep as-is if record_type is empty
+            
+            # Correct the amount for outgoing, subtract the miner fee if given and maintain negative sign
+            if record_type == 'outgoing':
+                if key == BCH_OR_SLP:
+                    amount = abs(amount) - ((tx_fee / 100000000) or 0)
+                    amount = round(amount, 8)
+                elif not is_nft_key:  # NFTs already have correct amount set above
+                    amount = abs(amount) * -1
 
-                if is_zero_amount:
-                    record_type = ''
+            # Don't save a record if resulting amount is zero
+            is_zero_amount = amount == 0
+            if is_zero_amount and not proceed_with_zero_amount:
+                # skip this key and continue with the next key
+                continue
 
-                bch_prefix = 'bitcoincash:'
-                if settings.BCH_NETWORK != 'mainnet':
-                    bch_prefix = 'bchtest:'
+            if is_zero_amount:
+                record_type = ''
 
-                # Optimized: Add select_related to reduce queries
-                txns = Transaction.objects.select_related(
-                    'token', 'cashtoken_ft', 'cashtoken_nft', 'address', 'address__wallet'
-                ).filter(
-                    txid=txid,
-                    address__address__startswith=bch_prefix
-                )
-                spent_txns = Transaction.objects.select_related(
-                    'token', 'cashtoken_ft', 'cashtoken_nft', 'address', 'address__wallet'
-                ).filter(
-                    spending_txid=txid,
-                    address__address__startswith=bch_prefix,
-                )
+            bch_prefix = 'bitcoincash:'
+            if settings.BCH_NETWORK != 'mainnet':
+                bch_prefix = 'bchtest:'
 
-                tx_timestamp = txns.filter(tx_timestamp__isnull=False).aggregate(_max=models.Max('tx_timestamp'))['_max']
-                date_created = txns.filter(date_created__isnull=False).aggregate(_max=models.Max('date_created'))['_max']
+            # Optimized: Add select_related to reduce queries
+            txns = Transaction.objects.select_related(
+                'token', 'cashtoken_ft', 'cashtoken_nft', 'address', 'address__wallet'
+            ).filter(
+                txid=txid,
+                address__address__startswith=bch_prefix
+            )
+            spent_txns = Transaction.objects.select_related(
+                'token', 'cashtoken_ft', 'cashtoken_nft', 'address', 'address__wallet'
+            ).filter(
+                spending_txid=txid,
+                address__address__startswith=bch_prefix,
+            )
 
-                cashtoken_ft = None
-                cashtoken_nft = None
-                token_obj = None
+            tx_timestamp = txns.filter(tx_timestamp__isnull=False).aggregate(_max=models.Max('tx_timestamp'))['_max']
+            date_created = txns.filter(date_created__isnull=False).aggregate(_max=models.Max('date_created'))['_max']
 
-                if key == BCH_OR_SLP:
-                    txns = txns.filter(token__name='bch')
-                    spent_txns = spent_txns.filter(token__name='bch')
-                elif is_nft_key and nft_category:
-                    # Handle CashToken NFT transactions
-                    # Filter by category, capability, and commitment to match the specific NFT
-                    nft_filter = models.Q(cashtoken_nft__category=nft_category)
-                    if nft_capability:
-                        nft_filter = nft_filter & models.Q(cashtoken_nft__capability=nft_capability)
-                    else:
-                        nft_filter = nft_filter & models.Q(cashtoken_nft__capability__isnull=True)
-                    
-                    if nft_commitment:
-                        nft_filter = nft_filter & models.Q(cashtoken_nft__commitment=nft_commitment)
-                    else:
-                        nft_filter = nft_filter & models.Q(cashtoken_nft__commitment__isnull=True)
-                    
-                    _txns = txns.filter(nft_filter)
-                    _spent_txns = spent_txns.filter(nft_filter)
-                    if _txns.exists() or _spent_txns.exists():
-                        if _txns.exists():
-                            txns = _txns
-                        if _spent_txns.exists():
-                            spent_txns = _spent_txns
-                        nft_tx = txns.filter(cashtoken_nft__isnull=False).last()
-                        if not nft_tx:
-                            nft_tx = spent_txns.filter(cashtoken_nft__isnull=False).last()
-                        if nft_tx and nft_tx.cashtoken_nft:
-                            cashtoken_nft = nft_tx.cashtoken_nft
-                            # Set token_obj to default CashToken token for NFTs
-                            if not token_obj:
-                                token_obj, _ = Token.objects.get_or_create(tokenid=settings.WT_DEFAULT_CASHTOKEN_ID)
-                            # Amount already set correctly above for NFTs
-                    else:
-                        # No matching Transaction found - skip (Transaction required, same as FTs)
-                        continue
-                elif ct_category:
-                    _txns = txns.filter(
-                        models.Q(cashtoken_ft__category=ct_category) | \
-                        models.Q(cashtoken_nft__category=ct_category),
-                    )
+            cashtoken_ft = None
+            cashtoken_nft = None
+            token_obj = None
+
+            if key == BCH_OR_SLP:
+                txns = txns.filter(token__name='bch')
+                spent_txns = spent_txns.filter(token__name='bch')
+            elif is_nft_key and nft_category:
+                # Handle CashToken NFT transactions
+                # Filter by category, capability, and commitment to match the specific NFT
+                nft_filter = models.Q(cashtoken_nft__category=nft_category)
+                if nft_capability:
+                    nft_filter = nft_filter & models.Q(cashtoken_nft__capability=nft_capability)
+                else:
+                    nft_filter = nft_filter & models.Q(cashtoken_nft__capability__isnull=True)
+                
+                if nft_commitment:
+                    nft_filter = nft_filter & models.Q(cashtoken_nft__commitment=nft_commitment)
+                else:
+                    nft_filter = nft_filter & models.Q(cashtoken_nft__commitment__isnull=True)
+                
+                _txns = txns.filter(nft_filter)
+                _spent_txns = spent_txns.filter(nft_filter)
+                if _txns.exists() or _spent_txns.exists():
                     if _txns.exists():
                         txns = _txns
-                        ft_tx = txns.filter(cashtoken_ft_id=ct_category).last()
-                        if ft_tx:
-                            cashtoken_ft = ft_tx.cashtoken_ft
-                        if not cashtoken_ft:
-                            nft_tx = txns.filter(cashtoken_nft__category=ct_category).last()
-                            if nft_tx:
-                                cashtoken_nft = nft_tx.cashtoken_nft
-                    else:
-                        # Get the cashtoken record if transaction does not have this info
-                        ct_recipient = None
-                        ct_index = None
-                        for i, _recipient in enumerate(processed_recipients):
-                            ct_index = i
-                            if _recipient[2] == ct_category:
-                                ct_recipient = _recipient
-                                break
-
-                        if key.startswith("ct") and ct_recipient:
+                    if _spent_txns.exists():
+                        spent_txns = _spent_txns
+                    nft_tx = txns.filter(cashtoken_nft__isnull=False).last()
+                    if not nft_tx:
+                        nft_tx = spent_txns.filter(cashtoken_nft__isnull=False).last()
+                    if nft_tx and nft_tx.cashtoken_nft:
+                        cashtoken_nft = nft_tx.cashtoken_nft
+                        # Set token_obj to default CashToken token for NFTs
+                        if not token_obj:
                             token_obj, _ = Token.objects.get_or_create(tokenid=settings.WT_DEFAULT_CASHTOKEN_ID)
-                            token_id = ct_recipient[2]
-                            nft_capability = ct_recipient[4]
-                            nft_commitment = ct_recipient[5]
-                            if token_id:
-                                if not cashtoken_ft:
-                                    cashtoken_ft, _ = CashFungibleToken.objects.get_or_create(category=token_id)
-                                    # Only fetch metadata if it doesn't exist, and handle errors gracefully
-                                    if not cashtoken_ft.info:
-                                        try:
-                                            cashtoken_ft.fetch_metadata()
-                                        except Exception as e:
-                                            LOGGER.warning(f'Error fetching cashtoken metadata for {token_id}: {str(e)}')
-                                            # Continue with cashtoken_ft even if metadata fetch failed
-                                if not cashtoken_nft and nft_capability:
-                                    cashtoken_nft, _ = CashNonFungibleToken.objects.get_or_create(
-                                        category=token_id,
-                                        capability=nft_capability,
-                                        commitment=nft_commitment,
-                                        current_txid=txid,
-                                        current_index=ct_index
-                                    )
-                                    cashtoken_nft.fetch_metadata()
-
-            elif wallet.wallet_type == 'slp':
-                if key != BCH_OR_SLP:
-                    return
-
-                # Optimized: Add select_related to reduce queries
-                txns = Transaction.objects.select_related(
-                    'token', 'cashtoken_ft', 'cashtoken_nft', 'address', 'address__wallet'
-                ).filter(
-                    txid=txid,
-                    address__address__startswith='simpleledger:'
+                        # Amount already set correctly above for NFTs
+                else:
+                    # No matching Transaction found - skip (Transaction required, same as FTs)
+                    continue
+            elif ct_category:
+                _txns = txns.filter(
+                    models.Q(cashtoken_ft__category=ct_category) | \
+                    models.Q(cashtoken_nft__category=ct_category),
                 )
+                if _txns.exists():
+                    txns = _txns
+                    ft_tx = txns.filter(cashtoken_ft_id=ct_category).last()
+                    if ft_tx:
+                        cashtoken_ft = ft_tx.cashtoken_ft
+                    if not cashtoken_ft:
+                        nft_tx = txns.filter(cashtoken_nft__category=ct_category).last()
+                        if nft_tx:
+                            cashtoken_nft = nft_tx.cashtoken_nft
+                else:
+                    # Get the cashtoken record if transaction does not have this info
+                    ct_recipient = None
+                    ct_index = None
+                    for i, _recipient in enumerate(processed_recipients):
+                        ct_index = i
+                        if _recipient[2] == ct_category:
+                            ct_recipient = _recipient
+                            break
+
+                    if key.startswith("ct") and ct_recipient:
+                        token_obj, _ = Token.objects.get_or_create(tokenid=settings.WT_DEFAULT_CASHTOKEN_ID)
+                        token_id = ct_recipient[2]
+                        nft_capability = ct_recipient[4]
+                        nft_commitment = ct_recipient[5]
+                        if token_id:
+                            if not cashtoken_ft:
+                                cashtoken_ft, _ = CashFungibleToken.objects.get_or_create(category=token_id)
+                                # Only fetch metadata if it doesn't exist, and handle errors gracefully
+                                if not cashtoken_ft.info:
+                                    try:
+                                        cashtoken_ft.fetch_metadata()
+                                    except Exception as e:
+                                        LOGGER.warning(f'Error fetching cashtoken metadata for {token_id}: {str(e)}')
+                                        # Continue with cashtoken_ft even if metadata fetch failed
+                            if not cashtoken_nft and nft_capability:
+                                cashtoken_nft, _ = CashNonFungibleToken.objects.get_or_create(
+                                    category=token_id,
+                                    capability=nft_capability,
+                                    commitment=nft_commitment,
+                                    current_txid=txid,
+                                    current_index=ct_index
+                                )
+                                cashtoken_nft.fetch_metadata()
+
+        elif wallet.wallet_type == 'slp':
+            if key != BCH_OR_SLP:
+                return
 
-            txn = txns.last()
-            spent_txn = spent_txns.last()
+            # Optimized: Add select_related to reduce queries
+            txns = Transaction.objects.select_related(
+                'token', 'cashtoken_ft', 'cashtoken_nft', 'address', 'address__wallet'
+            ).filter(
+                txid=txid,
+                address__address__startswith='simpleledger:'
+            )
 
-            if not txn and not spent_txn: continue
+        txn = txns.last()
+        spent_txn = spent_txns.last()
 
-            if not token_obj:
-                _txn = txn or spent_txn
-                token_obj = _txn.token
-            
-            # Optimized: Use update_or_create instead of filter+save pattern
-            # This eliminates the DELETE query that was in the signal and handles race conditions better
-            defaults = {
-                'record_type': record_type,
-                'amount': amount,
-                'token': token_obj,
-                'cashtoken_ft': cashtoken_ft,
-                'cashtoken_nft': cashtoken_nft,
-            }
-            
-            if tx_fee and processed_senders and processed_recipients:
-                defaults['tx_fee'] = tx_fee
-                defaults['senders'] = processed_senders
-                defaults['recipients'] = processed_recipients
-            
-            if tx_timestamp:
-                defaults['tx_timestamp'] = tx_timestamp
-            
-            if date_created:
-                defaults['date_created'] = date_created
-            
-            if txn_broadcast_price_log:
-                defaults['price_log'] = txn_broadcast_price_log
+        if not txn and not spent_txn: continue
 
-            try:
-                history, created = WalletHistory.objects.update_or_create(
-                    wallet=wallet,
-                    txid=txid,
-                    token=token_obj,
-                    cashtoken_ft=cashtoken_ft,
-                    cashtoken_nft=cashtoken_nft,
-                    defaults=defaults
-                )
+        if not token_obj:
+            _txn = txn or spent_txn
+            token_obj = _txn.token
+        
+        # Optimized: Use update_or_create instead of filter+save pattern
+        # This eliminates the DELETE query that was in the signal and handles race conditions better
+        defaults = {
+            'record_type': record_type,
+            'amount': amount,
+            'token': token_obj,
+            'cashtoken_ft': cashtoken_ft,
+            'cashtoken_nft': cashtoken_nft,
+        }
+        
+        if tx_fee and processed_senders and processed_recipients:
+            defaults['tx_fee'] = tx_fee
+            defaults['senders'] = processed_senders
+            defaults['recipients'] = processed_recipients
+        
+        if tx_timestamp:
+            defaults['tx_timestamp'] = tx_timestamp
+        
+        if date_created:
+            defaults['date_created'] = date_created
+        
+        if txn_broadcast_price_log:
+            defaults['price_log'] = txn_broadcast_price_log
+
+        try:
+            history, created = WalletHistory.objects.update_or_create(
+                wallet=wallet,
+                txid=txid,
+                token=token_obj,
+                cashtoken_ft=cashtoken_ft,
+                cashtoken_nft=cashtoken_nft,
+                defaults=defaults
+            )
 
-                # Resolve USD and market values synchronously — these are lightweight
-                # DB queries against AssetPriceLog / PriceOracleMessage tables,
-                # no blocking external calls.
+            # Resolve USD and market values synchronously — these are lightweight
+            # DB queries against AssetPriceLog / PriceOracleMessage tables,
+            # no blocking external calls.
+            try:
+                resolve_wallet_history_usd_values(txid=txid)
+            except Exception as exc:
+                LOGGER.exception(f"Failed to resolve USD values for {txid}: {exc}")
+            
+            if history.tx_timestamp:
                 try:
-                    resolve_wallet_history_usd_values(txid=txid)
+                    parse_wallet_history_market_values(history.id)
                 except Exception as exc:
-                    LOGGER.exception(f"Failed to resolve USD values for {txid}: {exc}")
-                
-                if history.tx_timestamp:
-                    try:
-                        parse_wallet_history_market_values(history.id)
-                    except Exception as exc:
-                        LOGGER.exception(f"Failed to resolve market values for history {history.id}: {exc}")
-
-                # Only send push notifications for newly created records to prevent duplicates
-                # when the same transaction is processed multiple times
-                if created:
-                    try:
-                        # Do not send notifications for amounts less than or equal to 0.00001
-                        if abs(amount) > 0.00001:
-                            LOGGER.info(f"PUSH_NOTIF: wallet_history for #{history.txid} | {history.amount}")
-                            send_wallet_history_push_notification(history)
-                        else:
-                            send_wallet_history_push_notification_nft(history)
-                    except Exception as exception:
-                        LOGGER.exception(exception)
-            except IntegrityError as exc:
-                LOGGER.exception(exc)
+                    LOGGER.exception(f"Failed to resolve market values for history {history.id}: {exc}")
 
-            # merchant wallet check
-            merchant_check = Merchant.objects.filter(wallet_hash=wallet.wallet_hash)
-            if merchant_check.exists():
-                for merchant in merchant_check.all():
-                    merchant.last_update = timezone.now()
-                    merchant.active = True
-                    merchant.save()
-
-                    # update latest_transaction in POS devices
-                    pos_devices = PosDevice.objects.filter(merchant=merchant)
-                    for device in pos_devices:
-                        device.populate_latest_history_record()
-
-            # for older token records
-            if (
-                txn and
-                txn.token and
-                txn.token.tokenid and
-                txn.token.tokenid != settings.WT_DEFAULT_CASHTOKEN_ID and
-                (txn.token.token_type is None or txn.token.mint_amount is None)
-            ):
-                # Check if token already has metadata before fetching
-                if not txn.token.token_type or not txn.token.mint_amount:
-                    # Only fetch if metadata is missing - make it async so it doesn't block
-                    get_token_meta_data.delay(txn.token.tokenid, async_image_download=True)
-                # Don't refresh from DB here since we're not waiting for the async task
-
-            if txn and txn.token and txn.token.is_nft:
-                if record_type == 'incoming':
-                    wallet_nft_token, created = WalletNftToken.objects.get_or_create(
-                        wallet=wallet,
-                        token=txn.token,
-                        acquisition_transaction=txn
-                    )
-                elif record_type == 'outgoing':
-                    wallet_nft_token_check = WalletNftToken.objects.filter(
-                        wallet=wallet,
-                        token=txn.token,
-                        date_dispensed__isnull=True
-                    )
-                    if wallet_nft_token_check.exists():
-                        wallet_nft_token = wallet_nft_token_check.last()
-                        wallet_nft_token.date_dispensed = txn.date_created
-                        wallet_nft_token.dispensation_transaction = txn
-                        wallet_nft_token.save()
+            # Only send push notifications for newly created records to prevent duplicates
+            # when the same transaction is processed multiple times
+            if created:
+                try:
+                    # Do not send notifications for amounts less than or equal to 0.00001
+                    if abs(amount) > 0.00001:
+                        LOGGER.info(f"PUSH_NOTIF: wallet_history for #{history.txid} | {history.amount}")
+                        send_wallet_history_push_notification(history)
+                    else:
+                        send_wallet_history_push_notification_nft(history)
+                except Exception as exception:
+                    LOGGER.exception(exception)
+        except IntegrityError as exc:
+            LOGGER.exception(exc)
+
+        update_merchant_wallets([wallet.wallet_hash])
+        update_history_token_records(wallet, txn, record_type)
+
+
+def build_tx_wallet_histories_key(txid, proceed_with_zero_amount=False):
+    return f"build_tx_wallet_histories:{txid}:{int(bool(proceed_with_zero_amount))}"
+
+
+# the requests for the same txid within WALLET_HISTORY_DEBOUNCE seconds are merged into
+# one run at the end of the window
+@shared_task(
+    bind=True,
+    queue='wallet_history_1',
+    base=DedupeTask,
+    dedupe={
+        'args': ('txid', 'proceed_with_zero_amount'),
+        'window': settings.WALLET_HISTORY_DEBOUNCE,
+        'debounce': True,
+        'merge': merge_build_requests,
+    },
+)
+@single_flight(
+    lambda self, txid, tx_fee=None, senders=[], recipients=[], proceed_with_zero_amount=False: \
+        build_tx_wallet_histories_key(txid, proceed_with_zero_amount),
+    ttl=settings.WALLET_HISTORY_LOCK_TTL,
+    merge=merge_build_requests,
+)
+def build_tx_wallet_histories(self, txid, tx_fee=None, senders=[], recipients=[], proceed_with_zero_amount=False):
+    """
+    parse_wallet_history of all the bch wallets of a tx at once, see WalletHistoryBuilder
+    """
+    LOGGER.info(f"BUILDING WALLET HISTORIES | {txid}")
+    builder = WalletHistoryBuilder(
+        txid,
+        tx_fee=tx_fee,
+        senders=senders,
+        recipients=recipients,
+        proceed_with_zero_amount=proceed_with_zero_amount,
+    )
+    histories = builder.build()
+    process_wallet_histories(histories)
+    return [history.id for history, _, _ in histories]
+
+
+def process_wallet_histories(histories):
+    """
+    Follow-ups of built wallet history records: USD and market values, push notifications
+    of the created records, token records and merchant updates
+
+    histories: [(history, created, txn), ...], see WalletHistoryBuilder.build()
+    """
+    if not histories:
+        return
+
+    for txid in {history.txid for history, _, _ in histories}:
+        try:
+            resolve_wallet_history_usd_values(txid=txid)
+        except Exception as exc:
+            LOGGER.exception(f"Failed to resolve USD values for {txid}: {exc}")
+
+    for history, created, txn in histories:
+        if history.tx_timestamp:
+            try:
+                parse_wallet_history_market_values(history.id)
+            except Exception as exc:
+                LOGGER.exception(f"Failed to resolve market values for history {history.id}: {exc}")
+
+        # Only send push notifications for newly created records
+        if created:
+            try:
+                # Do not send notifications for amounts less than or equal to 0.00001
+                if abs(history.amount) > 0.00001:
+                    LOGGER.info(f"PUSH_NOTIF: wallet_history for #{history.txid} | {history.amount}")
+                    send_wallet_history_push_notification(history)
+                else:
+                    send_wallet_history_push_notification_nft(history)
+            except Exception as exception:
+                LOGGER.exception(exception)
+
+        update_history_token_records(history.wallet, txn, history.record_type)
+
+    update_merchant_wallets({history.wallet.wallet_hash for history, _, _ in histories if history.wallet})
+
+
+@shared_task(queue='wallet_history_1')
+def process_wallet_histories_task(history_ids, created_ids=[]):
+    """
+    process_wallet_histories() of records built elsewhere, e.g. the records of a wallet
+    built by the history pass of a block
+    """
+    histories = WalletHistory.objects.select_related(
+        'wallet', 'token', 'cashtoken_ft', 'cashtoken_nft',
+    ).filter(id__in=history_ids).order_by('id')
+    created_ids = set(created_ids)
+    process_wallet_histories([(history, history.id in created_ids, None) for history in histories])
+    return list(history_ids)
 
-                update_nft_owner.delay(txn.token.tokenid)
-    finally:
-        # Remove from active parsing set
-        REDIS_STORAGE.srem(_REDIS_NAME__WALLET_HISTORY_PARSING, lock_key)
 
 @shared_task(queue='client_acknowledgement')
 def send_wallet_history_push_notification_task(wallet_history_id):
@@ -2159,8 +2181,18 @@ def send_wallet_history_push_notification_task(wallet_history_id):
         LOGGER.exception(exception)
 
 
-@shared_task(bind=True, queue='post_save_record', max_retries=10)
-def transaction_post_save_task(self, address, transaction_id, blockheight_id=None):
+@shared_task(
+    bind=True,
+    queue='post_save_record',
+    max_retries=10,
+    base=DedupeTask,
+    dedupe={ 'args': ('address', 'transaction_id', 'blockheight_id', 'transaction_ids') },
+)
+def transaction_post_save_task(self, address, transaction_id, blockheight_id=None, transaction_ids=None):
+    """
+        transaction_ids: other rows of the same txid and wallet coalesced into this task,
+            see main.utils.cache_buffer
+    """
     # txid = Transaction.objects.values_list("txid", flat=True).filter(id=transaction_id).first()
     # if not txid: return
     txid = None
@@ -2333,7 +2365,10 @@ def transaction_post_save_task(self, address, transaction_id, blockheight_id=Non
                 source=NODE.BCH.source,
             )
 
-    # Call task to parse wallet history
+    # Call task to parse wallet history, the bch wallets of the tx are built together
+    if senders['bch'] and recipients['bch'] and any(handle.startswith('bch|') for handle in wallets):
+        build_tx_wallet_histories.delay(txid, tx_fee, senders['bch'], recipients['bch'])
+
     for wallet_handle in set(wallets):
         if wallet_handle.split('|')[0] == 'slp':
             if senders['slp'] and recipients['slp']:
@@ -2344,15 +2379,6 @@ def transaction_post_save_task(self, address, transaction_id, blockheight_id=Non
                     senders['slp'],
                     recipients['slp']
                 )
-        if wallet_handle.split('|')[0] == 'bch':
-            if senders['bch'] and recipients['bch']:
-                parse_wallet_history.delay(
-                    txid,
-                    wallet_handle,
-                    tx_fee,
-                    senders['bch'],
-                    recipients['bch']
-                )
     
     if parse_contract:
         parse_contract_history.delay(
@@ -2384,39 +2410,30 @@ def transaction_post_save_task(self, address, transaction_id, blockheight_id=Non
                 )
     
     # Mark txn as processed
-    Transaction.objects.filter(id=transaction_id).update(post_save_processed=timezone.now())
+    Transaction.objects.filter(id__in=transaction_ids or [transaction_id]).update(post_save_processed=timezone.now())
 
     return list(set(wallets))
 
 
-@shared_task(queue='rescan_utxos')
-def rescan_utxos(wallet_hash, full=False):
+@shared_task(queue='rescan_utxos', base=DedupeTask, dedupe={ 'args': ('wallet_hash', 'full', 'force') })
+def rescan_utxos(wallet_hash, full=False, force=False):
     wallet = Wallet.objects.get(wallet_hash=wallet_hash)
     if full:
         addresses = wallet.addresses.all()
     else:
         addresses = wallet.addresses.filter(transactions__spent=False)
 
-    # delete cached bch balance
-    cache = settings.REDISKV
-    bch_cache_key = f'wallet:balance:bch:{wallet_hash}'
-    cache.delete(bch_cache_key)
-
-    # delete cached token balance
-    ct_cache_keys = cache.keys(f'wallet:balance:token:{wallet_hash}:*')
-    if ct_cache_keys:
-        cache.delete(*ct_cache_keys)
+    # delete cached bch and token balances
+    clear_wallet_balance_cache(wallet_hash)
 
     # delete cached wallet history
-    history_cache_keys = cache.keys(f'wallet:history:{wallet_hash}:*')
-    if history_cache_keys:
-        cache.delete(*history_cache_keys)
+    clear_wallet_history_cache(wallet_hash)
 
     try:
-        for address in addresses:
-            if wallet.wallet_type == 'bch':
-                get_bch_utxos(address.address)
-            elif wallet.wallet_type == 'slp':
+        if wallet.wallet_type == 'bch':
+            _rescan_bch_utxos(addresses.distinct(), force=force)
+        elif wallet.wallet_type == 'slp':
+            for address in addresses:
                 get_slp_utxos(address.address)
         wallet.last_utxo_scan_succeeded = True
         wallet.save()
@@ -2426,6 +2443,38 @@ def rescan_utxos(wallet_hash, full=False):
         raise exc
 
 
+def _rescan_bch_utxos(addresses, force=False):
+    """
+        Runs `get_bch_utxos` only on addresses whose electrum status changed since
+        their last scan (all addresses if `force`), concurrently.
+    """
+    addresses = list(addresses.values_list('id', 'address', 'scripthash_status'))
+    statuses = NODE.BCH.get_address_statuses([address for _, address, _ in addresses])
+
+    changed = []
+    for address_id, address, last_status in addresses:
+        # addresses whose status could not be fetched are always rescanned
+        if force or address not in statuses or statuses[address] != last_status:
+            changed.append((address_id, address))
+
+    LOGGER.info(f'Rescanning {len(changed)} of {len(addresses)} address(es)')
+    if not changed:
+        return
+
+    def _rescan(address_id, address):
+        try:
+            get_bch_utxos(address)
+            if address in statuses:
+                Address.objects.filter(id=address_id).update(scripthash_status=statuses[address])
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=settings.RESCAN_UTXOS_CONCURRENCY) as executor:
+        futures = [executor.submit(_rescan, address_id, address) for address_id, address in changed]
+        for future in futures:
+            future.result()
+
+
 def rebuild_address_wallet_history(address, tx_count_limit=30, ignore_txids=[]):
     data = get_bch_transactions(address, chipnet=settings.BCH_NETWORK == 'chipnet')
     if isinstance(data, list) and tx_count_limit:
@@ -2540,23 +2589,19 @@ def parse_tx_wallet_histories(txid, txn_details=None, proceed_with_zero_amount=F
             .first()
 
     # parse wallet history of bch wallets
-    wallet_handles = []
-    for wallet in wallets:
-        wallet_handle = f"bch|{wallet.wallet_hash}"
-        wallet_handles.append(wallet_handle)
+    wallet_handles = [f"bch|{wallet.wallet_hash}" for wallet in wallets]
+    if wallet_handles:
         if immediate:
-            parse_wallet_history(
+            build_tx_wallet_histories(
                 txid,
-                wallet_handle,
                 tx_fee,
                 inputs,
                 outputs,
                 proceed_with_zero_amount=proceed_with_zero_amount,
             )
         else:
-            parse_wallet_history.delay(
+            build_tx_wallet_histories.delay(
                 txid,
-                wallet_handle,
                 tx_fee,
                 inputs,
                 outputs,
@@ -2960,7 +3005,12 @@ def parse_wallet_history_market_values(wallet_history_id):
     }
 
 
-@shared_task(queue='wallet_history_2', max_retries=3)
+@shared_task(
+    queue='wallet_history_2',
+    max_retries=3,
+    base=DedupeTask,
+    dedupe={ 'args': ('wallet_hash', 'currency') },
+)
 def update_wallet_history_currency(wallet_hash, currency):
     return save_wallet_history_currency(wallet_hash, currency)
 
@@ -2972,12 +3022,15 @@ def populate_token_addresses():
         models.Q(address__startswith='bchtest:')
     ).filter(
         token_address__isnull=True
-    ).order_by('id')
+    ).order_by('id').values_list('id', 'address')
 
-    for obj in bch_addresses:
-        if is_bch_address(obj.address): # double check here
-            obj.token_address = bch_address_converter(obj.address)
-            obj.save()
+    for rows in chunks(list(bch_addresses), 1000):
+        token_addresses = cashaddr.convert_many([address for _, address in rows], to_token=True)
+        objs = []
+        for address_id, address in rows:
+            if is_bch_address(address): # double check here
+                objs.append(Address(id=address_id, token_address=token_addresses[address]))
+        Address.objects.bulk_update(objs, ['token_address'])
 
 
 def _process_mempool_transaction(tx_hash, tx_hex=None, immediate=False, force=False):
@@ -3418,3 +3471,9 @@ def publish_subscribed_addresses_to_mqtt_task(addresses_list):
     """
     from main.utils.subscription import _publish_subscribed_addresses_to_mqtt_sync
     return _publish_subscribed_addresses_to_mqtt_sync(addresses_list)
+
+
+@shared_task(queue='wallet_history_2')
+def prune_wallet_changes_task():
+    from main.utils.wallet_changes import prune_wallet_changes
+    return prune_wallet_changes()
@@ -106,6 +106,9 @@ main_urls += [
     re_path(
         r"^blockheight/latest/$", views.BlockHeightViewSet.as_view(), name="blockheight"
     ),
+    re_path(
+        r"^blockheight/status/$", views.BlockHeightStatusView.as_view(), name="blockheight-status"
+    ),
     re_path(
         r"^blockchain/info/$", views.BlockChainView.as_view(), name="blockchain-info"
     ),
@@ -248,6 +251,11 @@ main_urls += [
         views.RebuildHistoryView.as_view(),
         name="rebuild-wallet-history",
     ),
+    re_path(
+        r"^wallet/(?P<wallethash>[\w+:]+)/changes/$",
+        views.WalletChangesView.as_view(),
+        name="wallet-changes",
+    ),
     re_path(
         r"^last-address-index/wallet/(?P<wallethash>[\w+:]+)/$",
         views.LastAddressIndexView.as_view(),
@@ -0,0 +1,176 @@
+import logging
+
+import bip32utils
+from django.conf import settings
+
+from main.utils.queries.node import Node
+from main.utils.tx_decoder import locking_bytecode_to_address, p2pkh_locking_bytecode
+
+LOGGER = logging.getLogger(__name__)
+
+NODE = Node()
+
+RECEIVING = 0
+CHANGE = 1
+
+
+class InvalidXpubKeyError(ValueError):
+    pass
+
+
+class AddressDiscoveryError(Exception):
+    """
+        Raised when no address of a batch could be checked, e.g. during a Fulcrum outage
+    """
+    pass
+
+
+class XpubAddressDeriver(object):
+    """
+        Derives the receiving (0/index) and change (1/index) addresses of an account level xpub,
+        same derivation as paytacapos.utils.cash_out.generate_address_set_from_xpubkey
+    """
+
+    def __init__(self, xpubkey):
+        try:
+            key = bip32utils.BIP32Key.fromExtendedKey(xpubkey, public=True)
+        except Exception as exc:
+            raise InvalidXpubKeyError(f"Invalid xpubkey: {exc}") from exc
+        # derive the chain keys once, only the last level is derived per index
+        self.chains = {
+            "receiving": key.ChildKey(RECEIVING),
+            "change": key.ChildKey(CHANGE),
+        }
+
+    def derive(self, address_index):
+        address_set = { "address_index": address_index }
+        for name, chain_key in self.chains.items():
+            pubkey_hash = chain_key.ChildKey(address_index).Identifier()
+            address_set[name] = locking_bytecode_to_address(p2pkh_locking_bytecode(pubkey_hash))
+        return address_set
+
+    def derive_range(self, start, count):
+        return [self.derive(address_index) for address_index in range(start, start + count)]
+
+
+class AddressDiscovery(object):
+    """
+        Checks address sets for transaction history in batches of `gap_limit` indexes,
+        each batch is a single pipelined round trip to Fulcrum (blockchain.address.get_first_use).
+        Scanning stops once `gap_limit` consecutive indexes have no history on both
+        receiving and change addresses.
+
+        Address sets are either provided (`address_sets`) or derived from `xpubkey`.
+        With provided address sets and no `gap_limit`, every set is checked.
+
+        At most `max_indexes` indexes are checked, `truncated` is reported when the scan
+        stopped there before reaching the gap limit. A batch where no address could be
+        checked raises AddressDiscoveryError instead of being counted as used.
+    """
+
+    def __init__(self, address_sets=None, xpubkey=None, gap_limit=None, start_index=0, max_indexes=None):
+        if address_sets is None and not xpubkey:
+            raise ValueError("address_sets or xpubkey is required")
+
+        self.address_sets = sorted(address_sets or [], key=lambda address_set: address_set["address_index"])
+        self.deriver = XpubAddressDeriver(xpubkey) if xpubkey and address_sets is None else None
+        self.gap_limit = gap_limit
+        if self.deriver and not self.gap_limit:
+            self.gap_limit = settings.ADDRESS_DISCOVER_GAP_LIMIT
+
+        self.start_index = start_index
+        self.max_indexes = max_indexes or settings.ADDRESS_DISCOVER_MAX_INDEXES
+
+        self.results = []
+        self.last_used_index = None
+        self.gap = 0
+        self.truncated = False
+
+    def _batches(self):
+        batch_size = self.gap_limit or len(self.address_sets) or 1
+        if self.deriver:
+            index = self.start_index
+            end = self.start_index + self.max_indexes
+            while index < end:
+                count = min(batch_size, end - index)
+                yield self.deriver.derive_range(index, count)
+                index += count
+        else:
+            address_sets = self.address_sets[:self.max_indexes]
+            for i in range(0, len(address_sets), batch_size):
+                yield address_sets[i:i + batch_size]
+
+    def _check_batch(self, address_sets):
+        addresses = []
+        for address_set in address_sets:
+            addresses += [address_set.get("receiving"), address_set.get("change")]
+        addresses = [address for address in addresses if address]
+        try:
+            histories = NODE.BCH.check_addresses_history(addresses)
+        except Exception as exc:
+            LOGGER.exception("Failed to check transaction history of address sets")
+            raise AddressDiscoveryError("Failed to check transaction history of address sets") from exc
+
+        if addresses and all(histories.get(address) is None for address in addresses):
+            raise AddressDiscoveryError("Failed to check transaction history of address sets")
+        return histories
+
+    def _process_batch(self, address_sets):
+        """
+            Returns True once the gap limit is reached
+        """
+        histories = self._check_batch(address_sets)
+        for address_set in address_sets:
+            result = { "address_index": address_set["address_index"] }
+            used = False
+            unknown = False
+
+            for key in ("receiving", "change"):
+                address = address_set.get(key)
+                if not address:
+                    continue
+
+                has_history = histories.get(address)
+                if has_history is None:
+                    LOGGER.warning(
+                        "Failed to check transaction history for %s address: %s",
+                        key,
+                        address,
+                    )
+                    unknown = True
+                    continue
+
+                used = used or has_history
+                result[key] = {
+                    "address": address,
+                    "has_history": has_history
+                }
+
+            self.results.append(result)
+
+            # an index that could not be checked does not count towards the gap
+            if used:
+                self.last_used_index = address_set["address_index"]
+            if used or unknown:
+                self.gap = 0
+                continue
+
+            self.gap += 1
+            if self.gap_limit and self.gap >= self.gap_limit:
+                return True
+
+        return False
+
+    def run(self):
+        for address_sets in self._batches():
+            if self._process_batch(address_sets):
+                break
+        else:
+            # ran out of indexes to check before the gap limit
+            self.truncated = bool(self.deriver) or len(self.address_sets) > self.max_indexes
+
+        return {
+            "results": self.results,
+            "last_used_index": self.last_used_index,
+            "truncated": self.truncated,
+        }
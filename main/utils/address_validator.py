@@ -1,8 +1,8 @@
 # from subprocess import Popen, PIPE
 from django.conf import settings
 from cashaddress import convert
-import requests
-import json
+
+from main.utils import cashaddr
 
 
 SLP_MAIN_ADDR_LEN = 55
@@ -23,17 +23,11 @@ def is_slp_address(addr, check_len=True):
 
 
 def is_bch_address(addr, to_token_addr=False):
-
     if addr:
         if is_slp_address(addr):
             return False
+        return cashaddr.is_valid(addr, token=to_token_addr)
 
-        result = { 'valid': False }
-        url = f'http://localhost:3000/validate-address/{addr}?token={to_token_addr}'
-        resp = requests.get(url)
-        result = resp.json()
-        return result['valid']
-    
     return False
 
 
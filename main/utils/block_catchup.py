@@ -0,0 +1,187 @@
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.utils import timezone
+
+from main.models import BlockHeight
+from main.utils.block_ingestion import BlockIngestor
+from main.utils.queries.bchn import BCHN
+
+LOGGER = logging.getLogger(__name__)
+REDIS_STORAGE = settings.REDISKV
+
+LOCK_KEY = "BLOCK-CATCHUP:LOCK"
+STATUS_KEY = "BLOCK-CATCHUP:STATUS"
+
+# NOTE: first block in the table is a mysterious block w/ number that matches max int value
+MAX_BLOCK_NUMBER = 1000000000
+
+
+def get_pending_blocks(limit=None):
+    blocks = BlockHeight.objects.filter(
+        processed=False,
+        requires_full_scan=True,
+        number__lt=MAX_BLOCK_NUMBER,
+    ).order_by("number").values_list("number", flat=True)
+    if limit:
+        blocks = blocks[:limit]
+    return list(blocks)
+
+
+def get_catchup_status():
+    """
+        Progress of block scanning, exposed alongside `BlockHeight.processed`:
+            tip: highest known block
+            last_processed: highest processed block
+            pending: blocks waiting for a full scan
+            lag: tip - lowest pending block (0 when caught up)
+        plus stats of the last catch-up run (blocks, seconds, blocks_per_minute).
+    """
+    blocks = BlockHeight.objects.filter(number__lt=MAX_BLOCK_NUMBER)
+    tip = blocks.order_by("-number").values_list("number", flat=True).first() or 0
+    last_processed = blocks.filter(processed=True).order_by("-number") \
+        .values_list("number", flat=True).first() or 0
+    pending = blocks.filter(processed=False, requires_full_scan=True)
+    oldest_pending = pending.order_by("number").values_list("number", flat=True).first()
+
+    status = dict(
+        tip=tip,
+        last_processed=last_processed,
+        pending=pending.count(),
+        lag=tip - oldest_pending + 1 if oldest_pending else 0,
+        catching_up=bool(REDIS_STORAGE.exists(LOCK_KEY)),
+    )
+
+    last_run = REDIS_STORAGE.get(STATUS_KEY)
+    if last_run:
+        status["last_run"] = json.loads(last_run)
+    return status
+
+
+class BlockCatchup(object):
+    """
+        Pipelined block scanner used by `manage_blocks`.
+
+        Stages:
+            1. prefetch - up to `window` blocks are fetched from BCHN in parallel
+            2. parse - each fetched block is parsed in the same worker thread
+            3. commit - blocks are written in height order from the calling thread
+
+        While block N is being committed, blocks N+1..N+window are already being
+        fetched/parsed. A block that fails stops the run, it stays `processed=False`
+        and is retried on the next run.
+
+        Only one catch-up runs at a time, guarded by a redis lock with a TTL so a
+        killed worker does not block scanning indefinitely.
+    """
+
+    def __init__(self, window=None, max_blocks=None, lock_timeout=None):
+        self.window = max(window or settings.BLOCK_CATCHUP_WINDOW, 1)
+        self.max_blocks = max_blocks or settings.BLOCK_CATCHUP_MAX_BLOCKS
+        self.lock_timeout = lock_timeout or settings.BLOCK_CATCHUP_LOCK_TIMEOUT
+        self.lock_token = str(uuid.uuid4())
+        self.processed = []
+
+    def acquire_lock(self):
+        return bool(REDIS_STORAGE.set(LOCK_KEY, self.lock_token, nx=True, ex=self.lock_timeout))
+
+    def extend_lock(self):
+        if REDIS_STORAGE.get(LOCK_KEY) == self.lock_token.encode():
+            REDIS_STORAGE.expire(LOCK_KEY, self.lock_timeout)
+
+    def release_lock(self):
+        if REDIS_STORAGE.get(LOCK_KEY) == self.lock_token.encode():
+            REDIS_STORAGE.delete(LOCK_KEY)
+
+    def fetch(self, number):
+        """ Runs in a worker thread, must not touch the database """
+        bchn = BCHN()
+        transactions = bchn.get_block(number, verbosity=3)
+        block_time = bchn.get_block_stats(number, stats=["time"])["time"]
+
+        if settings.BULK_BLOCK_INGESTION:
+            # BlockIngestor.block is only read during commit(), set in process()
+            ingestor = BlockIngestor(None, transactions, block_time=block_time, source=bchn.source)
+            ingestor._timed("parse", ingestor.parse)
+            return number, transactions, block_time, ingestor
+
+        parsed_txs = []
+        for tx in transactions:
+            tx["time"] = block_time # tx is from .get_block() which doesn't return tx's timestamp
+            parsed_txs.append(bchn._parse_transaction(tx))
+        return number, transactions, block_time, parsed_txs
+
+    def process(self, number, transactions, block_time, parsed):
+        from main.tasks import save_transaction, ready_to_accept
+
+        block = BlockHeight.objects.filter(number=number).first()
+        if not block:
+            return
+
+        block_age = timezone.now().timestamp() - block_time
+        LOGGER.info(f"Processing block {block.number} (age: {block_age:.1f}s, "
+                    f"txs: {len(transactions)})")
+
+        if isinstance(parsed, BlockIngestor):
+            parsed.block = block
+            parsed.commit()
+        else:
+            for parsed_tx in parsed:
+                save_transaction(parsed_tx, block_id=block.id)
+
+        ready_to_accept(block.number, len(transactions))
+        self.processed.append(block.number)
+
+    def run(self):
+        if not self.acquire_lock():
+            return "BLOCK CATCH-UP ALREADY RUNNING"
+
+        start = time.perf_counter()
+        try:
+            blocks = get_pending_blocks(limit=self.max_blocks)
+            if not blocks:
+                return "NO PENDING BLOCKS"
+
+            with ThreadPoolExecutor(max_workers=self.window) as executor:
+                queue = blocks[::-1]
+                futures = []
+                while queue and len(futures) < self.window:
+                    futures.append(executor.submit(self.fetch, queue.pop()))
+
+                try:
+                    while futures:
+                        result = futures.pop(0).result()
+                        if queue:
+                            futures.append(executor.submit(self.fetch, queue.pop()))
+                        self.process(*result)
+                        self.extend_lock()
+                except Exception as exception:
+                    LOGGER.exception(exception)
+                finally:
+                    for future in futures:
+                        future.cancel()
+        finally:
+            self.release_lock()
+            self.save_stats(time.perf_counter() - start)
+
+        return f"PROCESSED {len(self.processed)} BLOCK(S)"
+
+    def save_stats(self, duration):
+        if not self.processed:
+            return
+
+        stats = dict(
+            blocks=len(self.processed),
+            first_block=self.processed[0],
+            last_block=self.processed[-1],
+            window=self.window,
+            seconds=round(duration, 3),
+            blocks_per_minute=round(len(self.processed) * 60 / duration, 2),
+            finished=timezone.now().isoformat(),
+        )
+        LOGGER.info(f"BLOCK CATCH-UP | {stats}")
+        REDIS_STORAGE.set(STATUS_KEY, json.dumps(stats))
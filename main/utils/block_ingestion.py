@@ -0,0 +1,390 @@
+import logging
+import time
+from datetime import datetime
+
+import pytz
+from django.conf import settings
+from django.db import transaction as trans
+from django.utils import timezone
+from psqlextra.types import ConflictAction
+
+from main.models import (
+    Address,
+    BlockHeight,
+    Subscription,
+    Token,
+    Transaction,
+    WalletHistory,
+)
+from main.utils.address_validator import is_p2sh_address
+from main.utils.cache_buffer import coalesce_invalidations
+from main.utils.chunk import chunks
+from main.utils.history_builder import build_wallet_histories
+from main.utils.queries.bchn import BCHN
+from main.utils.queries.parse_utils import flatten_output_data, parse_utxo_to_tuple
+from main.utils.transaction_processing import mark_outpoints_spent
+
+LOGGER = logging.getLogger(__name__)
+
+# Number of values passed in a single `IN (...)` / bulk statement
+QUERY_CHUNK_SIZE = 1000
+
+
+class BlockIngestor(object):
+    """
+        Set-based ingestion of a whole block.
+
+        Takes the payload of `BCHN.get_block(..., verbosity=3)` and replaces the
+        per-transaction `save_transaction()` loop with a handful of queries:
+            1. resolve which outputs & inputs touch subscribed/known addresses
+            2. bulk insert the new BCH outputs as `Transaction` rows
+            3. mark the spent outpoints in one statement
+            4. bulk assign `blockheight_id` to already saved transactions
+            5. (BLOCK_HISTORY_PASS) build the wallet histories of the block's txs as a set,
+               see `build_histories()`
+
+        CashToken outputs are rare and need BCMR metadata resolution, so they still
+        go through `process_output()`.
+
+        Usage:
+            stats = BlockIngestor(block, transactions, block_time=block_time).run()
+    """
+
+    def __init__(self, block:BlockHeight, transactions:list, block_time=None, source="bchn"):
+        self.block = block
+        self.transactions = transactions
+        self.block_time = block_time
+        self.source = source
+        self.bch = BCHN()
+        self.timings = {}
+
+        self.outputs = []  # [(txid, output_data), ...]
+        self.inputs = {}  # { (prev_txid, prev_index): (spending_txid, prev_address) }
+
+        self.subscribed_addresses = {}  # { address: (address_id, wallet_id) }
+        self.bch_wallet_ids = set()
+        self.relevant_txids = set()
+        self.existing_txids = set()
+        self.created_transactions = []
+        self.spent_transaction_ids = []
+        self.spending_txids = set()
+        self.known_input_addresses = set()
+
+        # post save tasks of bch wallet outputs, left to the history pass
+        self.history_pass = settings.BLOCK_HISTORY_PASS
+        self.deferred_post_save_tasks = []  # [(txid, address, transaction_id, wallet_hash), ...]
+        self.post_save_txids = set()
+        self.built_histories = 0
+
+    def _timed(self, name, func):
+        start = time.perf_counter()
+        result = func()
+        self.timings[name] = round(time.perf_counter() - start, 4)
+        return result
+
+    @property
+    def tx_timestamp(self):
+        if self.block_time is None:
+            return None
+        return datetime.fromtimestamp(self.block_time).replace(tzinfo=pytz.UTC)
+
+    def run(self):
+        self._timed("parse", self.parse)
+        return self.commit()
+
+    def commit(self):
+        """
+            Database phase of `run()`. `parse()` does not touch the database so it can be
+            done beforehand in another thread, see `main.utils.block_catchup`.
+        """
+        start = time.perf_counter()
+        self._timed("resolve", self.resolve)
+        with trans.atomic():
+            self._timed("insert", self.insert_outputs)
+            self._timed("spend", self.mark_spent_inputs)
+            self._timed("blockheight", self.assign_blockheight)
+            self._timed("side_effects", self.queue_side_effects)
+        if self.history_pass:
+            self._timed("history", self.run_history_pass)
+        self.timings["total"] = round(time.perf_counter() - start + self.timings.get("parse", 0), 4)
+
+        stats = self.get_stats()
+        LOGGER.info(f"BLOCK INGESTION {self.block.number} | {stats}")
+        return stats
+
+    def get_stats(self):
+        return dict(
+            block=self.block.number,
+            txs=len(self.transactions),
+            outputs=len(self.outputs),
+            inputs=len(self.inputs),
+            subscribed_addresses=len(self.subscribed_addresses),
+            existing_txids=len(self.existing_txids),
+            created=len(self.created_transactions),
+            spent=len(self.spent_transaction_ids),
+            histories=self.built_histories,
+            timings=self.timings,
+        )
+
+    def parse(self):
+        for tx in self.transactions:
+            vin = tx.get("vin") or []
+            if vin and "coinbase" in vin[0]:
+                continue
+
+            txid = tx["txid"]
+            for tx_output in tx.get("vout", []):
+                output_data = self.bch._parse_output(tx_output)
+                if not output_data.get("address"):
+                    continue
+                self.outputs.append((txid, output_data))
+
+            for tx_input in vin:
+                prev_address = tx_input.get("prevout", {}).get("scriptPubKey", {}).get("address")
+                self.inputs[(tx_input["txid"], tx_input["vout"])] = (txid, prev_address)
+
+    def resolve(self):
+        output_addresses = { output_data["address"] for _, output_data in self.outputs }
+        for addresses_chunk in chunks(list(output_addresses), QUERY_CHUNK_SIZE):
+            subscriptions = Subscription.objects \
+                .filter(address__address__in=addresses_chunk) \
+                .values_list("address__address", "address_id", "address__wallet_id", "address__wallet__wallet_type") \
+                .distinct()
+            for address, address_id, wallet_id, wallet_type in subscriptions:
+                self.subscribed_addresses[address] = (address_id, wallet_id)
+                if wallet_type == "bch":
+                    self.bch_wallet_ids.add(wallet_id)
+
+        self.relevant_txids = {
+            txid for txid, output_data in self.outputs
+            if output_data["address"] in self.subscribed_addresses
+        }
+        for txids_chunk in chunks(list(self.relevant_txids), QUERY_CHUNK_SIZE):
+            self.existing_txids.update(
+                Transaction.objects.filter(txid__in=txids_chunk).values_list("txid", flat=True).distinct()
+            )
+
+    def insert_outputs(self):
+        from main.tasks import process_output
+
+        bch_token, _ = Token.objects.get_or_create(name="bch")
+        rows = []
+        for txid, output_data in self.outputs:
+            if txid in self.existing_txids:
+                continue
+
+            address = output_data["address"]
+            if address not in self.subscribed_addresses:
+                continue
+
+            (index, _, value, category, *_) = flatten_output_data(output_data)
+            if category:
+                process_output(
+                    output_data,
+                    txid,
+                    block_id=self.block.id,
+                    timestamp=self.block_time,
+                    source=self.source,
+                )
+                continue
+
+            address_id, wallet_id = self.subscribed_addresses[address]
+            rows.append(dict(
+                txid=txid,
+                address_id=address_id,
+                wallet_id=wallet_id,
+                token_id=bch_token.id,
+                index=index,
+                value=int(value),
+                source=self.source,
+                blockheight_id=self.block.id,
+                tx_timestamp=self.tx_timestamp,
+                spent=False,
+            ))
+
+        for rows_chunk in chunks(rows, QUERY_CHUNK_SIZE):
+            # ON CONFLICT DO NOTHING only returns rows that were actually inserted
+            created = Transaction.objects \
+                .on_conflict(["txid", "address", "index"], ConflictAction.NOTHING) \
+                .bulk_insert(rows_chunk, return_model=True)
+            self.created_transactions += created or []
+
+    def mark_spent_inputs(self):
+        prev_addresses = { prev_address for _, prev_address in self.inputs.values() if prev_address }
+        known_addresses = set()
+        for addresses_chunk in chunks(list(prev_addresses), QUERY_CHUNK_SIZE):
+            known_addresses.update(
+                Address.objects.filter(address__in=addresses_chunk).values_list("address", flat=True)
+            )
+        if not known_addresses:
+            return
+
+        self.known_input_addresses = known_addresses
+        self.spending_txids = {
+            spending_txid for spending_txid, prev_address in self.inputs.values()
+            if prev_address in known_addresses
+        }
+        outpoints = [
+            (prev_txid, prev_index, spending_txid)
+            for (prev_txid, prev_index), (spending_txid, prev_address) in self.inputs.items()
+            if prev_address in known_addresses
+        ]
+        spent = mark_outpoints_spent(outpoints)
+        self.spent_transaction_ids = spent["transaction_ids"]
+
+    def assign_blockheight(self):
+        for txids_chunk in chunks(list(self.existing_txids), QUERY_CHUNK_SIZE):
+            Transaction.objects.filter(txid__in=txids_chunk).update(blockheight_id=self.block.id)
+
+    def queue_side_effects(self):
+        """
+            Replicates what `save_record()` and the `transaction_post_save` signal do for
+            rows created through `.save()`, batched per block.
+        """
+        if not self.created_transactions:
+            return
+
+        from main.tasks import client_acknowledgement
+        import rampp2p.utils.transaction as rampp2p_utils
+
+        address_map = { address_id: address for address, (address_id, _) in self.subscribed_addresses.items() }
+        address_ids = set()
+        wallet_ids = set()
+        for txn in self.created_transactions:
+            address_ids.add(txn.address_id)
+            if txn.wallet_id:
+                wallet_ids.add(txn.wallet_id)
+            rampp2p_utils.process_transaction(txn.txid, address_map[txn.address_id])
+
+        Address.objects.filter(id__in=address_ids, advance_subscription=True) \
+            .update(advance_subscription=False)
+
+        wallet_hashes = dict(
+            Address.objects.filter(wallet_id__in=wallet_ids)
+            .values_list("wallet_id", "wallet__wallet_hash").distinct()
+        )
+
+        with coalesce_invalidations() as buffer:
+            for address_id in address_ids:
+                buffer.add_address_balance(address_map[address_id])
+
+            for wallet_hash in wallet_hashes.values():
+                buffer.add_wallet_balance(wallet_hash, [])
+                buffer.add_wallet_history(wallet_hash, "bch")
+
+            for txn in self.created_transactions:
+                address = address_map[txn.address_id]
+                wallet_hash = wallet_hashes.get(txn.wallet_id)
+                if self.history_pass and txn.wallet_id in self.bch_wallet_ids and not is_p2sh_address(address):
+                    self.deferred_post_save_tasks.append((txn.txid, address, txn.id, wallet_hash))
+                    continue
+                buffer.add_post_save_task(txn.txid, address, txn.id, self.block.id, wallet_hash=wallet_hash)
+                self.post_save_txids.add(txn.txid)
+
+        def _queue_tasks():
+            for txn in self.created_transactions:
+                client_acknowledgement.delay(txn.id)
+
+        trans.on_commit(_queue_tasks)
+
+    def run_history_pass(self):
+        try:
+            self.build_histories()
+        except Exception as exception:
+            LOGGER.exception(exception)
+            # fall back to the post save task of each deferred tx and wallet
+            with coalesce_invalidations() as buffer:
+                for txid, address, transaction_id, wallet_hash in self.deferred_post_save_tasks:
+                    buffer.add_post_save_task(txid, address, transaction_id, self.block.id, wallet_hash=wallet_hash)
+
+    def fill_tx_timestamps(self, txids, buffer):
+        """
+            Sets the block time of the WalletHistory and Transaction rows of `txids` recorded
+            without one (e.g. from the mempool), and queues the invalidations of their wallets'
+            and addresses' caches, which the bulk `.update()` does not signal.
+        """
+        histories = WalletHistory.objects.filter(txid__in=txids, tx_timestamp__isnull=True)
+        for wallet_hash in histories.values_list("wallet__wallet_hash", flat=True).distinct():
+            buffer.add_wallet_history(wallet_hash)
+        histories.update(tx_timestamp=self.tx_timestamp)
+
+        transactions = Transaction.objects.filter(txid__in=txids, tx_timestamp__isnull=True)
+        for address, wallet_hash in transactions.values_list("address__address", "wallet__wallet_hash").distinct():
+            if address:
+                buffer.add_address_balance(address)
+            buffer.add_wallet_balance(wallet_hash, [])
+            buffer.add_wallet_history(wallet_hash)
+        transactions.update(tx_timestamp=self.tx_timestamp)
+
+    def build_histories(self):
+        """
+            Block scoped wallet history pass, run once the block's outputs are committed.
+            In place of a `transaction_post_save_task` (and a node request) per tx and wallet:
+                1. confirms the history of the txs already recorded from the mempool,
+                   filling the block time where missing
+                2. builds the history of every other tx of the block that touches a bch
+                   wallet as one set, see `build_wallet_histories()`
+                3. queues one notification task per wallet
+        """
+        from main.tasks import parse_contract_history, process_wallet_histories_task
+
+        deferred_txids = { txid for txid, *_ in self.deferred_post_save_tasks }
+        txids = self.relevant_txids | self.spending_txids
+        if not txids:
+            return
+
+        recorded_txids = set()
+        with coalesce_invalidations() as buffer:
+            for txids_chunk in chunks(list(txids), QUERY_CHUNK_SIZE):
+                recorded_txids.update(
+                    WalletHistory.objects.filter(txid__in=txids_chunk).values_list("txid", flat=True).distinct()
+                )
+                if self.tx_timestamp:
+                    self.fill_tx_timestamps(txids_chunk, buffer)
+
+        # outputs of a recorded tx can still be new to a wallet, those txs are rebuilt too
+        build_txids = (txids - recorded_txids) | deferred_txids
+        txs = []
+        for tx in self.transactions:
+            vin = tx.get("vin") or []
+            if tx["txid"] not in build_txids or (vin and "coinbase" in vin[0]):
+                continue
+            parsed_tx = self.bch._parse_transaction({ **tx, "time": self.block_time })
+            txs.append(dict(
+                txid=tx["txid"],
+                tx_fee=parsed_tx["tx_fee"],
+                senders=[parse_utxo_to_tuple(i) for i in parsed_tx["inputs"]],
+                recipients=[parse_utxo_to_tuple(i) for i in parsed_tx["outputs"]],
+            ))
+
+        with trans.atomic(), coalesce_invalidations():
+            histories = build_wallet_histories(txs)
+            Transaction.objects.filter(id__in=[transaction_id for _, _, transaction_id, _ in self.deferred_post_save_tasks]) \
+                .update(post_save_processed=timezone.now())
+        self.built_histories = len(histories)
+
+        wallet_histories = {}  # { wallet_id: (history ids, created history ids) }
+        for history, created, _ in histories:
+            history_ids, created_ids = wallet_histories.setdefault(history.wallet_id, ([], []))
+            history_ids.append(history.id)
+            if created:
+                created_ids.append(history.id)
+        for history_ids, created_ids in wallet_histories.values():
+            process_wallet_histories_task.delay(history_ids, created_ids)
+
+        # contract inputs of the txs that no longer have a post save task to parse them
+        for tx in txs:
+            if tx["txid"] not in deferred_txids or tx["txid"] in self.post_save_txids:
+                continue
+            contract_addresses = {
+                info[0] for info in tx["senders"]
+                if info[0] in self.known_input_addresses and is_p2sh_address(info[0])
+            }
+            for contract_address in contract_addresses:
+                parse_contract_history.delay(
+                    tx["txid"],
+                    contract_address,
+                    tx_fee=tx["tx_fee"],
+                    senders=tx["senders"],
+                    recipients=tx["recipients"],
+                )
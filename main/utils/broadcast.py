@@ -7,6 +7,7 @@ from asgiref.sync import async_to_sync
 from Crypto.Hash import SHA256  # pycryptodome
 from main.mqtt import publish_message
 from main.utils.queries.node import Node
+from main.utils.tx_decoder import get_input_outpoints
 from django.apps import apps
 from django.conf import settings
 from django.utils import timezone
@@ -23,12 +24,7 @@ BROADCAST_LOCK_TIMEOUT = 30  # seconds
 
 def _get_input_outpoints(tx_hex):
     """Extract input outpoints (txid, vout) from raw transaction hex."""
-    tx = NODE.BCH._decode_raw_transaction(tx_hex)
-    outpoints = []
-    for vin in tx.get('vin', []):
-        if 'txid' in vin and 'vout' in vin:
-            outpoints.append((vin['txid'], vin['vout']))
-    return outpoints
+    return get_input_outpoints(tx_hex)
 
 
 def _acquire_broadcast_locks(outpoints):
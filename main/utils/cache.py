@@ -1,6 +1,4 @@
-import base64
 import datetime
-import pickle
 import math
 
 from django.conf import settings
@@ -10,6 +8,178 @@ from main.models import Transaction, WalletHistory, Wallet
 from main.utils.address_validator import is_bch_address
 
 
+# Cached wallet responses are grouped in namespaces with a generation counter embedded
+# in their keys, e.g. `wallet:history:{wallet_hash}:{generation}:...`. A whole namespace
+# is invalidated with a single INCR of its counter instead of KEYS + DEL, entries of
+# older generations are never read again and expire by their own TTL.
+# Counters outlive every cached entry so an expired counter can't revive old entries.
+CACHE_GENERATION_TTL = 60 * 60 * 24 * 7
+
+
+def _generation_key(namespace):
+    return f'cache:generation:{namespace}'
+
+
+def get_cache_generations(*namespaces):
+    """
+    Returns the current generation (int) of each namespace, in a single MGET.
+    """
+    cache = settings.REDISKV
+    values = cache.mget([_generation_key(namespace) for namespace in namespaces])
+    return [int(value) if value else 0 for value in values]
+
+
+def bump_cache_generations(*namespaces):
+    """
+    Invalidates every cache entry of the given namespaces.
+    """
+    namespaces = [namespace for namespace in namespaces if namespace]
+    if not namespaces:
+        return
+
+    pipeline = settings.REDISKV.pipeline(transaction=False)
+    for namespace in namespaces:
+        key = _generation_key(namespace)
+        pipeline.incr(key)
+        pipeline.expire(key, CACHE_GENERATION_TTL)
+    pipeline.execute()
+
+
+def _wallet_history_namespace(wallet_hash, asset_key=None):
+    if asset_key is None:
+        return f'wallet:history:{wallet_hash}'
+    return f'wallet:history:{wallet_hash}:{asset_key}'
+
+
+def _pos_wallet_history_namespace(wallet_hash, posid):
+    return f'wallet:history:{wallet_hash}:pos:{posid}'
+
+
+def _wallet_token_balance_namespace(wallet_hash):
+    return f'wallet:balance:token:{wallet_hash}'
+
+
+def _last_address_index_namespace(wallet_hash):
+    return f'wallet:last_address_index:{wallet_hash}'
+
+
+def wallet_history_cache_key(wallet_hash, asset_key, suffix):
+    """
+    Key of a cached wallet history response of an asset ('bch', token id/category or 'all'),
+    invalidated by `clear_wallet_history_cache`.
+    """
+    wallet_generation, asset_generation = get_cache_generations(
+        _wallet_history_namespace(wallet_hash),
+        _wallet_history_namespace(wallet_hash, asset_key),
+    )
+    return f'wallet:history:{wallet_hash}:{wallet_generation}:{asset_key}:{asset_generation}:{suffix}'
+
+
+def pos_wallet_history_cache_key(wallet_hash, posid, suffix):
+    """
+    Key of a cached POS wallet history response,
+    invalidated by `clear_wallet_history_cache` and `clear_pos_wallet_history_cache`.
+    """
+    wallet_generation, pos_generation = get_cache_generations(
+        _wallet_history_namespace(wallet_hash),
+        _pos_wallet_history_namespace(wallet_hash, posid),
+    )
+    return f'wallet:history:{wallet_hash}:{wallet_generation}:pos:{posid}:{pos_generation}:{suffix}'
+
+
+def wallet_token_balance_cache_key(wallet_hash, category):
+    """
+    Key of a cached wallet token balance, invalidated by `clear_wallet_balance_cache`.
+    """
+    generation, = get_cache_generations(_wallet_token_balance_namespace(wallet_hash))
+    return f'wallet:balance:token:{wallet_hash}:{generation}:{category}'
+
+
+def last_address_index_cache_key(wallet_hash, suffix):
+    """
+    Key of a cached last address index response, invalidated by `clear_last_address_index_cache`.
+    """
+    generation, = get_cache_generations(_last_address_index_namespace(wallet_hash))
+    return f'wallet:last_address_index:{wallet_hash}:{generation}:{suffix}'
+
+
+def clear_address_balance_cache(address):
+    """
+    Clear the address-based BCH balance cache.
+    Invalidates both variants of the cache key (with and without include_token_sats).
+    """
+    if not address or not is_bch_address(address):
+        return
+
+    cache = settings.REDISKV
+    cache.delete(f'address:balance:bch:{address}:False')
+    cache.delete(f'address:balance:bch:{address}:True')
+
+
+def clear_caches_bulk(addresses=(), wallet_balances=None, wallet_histories=None, last_address_indexes=(), pipeline=None):
+    """
+    Batch version of `clear_address_balance_cache`, `clear_wallet_balance_cache`,
+    `clear_wallet_history_cache` and `clear_last_address_index_cache`, in at most two round trips.
+
+    addresses: address balance caches to clear
+    wallet_balances: { wallet_hash: token categories, None to clear all token balances }
+    wallet_histories: { wallet_hash: asset keys, None to clear all history }
+    last_address_indexes: wallet hashes of the last address index caches to clear
+    pipeline: if provided, commands are added to it and the caller executes it
+
+    Returns the number of keys deleted and namespaces bumped.
+    """
+    wallet_balances = wallet_balances or {}
+    wallet_histories = wallet_histories or {}
+    cache = settings.REDISKV
+
+    # token balance keys embed the generation of their namespace
+    token_namespaces = [
+        _wallet_token_balance_namespace(wallet_hash)
+        for wallet_hash, categories in wallet_balances.items()
+        if categories
+    ]
+    generations = dict(zip(token_namespaces, get_cache_generations(*token_namespaces))) if token_namespaces else {}
+
+    keys = []
+    namespaces = []
+    for address in addresses:
+        if address and is_bch_address(address):
+            keys += [f'address:balance:bch:{address}:False', f'address:balance:bch:{address}:True']
+
+    for wallet_hash, categories in wallet_balances.items():
+        keys.append(f'wallet:balance:bch:{wallet_hash}')
+        namespace = _wallet_token_balance_namespace(wallet_hash)
+        if categories is None:
+            namespaces.append(namespace)
+            continue
+        for category in categories:
+            if category:
+                keys.append(f'{namespace}:{generations[namespace]}:{category}')
+
+    for wallet_hash, asset_keys in wallet_histories.items():
+        if asset_keys is None:
+            namespaces.append(_wallet_history_namespace(wallet_hash))
+            continue
+        namespaces += [_wallet_history_namespace(wallet_hash, asset_key) for asset_key in asset_keys]
+
+    namespaces += [_last_address_index_namespace(wallet_hash) for wallet_hash in last_address_indexes if wallet_hash]
+
+    execute = pipeline is None
+    if execute:
+        pipeline = cache.pipeline(transaction=False)
+    if keys:
+        pipeline.delete(*keys)
+    for namespace in namespaces:
+        key = _generation_key(namespace)
+        pipeline.incr(key)
+        pipeline.expire(key, CACHE_GENERATION_TTL)
+    if execute and (keys or namespaces):
+        pipeline.execute()
+
+    return len(keys) + len(namespaces)
+
+
 def clear_transaction_cache(transaction_instance):
     """
     Utility function to clear cache for a transaction.
@@ -20,13 +190,7 @@ def clear_transaction_cache(transaction_instance):
     
     # Clear address balance cache if address exists
     if transaction_instance.address:
-        address = transaction_instance.address.address
-        if is_bch_address(address):
-            # Invalidate both variants of the address balance cache key
-            cache_key_false = f'address:balance:bch:{address}:False'
-            cache_key_true = f'address:balance:bch:{address}:True'
-            cache.delete(cache_key_false)
-            cache.delete(cache_key_true)
+        clear_address_balance_cache(transaction_instance.address.address)
     
     # Clear wallet balance cache if wallet exists
     if transaction_instance.address and transaction_instance.address.wallet:
@@ -47,14 +211,10 @@ def clear_transaction_cache(transaction_instance):
                 category = spent_tx.cashtoken_ft.category
         
         if category:
-            ct_cache_key = f'wallet:balance:token:{wallet_hash}:{category}'
-            cache.delete(ct_cache_key)
+            cache.delete(wallet_token_balance_cache_key(wallet_hash, category))
         
         # delete cached wallet history
-        asset_key = category or 'bch'
-        history_cache_keys = cache.keys(f'wallet:history:{wallet_hash}:{asset_key}:*')
-        if history_cache_keys:
-            cache.delete(*history_cache_keys)
+        clear_wallet_history_cache(wallet_hash, asset_key=category or 'bch')
         
         # Clear last address index cache since an address has received a transaction
         # This affects the "with_tx" variant of the last address index endpoint
@@ -94,12 +254,7 @@ def clear_cache_for_spent_transactions(transaction_queryset):
     
     # Clear address balance cache for all affected addresses
     for address in addresses:
-        if is_bch_address(address):
-            # Invalidate both variants of the address balance cache key
-            cache_key_false = f'address:balance:bch:{address}:False'
-            cache_key_true = f'address:balance:bch:{address}:True'
-            cache.delete(cache_key_false)
-            cache.delete(cache_key_true)
+        clear_address_balance_cache(address)
     
     # Clear BCH balance cache for all affected wallets
     for wallet_hash in wallet_hashes:
@@ -108,13 +263,10 @@ def clear_cache_for_spent_transactions(transaction_queryset):
         
         # Clear token balance cache for all affected categories
         for category in categories:
-            ct_cache_key = f'wallet:balance:token:{wallet_hash}:{category}'
-            cache.delete(ct_cache_key)
+            cache.delete(wallet_token_balance_cache_key(wallet_hash, category))
         
         # Clear wallet history cache
-        history_cache_keys = cache.keys(f'wallet:history:{wallet_hash}:*')
-        if history_cache_keys:
-            cache.delete(*history_cache_keys)
+        clear_wallet_history_cache(wallet_hash)
         
         # Clear last address index cache since addresses received transactions
         clear_last_address_index_cache(wallet_hash) 
@@ -139,15 +291,12 @@ def clear_wallet_balance_cache(wallet_hash, token_categories=None):
     # Clear token balance cache
     if token_categories is None:
         # Clear all token balance caches for this wallet
-        token_cache_keys = cache.keys(f'wallet:balance:token:{wallet_hash}:*')
-        if token_cache_keys:
-            cache.delete(*token_cache_keys)
+        bump_cache_generations(_wallet_token_balance_namespace(wallet_hash))
     elif token_categories:
         # Clear only specific token categories
         for category in token_categories:
             if category:  # Skip None/empty categories
-                token_cache_key = f'wallet:balance:token:{wallet_hash}:{category}'
-                cache.delete(token_cache_key)
+                cache.delete(wallet_token_balance_cache_key(wallet_hash, category))
 
 
 def clear_wallet_history_cache(wallet_hash, asset_key=None):
@@ -159,17 +308,7 @@ def clear_wallet_history_cache(wallet_hash, asset_key=None):
     if not wallet_hash:
         return
     
-    cache = settings.REDISKV
-    
-    if asset_key:
-        # Clear cache for specific asset (all pages)
-        history_cache_keys = cache.keys(f'wallet:history:{wallet_hash}:{asset_key}:*')
-    else:
-        # Clear all history cache for the wallet (all assets, all pages)
-        history_cache_keys = cache.keys(f'wallet:history:{wallet_hash}:*')
-    
-    if history_cache_keys:
-        cache.delete(*history_cache_keys)
+    bump_cache_generations(_wallet_history_namespace(wallet_hash, asset_key))
 
 
 def clear_pos_wallet_history_cache(wallet_hash, posid):
@@ -177,74 +316,18 @@ def clear_pos_wallet_history_cache(wallet_hash, posid):
     if posid is None:
         return
 
-    cache = settings.REDISKV
-
-    pos_history_cache_keys = cache.keys(f'wallet:history:{wallet_hash}:pos:*')
-    if not pos_history_cache_keys:
-        return
-
-    target_posid = str(posid)
-
-    for cache_key in pos_history_cache_keys:
-        # Redis may return bytes keys; normalise to str for parsing
-        if isinstance(cache_key, bytes):
-            try:
-                decoded_key = cache_key.decode('utf-8')
-            except UnicodeDecodeError:
-                continue
-        else:
-            decoded_key = cache_key
-
-        if ':pos:' not in decoded_key:
-            continue
-
-        encoded_params = decoded_key.split(':pos:', 1)[1]
-
-        try:
-            request_params = pickle.loads(base64.b64decode(encoded_params))
-        except Exception:
-            # Skip keys we cannot decode safely
-            continue
-
-        request_posid = request_params.get('posid')
-        if request_posid is None:
-            continue
-
-        if str(request_posid) != target_posid:
-            continue
-
-        # Delete cached response and corresponding count entry
-        cache.delete(cache_key)
-        cache.delete(f"{decoded_key}:count")
+    bump_cache_generations(_pos_wallet_history_namespace(wallet_hash, posid))
 
 
 def clear_last_address_index_cache(wallet_hash):
     """
     Clear the last address index cache for a given wallet hash.
     This should be called when addresses are created or updated.
-    
-    Performance Note: Uses Redis KEYS command which can be slow on large datasets.
-    However, this is acceptable because:
-    1. Cache key pattern is highly specific (wallet_hash scoped)
-    2. Typically returns at most 8-16 keys (4 boolean combinations × 2-4 posid variants)
-    3. Called infrequently (only when addresses are added/updated)
-    
-    Future optimization: If this becomes a bottleneck, consider:
-    - Using Redis SCAN instead of KEYS
-    - Maintaining a Redis SET of cache keys per wallet for faster lookup
-    - Using Redis Hash with HGETALL/HDEL for grouped invalidation
     """
     if not wallet_hash:
         return
     
-    cache = settings.REDISKV
-    
-    # Clear all variations of last address index cache for this wallet
-    # The cache key pattern is: wallet:last_address_index:{wallet_hash}:{with_tx}:{exclude_pos}:{posid}
-    # This typically matches 8-16 keys: with_tx (True/False) × exclude_pos (True/False) × posid (None + specific IDs)
-    cache_keys = cache.keys(f'wallet:last_address_index:{wallet_hash}:*')
-    if cache_keys:
-        cache.delete(*cache_keys)
+    bump_cache_generations(_last_address_index_namespace(wallet_hash))
 
 
 def clear_wallet_history_cache_for_txid(wallet_hash, txid):
@@ -375,21 +458,12 @@ def clear_wallet_history_cache_for_txid(wallet_hash, txid):
                     pages_to_clear.add((page, page_size))
         
         # Clear the specific cache keys for this token_key
-        for page, page_size in pages_to_clear:
-            cache_key = f'wallet:history:{wallet_hash}:{token_key}:{page}:{page_size}'
-            cache.delete(cache_key)
-        
-        # Also clear the "all" combined history cache if it exists
-        # (for when all=true parameter is used). This covers both the plain
-        # combined key and the exclude-field variants.
-        for page, page_size in pages_to_clear:
-            cache_key = f'wallet:history:{wallet_hash}:all:{page}:{page_size}'
-            cache.delete(cache_key)
-            exclude_cache_keys = cache.keys(
-                f'wallet:history:{wallet_hash}:all:{page}:{page_size}:exclude:*'
-            )
-            if exclude_cache_keys:
-                cache.delete(*exclude_cache_keys)
+        key_prefix = wallet_history_cache_key(wallet_hash, token_key, '')
+        cache.delete(*[f'{key_prefix}{page}:{page_size}' for page, page_size in pages_to_clear])
+
+    # Also clear the "all" combined history cache (for when all=true parameter is used),
+    # its exclude-field variants can't be listed without KEYS so the whole namespace is bumped
+    clear_wallet_history_cache(wallet_hash, asset_key='all')
 
 
 LAST_ACTIVE_TTL = 60 * 60 * 24  # 24 hours
@@ -0,0 +1,211 @@
+"""
+Coalesces cache invalidations and `transaction_post_save_task` calls made during a
+unit of work (a DB transaction, or an explicit `coalesce_invalidations()` scope).
+
+A tx with several outputs/inputs for one wallet saves several Transaction rows,
+each firing `transaction_post_save`. Instead of clearing the same keys and queueing
+the same task on every save, the signal adds them to the thread's buffer, which is
+flushed once on `transaction.on_commit` as a single Redis pipeline and one task per
+txid and wallet. The entries of a rolled back transaction are dropped with it.
+
+Counts of requested vs flushed invalidations are kept in the INVALIDATION_STATS_KEY hash.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+
+from main.utils.address_validator import is_p2sh_address
+from main.utils.cache import clear_caches_bulk
+
+LOGGER = logging.getLogger(__name__)
+
+INVALIDATION_STATS_KEY = 'cache:invalidation:stats'
+
+
+class InvalidationBuffer(object):
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.addresses = set()
+        self.wallet_balances = {}  # { wallet_hash: set of categories, None for all }
+        self.wallet_histories = {}  # { wallet_hash: set of asset keys, None for all }
+        self.last_address_indexes = set()  # wallet hashes
+        self.post_save_tasks = {}  # { (txid, wallet_hash or address): task kwargs }
+        self.requested = 0
+        self.tasks_requested = 0
+        # a flush is registered on the commit of the current transaction
+        self.on_commit_pending = False
+
+    def __bool__(self):
+        return bool(
+            self.addresses or self.wallet_balances or self.wallet_histories
+            or self.last_address_indexes or self.post_save_tasks
+        )
+
+    def _merge(self, store, wallet_hash, values):
+        self.requested += 1
+        if values is None:
+            store[wallet_hash] = None
+        elif store.get(wallet_hash, set()) is not None:
+            store.setdefault(wallet_hash, set()).update(value for value in values if value)
+
+    def add_address_balance(self, address):
+        self.requested += 1
+        self.addresses.add(address)
+
+    def add_wallet_balance(self, wallet_hash, token_categories=None):
+        """
+        Same arguments as `clear_wallet_balance_cache`
+        """
+        if wallet_hash:
+            self._merge(self.wallet_balances, wallet_hash, token_categories)
+
+    def add_wallet_history(self, wallet_hash, asset_key=None):
+        """
+        Same arguments as `clear_wallet_history_cache`
+        """
+        if wallet_hash:
+            self._merge(self.wallet_histories, wallet_hash, None if asset_key is None else [asset_key])
+
+    def add_last_address_index(self, wallet_hash):
+        """
+        Same arguments as `clear_last_address_index_cache`
+        """
+        if wallet_hash:
+            self.requested += 1
+            self.last_address_indexes.add(wallet_hash)
+
+    def add_post_save_task(self, txid, address, transaction_id, blockheight_id=None, wallet_hash=None):
+        """
+        Queues one `transaction_post_save_task` per txid and wallet, it resolves and parses
+        every wallet of the tx. Contract (P2SH) and walletless addresses are handled per address.
+        """
+        self.tasks_requested += 1
+        group = address if not wallet_hash or is_p2sh_address(address) else wallet_hash
+        task = self.post_save_tasks.get((txid, group))
+        if task is None:
+            self.post_save_tasks[(txid, group)] = dict(
+                address=address,
+                transaction_id=transaction_id,
+                blockheight_id=blockheight_id,
+                transaction_ids=[transaction_id],
+            )
+            return
+
+        if transaction_id not in task['transaction_ids']:
+            task['transaction_ids'].append(transaction_id)
+        task['blockheight_id'] = task['blockheight_id'] or blockheight_id
+
+    def flush(self):
+        if not self:
+            return
+
+        addresses = self.addresses
+        wallet_balances = self.wallet_balances
+        wallet_histories = self.wallet_histories
+        last_address_indexes = self.last_address_indexes
+        post_save_tasks = list(self.post_save_tasks.values())
+        requested = self.requested
+        tasks_requested = self.tasks_requested
+        self.reset()
+
+        cache = settings.REDISKV
+        pipeline = cache.pipeline(transaction=False)
+        flushed = clear_caches_bulk(
+            addresses=addresses,
+            wallet_balances=wallet_balances,
+            wallet_histories=wallet_histories,
+            last_address_indexes=last_address_indexes,
+            pipeline=pipeline,
+        )
+        pipeline.hincrby(INVALIDATION_STATS_KEY, 'flushes', 1)
+        pipeline.hincrby(INVALIDATION_STATS_KEY, 'invalidations_requested', requested)
+        pipeline.hincrby(INVALIDATION_STATS_KEY, 'invalidations_flushed', flushed)
+        pipeline.hincrby(INVALIDATION_STATS_KEY, 'post_save_tasks_requested', tasks_requested)
+        pipeline.hincrby(INVALIDATION_STATS_KEY, 'post_save_tasks_queued', len(post_save_tasks))
+        try:
+            pipeline.execute()
+        except Exception:
+            LOGGER.exception('Failed to flush cache invalidations')
+
+        if post_save_tasks:
+            from main.tasks import transaction_post_save_task
+            for task in post_save_tasks:
+                transaction_post_save_task.delay(
+                    task['address'],
+                    task['transaction_id'],
+                    task['blockheight_id'],
+                    transaction_ids=task['transaction_ids'],
+                )
+
+
+_local = threading.local()
+
+
+def _flush_registered():
+    connection = transaction.get_connection()
+    return any(entry[1] is _flush for entry in connection.run_on_commit)
+
+
+def get_invalidation_buffer():
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None:
+        buffer = _local.buffer = InvalidationBuffer()
+        _local.scopes = 0
+    elif buffer.on_commit_pending and not _flush_registered():
+        # the transaction (or savepoint) that registered the flush was rolled back
+        LOGGER.info('Dropping the cache invalidations of a rolled back transaction')
+        buffer.reset()
+    return buffer
+
+
+def _flush():
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is not None:
+        buffer.flush()
+
+
+def schedule_flush():
+    """
+    Flushes the buffer once the current unit of work is done: at the end of the
+    enclosing `coalesce_invalidations()` scope, on commit of the current DB transaction,
+    or right away in autocommit mode.
+    """
+    buffer = get_invalidation_buffer()
+    if _local.scopes:
+        return
+
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        _flush()
+        return
+
+    # registered once per transaction, callbacks of a rolled back transaction are dropped
+    if not _flush_registered():
+        transaction.on_commit(_flush)
+    buffer.on_commit_pending = True
+
+
+@contextmanager
+def coalesce_invalidations():
+    """
+    Buffers invalidations (e.g. of a task or a batch) until the end of the block
+    """
+    get_invalidation_buffer()
+    _local.scopes += 1
+    try:
+        yield _local.buffer
+    finally:
+        _local.scopes -= 1
+        if not _local.scopes:
+            schedule_flush()
+
+
+def get_invalidation_stats():
+    stats = settings.REDISKV.hgetall(INVALIDATION_STATS_KEY)
+    return { key.decode() if isinstance(key, bytes) else key: int(value) for key, value in stats.items() }
@@ -0,0 +1,204 @@
+"""
+Compact encoding of cached API responses stored in REDISKV.
+
+Values are serialized (pickle, json or msgpack), compressed once they exceed
+CACHE_CODEC_COMPRESS_THRESHOLD bytes (zlib, or zstd/lz4 when installed) and
+prefixed with a one byte header naming both, so the codec of an entry can be
+changed without invalidating the cache. Values written before the codec
+(plain JSON, or base64 encoded pickle) are still decoded. An entry written with a
+serializer or compressor this process lacks (e.g. zstd/lz4 not installed on every
+host) raises CacheDecodeError, `get_cached()` treats it as a miss.
+
+Uncompressed vs stored sizes are counted per process and added to the
+CODEC_STATS_KEY hash every CACHE_CODEC_STATS_INTERVAL seconds,
+see the `cache_codec_stats` command.
+"""
+import base64
+import json
+import logging
+import pickle
+import threading
+import time
+import zlib
+from functools import lru_cache
+
+from django.conf import settings
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+LOGGER = logging.getLogger(__name__)
+
+CODEC_STATS_KEY = 'cache:codec:stats'
+
+# header byte: 1 | serializer (4 bits) | compressor (3 bits), never an ASCII character
+# so values written before the codec are recognized
+HEADER_FLAG = 0x80
+
+PICKLE = 'pickle'
+JSON = 'json'
+MSGPACK = 'msgpack'
+
+SERIALIZERS = {
+    PICKLE: (0, lambda value: pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads),
+    JSON: (1, lambda value: json.dumps(value, separators=(',', ':')).encode(), json.loads),
+}
+if msgpack:
+    SERIALIZERS[MSGPACK] = (2, msgpack.packb, lambda data: msgpack.unpackb(data, raw=False))
+
+COMPRESSORS = {
+    'none': (0, None, None),
+    'zlib': (1, lambda data: zlib.compress(data, 6), zlib.decompress),
+}
+if zstandard:
+    COMPRESSORS['zstd'] = (
+        2,
+        lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+if lz4_frame:
+    COMPRESSORS['lz4'] = (3, lz4_frame.compress, lz4_frame.decompress)
+
+SERIALIZERS_BY_ID = { serializer_id: loads for serializer_id, _, loads in SERIALIZERS.values() }
+DECOMPRESSORS_BY_ID = { compressor_id: decompress for compressor_id, _, decompress in COMPRESSORS.values() }
+
+
+class CacheCodecStats(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.entries = 0
+        self.compressed_entries = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.last_flush = time.time()
+
+    def record(self, raw_size, stored_size, compressed):
+        with self.lock:
+            self.entries += 1
+            self.compressed_entries += int(compressed)
+            self.raw_bytes += raw_size
+            self.stored_bytes += stored_size
+            if time.time() - self.last_flush < settings.CACHE_CODEC_STATS_INTERVAL:
+                return
+            stats = dict(
+                entries=self.entries,
+                compressed_entries=self.compressed_entries,
+                raw_bytes=self.raw_bytes,
+                stored_bytes=self.stored_bytes,
+            )
+            self.reset()
+
+        try:
+            pipeline = settings.REDISKV.pipeline(transaction=False)
+            for field, value in stats.items():
+                pipeline.hincrby(CODEC_STATS_KEY, field, value)
+            pipeline.execute()
+        except Exception:
+            LOGGER.exception('Failed to save cache codec stats')
+
+
+STATS = CacheCodecStats()
+
+
+class CacheDecodeError(ValueError):
+    """
+    The entry uses a serializer or compressor that is unknown or not installed here
+    """
+
+
+@lru_cache(maxsize=None)
+def _get_compressor(name):
+    if name not in COMPRESSORS:
+        LOGGER.warning(f'Cache compression "{name}" is not available, using zlib')
+        name = 'zlib'
+    return COMPRESSORS[name]
+
+
+def encode(value, serializer=PICKLE):
+    """
+    Returns the bytes to store in the cache for `value`
+    """
+    serializer_id, dumps, _ = SERIALIZERS[serializer]
+    data = dumps(value)
+    raw_size = len(data)
+
+    compressor_id = 0
+    if raw_size >= settings.CACHE_CODEC_COMPRESS_THRESHOLD:
+        _compressor_id, compress, _ = _get_compressor(settings.CACHE_CODEC_COMPRESSION)
+        if compress:
+            compressed = compress(data)
+            # keep incompressible values as they are
+            if len(compressed) < raw_size:
+                compressor_id, data = _compressor_id, compressed
+
+    data = bytes([HEADER_FLAG | serializer_id << 3 | compressor_id]) + data
+    STATS.record(raw_size, len(data), compressor_id != 0)
+    return data
+
+
+def decode(data):
+    """
+    Returns the value of a cached entry written by `encode()`, or by the JSON /
+    base64 pickle caches it replaced. None if `data` is None.
+    """
+    if data is None:
+        return None
+
+    if isinstance(data, str):
+        data = data.encode()
+
+    header = data[0] if data else 0
+    if not header & HEADER_FLAG:
+        # written before the codec
+        try:
+            return json.loads(data)
+        except ValueError:
+            return pickle.loads(base64.b64decode(data))
+
+    serializer_id = (header >> 3) & 0x0f
+    compressor_id = header & 0x07
+    loads = SERIALIZERS_BY_ID.get(serializer_id)
+    decompress = DECOMPRESSORS_BY_ID.get(compressor_id)
+    if loads is None or (compressor_id and decompress is None):
+        raise CacheDecodeError(f'Unavailable cache codec: serializer {serializer_id}, compressor {compressor_id}')
+
+    data = data[1:]
+    if compressor_id:
+        data = decompress(data)
+    return loads(data)
+
+
+def get_cached(cache, key):
+    """
+    Returns the decoded value of `key`, None on a miss. An entry that cannot be decoded
+    here is deleted and counted as a miss, the caller stores it again.
+    """
+    try:
+        return decode(cache.get(key))
+    except CacheDecodeError as exception:
+        LOGGER.warning(f'Dropping cache entry {key}: {exception}')
+        cache.delete(key)
+        return None
+
+
+def get_codec_stats():
+    stats = settings.REDISKV.hgetall(CODEC_STATS_KEY)
+    stats = { key.decode() if isinstance(key, bytes) else key: int(value) for key, value in stats.items() }
+    stats['saved_bytes'] = stats.get('raw_bytes', 0) - stats.get('stored_bytes', 0)
+    return stats
@@ -0,0 +1,273 @@
+"""
+In-process CashAddress codec (https://github.com/bitcoincashorg/bitcoincash.org/blob/master/spec/cashaddr.md)
+including the CashTokens address types (https://cashtokens.org/docs/spec/chip/#cashaddress-token-support).
+
+Behaves the same as the libauth helpers of the main/js sidecar it replaces
+(validate-address, convert-address and to-locking-bytecode), decoded and
+encoded addresses are cached, batch versions take a list of addresses.
+"""
+import hashlib
+from functools import lru_cache
+
+CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+CHARSET_MAP = { char: index for index, char in enumerate(CHARSET) }
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+MAINNET_PREFIX = "bitcoincash"
+TESTNET_PREFIX = "bchtest"
+
+P2PKH = 0
+P2SH = 1
+P2PKH_WITH_TOKENS = 2
+P2SH_WITH_TOKENS = 3
+
+BCH_TYPES = (P2PKH, P2SH)
+TOKEN_TYPES = (P2PKH_WITH_TOKENS, P2SH_WITH_TOKENS)
+TO_TOKEN_TYPE = { P2PKH: P2PKH_WITH_TOKENS, P2SH: P2SH_WITH_TOKENS }
+FROM_TOKEN_TYPE = { P2PKH_WITH_TOKENS: P2PKH, P2SH_WITH_TOKENS: P2SH }
+
+PAYLOAD_SIZES = [20, 24, 28, 32, 40, 48, 56, 64]
+
+# legacy base58 version bytes
+LEGACY_VERSIONS = {
+    0x00: (MAINNET_PREFIX, P2PKH),
+    0x05: (MAINNET_PREFIX, P2SH),
+    0x6f: (TESTNET_PREFIX, P2PKH),
+    0xc4: (TESTNET_PREFIX, P2SH),
+}
+
+CACHE_SIZE = 100000
+
+OP_DUP = 0x76
+OP_EQUAL = 0x87
+OP_EQUALVERIFY = 0x88
+OP_HASH160 = 0xa9
+OP_HASH256 = 0xaa
+OP_CHECKSIG = 0xac
+
+
+class CashAddressError(ValueError):
+    pass
+
+
+def _polymod(values):
+    generators = (0x98f2bc8e61, 0x79b76d99e2, 0xf33e5fb3c4, 0xae2eabe2a8, 0x1e4f43e470)
+    checksum = 1
+    for value in values:
+        top = checksum >> 35
+        checksum = ((checksum & 0x07ffffffff) << 5) ^ value
+        for i in range(5):
+            if (top >> i) & 1:
+                checksum ^= generators[i]
+    return checksum ^ 1
+
+
+def _prefix_values(prefix):
+    return [ord(char) & 0x1f for char in prefix] + [0]
+
+
+def _convert_bits(data, from_bits, to_bits, pad=True):
+    accumulator = 0
+    bits = 0
+    result = []
+    max_value = (1 << to_bits) - 1
+    for value in data:
+        accumulator = (accumulator << from_bits) | value
+        bits += from_bits
+        while bits >= to_bits:
+            bits -= to_bits
+            result.append((accumulator >> bits) & max_value)
+    if pad:
+        if bits:
+            result.append((accumulator << (to_bits - bits)) & max_value)
+    elif bits >= from_bits or ((accumulator << (to_bits - bits)) & max_value):
+        raise CashAddressError("invalid padding")
+    return result
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def encode(prefix, address_type, payload):
+    """
+        prefix: e.g. "bitcoincash"
+        address_type: P2PKH, P2SH, P2PKH_WITH_TOKENS or P2SH_WITH_TOKENS
+        payload: (bytes) hash160 or hash256
+    """
+    if len(payload) not in PAYLOAD_SIZES:
+        raise CashAddressError(f"invalid payload size: {len(payload)}")
+
+    version = (address_type << 3) | PAYLOAD_SIZES.index(len(payload))
+    values = _convert_bits(bytes([version]) + payload, 8, 5)
+    checksum = _polymod(_prefix_values(prefix) + values + [0] * 8)
+    values += [(checksum >> 5 * (7 - i)) & 0x1f for i in range(8)]
+    return prefix + ":" + "".join(CHARSET[value] for value in values)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def decode(address):
+    """
+        Returns (prefix, address_type, payload), raises CashAddressError if invalid
+    """
+    if not isinstance(address, str) or ":" not in address:
+        raise CashAddressError("missing prefix")
+    if address.lower() != address and address.upper() != address:
+        raise CashAddressError("mixed case")
+
+    prefix, _, data = address.lower().rpartition(":")
+    try:
+        values = [CHARSET_MAP[char] for char in data]
+    except KeyError:
+        raise CashAddressError("invalid character")
+
+    if len(values) < 8 or _polymod(_prefix_values(prefix) + values):
+        raise CashAddressError("invalid checksum")
+
+    decoded = bytes(_convert_bits(values[:-8], 5, 8, pad=False))
+    if not decoded:
+        raise CashAddressError("empty payload")
+
+    version, payload = decoded[0], decoded[1:]
+    if version & 0x80:
+        raise CashAddressError("reserved version bit set")
+
+    address_type = version >> 3
+    if address_type not in BCH_TYPES + TOKEN_TYPES:
+        raise CashAddressError(f"unknown address type: {address_type}")
+    if len(payload) != PAYLOAD_SIZES[version & 0x07]:
+        raise CashAddressError("payload size mismatch")
+
+    return prefix, address_type, payload
+
+
+def is_valid(address, token=False):
+    """
+        Whether `address` is a valid (token aware, if `token`) P2PKH/P2SH cash address
+    """
+    try:
+        _, address_type, _ = decode(address)
+    except CashAddressError:
+        return False
+    return address_type in (TOKEN_TYPES if token else BCH_TYPES)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def convert(address, to_token=True):
+    """
+        Converts a cash address to its token aware version or back.
+        Converted addresses get the mainnet/testnet prefix, addresses already
+        of the requested kind are returned as is.
+    """
+    prefix, address_type, payload = decode(address)
+    if to_token:
+        if address_type in TOKEN_TYPES:
+            return address
+        address_type = TO_TOKEN_TYPE[address_type]
+    else:
+        if address_type in BCH_TYPES:
+            return address
+        address_type = FROM_TOKEN_TYPE[address_type]
+
+    prefix = TESTNET_PREFIX if "test" in prefix else MAINNET_PREFIX
+    return encode(prefix, address_type, payload)
+
+
+def decode_legacy(address):
+    """
+        Returns (prefix, address_type, payload) of a base58 legacy address
+    """
+    number = 0
+    try:
+        for char in address:
+            number = number * 58 + BASE58_ALPHABET.index(char)
+    except ValueError:
+        raise CashAddressError("invalid base58 character")
+
+    data = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    data = bytes(len(address) - len(address.lstrip("1"))) + data
+    if len(data) != 25:
+        raise CashAddressError("invalid legacy address length")
+
+    data, checksum = data[:-4], data[-4:]
+    if hashlib.sha256(hashlib.sha256(data).digest()).digest()[:4] != checksum:
+        raise CashAddressError("invalid legacy address checksum")
+    if data[0] not in LEGACY_VERSIONS:
+        raise CashAddressError("unknown legacy address version")
+
+    prefix, address_type = LEGACY_VERSIONS[data[0]]
+    return prefix, address_type, data[1:]
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def to_locking_bytecode(address):
+    """
+        Returns the locking bytecode (bytes) of a cash address or a legacy address,
+        raises CashAddressError if invalid
+    """
+    if ":" in address:
+        _, address_type, payload = decode(address)
+    else:
+        _, address_type, payload = decode_legacy(address)
+
+    if address_type in (P2PKH, P2PKH_WITH_TOKENS):
+        if len(payload) != 20:
+            raise CashAddressError("invalid P2PKH payload size")
+        return bytes([OP_DUP, OP_HASH160, 20]) + payload + bytes([OP_EQUALVERIFY, OP_CHECKSIG])
+
+    if len(payload) == 20:
+        return bytes([OP_HASH160, 20]) + payload + bytes([OP_EQUAL])
+    if len(payload) == 32:
+        return bytes([OP_HASH256, 32]) + payload + bytes([OP_EQUAL])
+    raise CashAddressError("invalid P2SH payload size")
+
+
+def from_locking_bytecode(locking_bytecode, testnet=False, token=False):
+    """
+        Returns the cash address of a P2PKH/P2SH/P2SH32 locking bytecode, None for other scripts
+    """
+    size = len(locking_bytecode)
+    if size == 25 and locking_bytecode[:3] == bytes([OP_DUP, OP_HASH160, 20]) and \
+            locking_bytecode[23:] == bytes([OP_EQUALVERIFY, OP_CHECKSIG]):
+        address_type, payload = P2PKH, locking_bytecode[3:23]
+    elif size == 23 and locking_bytecode[:2] == bytes([OP_HASH160, 20]) and locking_bytecode[22] == OP_EQUAL:
+        address_type, payload = P2SH, locking_bytecode[2:22]
+    elif size == 35 and locking_bytecode[:2] == bytes([OP_HASH256, 32]) and locking_bytecode[34] == OP_EQUAL:
+        address_type, payload = P2SH, locking_bytecode[2:34]
+    else:
+        return None
+
+    if token:
+        address_type = TO_TOKEN_TYPE[address_type]
+    prefix = TESTNET_PREFIX if testnet else MAINNET_PREFIX
+    return encode(prefix, address_type, bytes(payload))
+
+
+def is_valid_many(addresses, token=False):
+    """
+        Returns { address: bool }
+    """
+    return { address: is_valid(address, token=token) for address in addresses }
+
+
+def convert_many(addresses, to_token=True):
+    """
+        Returns { address: converted address }, invalid addresses are mapped to None
+    """
+    results = {}
+    for address in addresses:
+        try:
+            results[address] = convert(address, to_token=to_token)
+        except CashAddressError:
+            results[address] = None
+    return results
+
+
+def to_locking_bytecode_many(addresses):
+    """
+        Returns { address: locking bytecode (bytes) }, invalid addresses are mapped to None
+    """
+    results = {}
+    for address in addresses:
+        try:
+            results[address] = to_locking_bytecode(address)
+        except CashAddressError:
+            results[address] = None
+    return results
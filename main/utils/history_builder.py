@@ -0,0 +1,740 @@
+"""
+Batched wallet history of a transaction.
+
+`parse_wallet_history` builds the records of one wallet per run, with the queries of
+HistoryParser for its inputs and outputs and an update_or_create per record.
+WalletHistoryBuilder loads the Transaction rows of a txid once, parses every bch wallet
+of the tx in memory with the same rules, and upserts all their records in one statement,
+so a tx paying hundreds of wallets costs a handful of queries instead of thousands.
+`build_wallet_histories()` does the same for a set of txs (e.g. the txs of a block).
+"""
+import inspect
+import logging
+
+from django.conf import settings
+from django.db import connection, IntegrityError
+from django.db import transaction as trans
+from django.db.models import Q
+from django.db.models.signals import post_save
+
+from main.models import (
+    Address,
+    CashFungibleToken,
+    CashNonFungibleToken,
+    Token,
+    Transaction,
+    TransactionBroadcast,
+    WalletHistory,
+)
+from main.utils.cache_buffer import get_invalidation_buffer, schedule_flush
+from main.utils.chunk import chunks
+
+LOGGER = logging.getLogger(__name__)
+
+BCH_OR_SLP = 'bch_or_slp'
+
+# Number of txids / addresses per query, and of records per upsert statement
+QUERY_CHUNK_SIZE = 1000
+UPSERT_CHUNK_SIZE = 500
+
+# Record fields written by the upsert, the update keeps the existing value of the
+# nullable ones when the record does not set them (same as the defaults of update_or_create)
+UPSERT_FIELDS = (
+    'txid', 'wallet_id', 'token_id', 'cashtoken_ft_id', 'cashtoken_nft_id', 'record_type', 'amount',
+    'tx_fee', 'senders', 'recipients', 'tx_timestamp', 'date_created', 'price_log_id',
+)
+
+UPSERT_HISTORY_SQL = """
+    WITH data ({columns}) AS (
+        VALUES {values}
+    ), updated AS (
+        UPDATE main_wallethistory AS history
+        SET record_type = data.record_type,
+            amount = data.amount,
+            tx_fee = COALESCE(data.tx_fee, history.tx_fee),
+            senders = COALESCE(data.senders, history.senders),
+            recipients = COALESCE(data.recipients, history.recipients),
+            tx_timestamp = COALESCE(data.tx_timestamp, history.tx_timestamp),
+            date_created = COALESCE(data.date_created, history.date_created),
+            price_log_id = COALESCE(data.price_log_id, history.price_log_id)
+        FROM data
+        WHERE history.txid = data.txid
+            AND history.wallet_id = data.wallet_id
+            AND history.token_id IS NOT DISTINCT FROM data.token_id
+            AND history.cashtoken_ft_id IS NOT DISTINCT FROM data.cashtoken_ft_id
+            AND history.cashtoken_nft_id IS NOT DISTINCT FROM data.cashtoken_nft_id
+        RETURNING history.id, history.txid, history.wallet_id, history.token_id,
+            history.cashtoken_ft_id, history.cashtoken_nft_id
+    ), inserted AS (
+        INSERT INTO main_wallethistory (
+            txid, wallet_id, token_id, cashtoken_ft_id, cashtoken_nft_id, record_type, amount,
+            tx_fee, senders, recipients, tx_timestamp, date_created, price_log_id
+        )
+        SELECT data.txid, data.wallet_id, data.token_id, data.cashtoken_ft_id, data.cashtoken_nft_id,
+            data.record_type, data.amount, data.tx_fee,
+            COALESCE(data.senders, ARRAY[]::varchar(100)[][]),
+            COALESCE(data.recipients, ARRAY[]::varchar(100)[][]),
+            data.tx_timestamp, COALESCE(data.date_created, now()), data.price_log_id
+        FROM data
+        WHERE NOT EXISTS (
+            SELECT 1 FROM updated
+            WHERE updated.txid = data.txid
+                AND updated.wallet_id = data.wallet_id
+                AND updated.token_id IS NOT DISTINCT FROM data.token_id
+                AND updated.cashtoken_ft_id IS NOT DISTINCT FROM data.cashtoken_ft_id
+                AND updated.cashtoken_nft_id IS NOT DISTINCT FROM data.cashtoken_nft_id
+        )
+        ON CONFLICT DO NOTHING
+        RETURNING id
+    )
+    SELECT id, false FROM updated
+    UNION ALL
+    SELECT id, true FROM inserted
+"""
+
+
+def process_history_recpts_or_senders(_list, key, BCH_OR_SLP):
+    processed_list = []
+    if _list:
+        processed_list = []
+        for _, val in enumerate(_list):
+            elem = [
+                val[0],
+                val[1]
+            ]
+            if key != BCH_OR_SLP:
+                try:
+                    cashtoken_data = val[2]
+                    if cashtoken_data:
+                        elem.append(cashtoken_data['category'])
+                        elem.append(cashtoken_data['amount'])
+
+                        if 'nft' in cashtoken_data.keys():
+                            nft_data = cashtoken_data['nft']
+                            elem.append(nft_data['capability'])
+                            elem.append(nft_data['commitment'])
+                except IndexError:
+                    pass
+
+            '''mask remaining fields with None (incurs Django error for non-uniform ArrayField(ArrayField) length for senders/recipients)
+            [
+                address,
+                bch/slp amount,
+                ct category/token ID, (can be None)
+                ct amount,            (can be None)
+                ct capability         (can be None)
+                ct commitment         (can be None)
+            ]'''
+            for x in range(0, 6 - len(elem)):
+                elem.append(None)
+
+            processed_list.append(elem)
+    return processed_list
+
+
+def last_transaction(txns):
+    """
+    Same row as `.last()` of a Transaction queryset (-date_created ordering):
+    the earliest created one, nulls after
+    """
+    if not txns:
+        return None
+    dated = [txn for txn in txns if txn.date_created]
+    if dated:
+        return min(dated, key=lambda txn: (txn.date_created, txn.id))
+    return min(txns, key=lambda txn: txn.id)
+
+
+def get_record_type(diff):
+    if diff == 0:
+        return ''
+    elif diff < 0:
+        return 'outgoing'
+    return 'incoming'
+
+
+def get_total_bch(txns):
+    value_sum = sum(txn.value or 0 for txn in txns)
+    # round down to zero if value sum is equal to or lesser than dust
+    if value_sum <= 546:
+        return 0
+    return value_sum / (10 ** 8)
+
+
+def get_change_address(inputs, outputs):
+    input_wallets = {txn.address.wallet_id for txn in inputs if txn.address and txn.address.wallet_id}
+    for txn in outputs:
+        if txn.address and txn.address.wallet_id and txn.address.wallet_id in input_wallets:
+            return txn.address.address
+    return None
+
+
+def parse_wallet_transactions(inputs, outputs):
+    """
+    In memory HistoryParser.parse() of a wallet
+
+    inputs: Transaction rows of the wallet spent by the tx (outputs of other txs)
+    outputs: Transaction rows of the wallet created by the tx
+    """
+    ct_token_id = settings.WT_DEFAULT_CASHTOKEN_ID
+
+    def is_bch(txn):
+        return not (txn.token and txn.token.tokenid == ct_token_id)
+
+    bch_outputs = [txn for txn in outputs if is_bch(txn)]
+    bch_inputs = [txn for txn in inputs if is_bch(txn)]
+
+    total_outputs = get_total_bch(bch_outputs) if bch_outputs else 0
+    total_inputs = get_total_bch(bch_inputs) if bch_inputs else 0
+    diff = round(total_outputs - total_inputs, 8)
+
+    results = {
+        BCH_OR_SLP: {
+            'record_type': get_record_type(diff),
+            'change_address': get_change_address(bch_inputs, bch_outputs),
+            'diff': diff,
+        },
+    }
+
+    # fungible cashtokens, summed per category
+    ct_inputs = [txn for txn in inputs if txn.cashtoken_ft_id]
+    ct_outputs = [txn for txn in outputs if txn.cashtoken_ft_id]
+    change_address = get_change_address(ct_inputs, ct_outputs)
+    totals = {}  # { <category>: [<total inputs>, <total outputs>] }
+    for index, txns in enumerate((ct_inputs, ct_outputs)):
+        for txn in txns:
+            totals.setdefault(txn.cashtoken_ft_id, [0, 0])[index] += txn.amount or 0
+
+    for category, (total_inputs, total_outputs) in totals.items():
+        diff = round(total_outputs - total_inputs, 8)
+        results[f"ct/{category}"] = dict(
+            record_type=get_record_type(diff),
+            change_address=change_address,
+            diff=diff,
+        )
+
+    # cashtoken NFTs, counted per (category, capability, commitment)
+    nft_inputs = [txn for txn in inputs if txn.cashtoken_nft_id]
+    nft_outputs = [txn for txn in outputs if txn.cashtoken_nft_id]
+    change_address = get_change_address(nft_inputs, nft_outputs)
+    counts = {}  # { (category, capability, commitment): [<inputs>, <outputs>] }
+    for index, txns in enumerate((nft_inputs, nft_outputs)):
+        for txn in txns:
+            nft = txn.cashtoken_nft
+            nft_key = (nft.category, nft.capability or '', nft.commitment or '')
+            counts.setdefault(nft_key, [0, 0])[index] += 1
+
+    for (category, capability, commitment), (input_count, output_count) in counts.items():
+        diff = output_count - input_count
+        results[f"ct_nft/{category}/{capability}/{commitment}"] = dict(
+            record_type=get_record_type(diff),
+            change_address=change_address,
+            diff=float(diff),
+            category=category,
+            capability=capability if capability else None,
+            commitment=commitment if commitment else None,
+        )
+
+    return results
+
+
+class WalletHistoryBuilder(object):
+    """
+    Builds the wallet history records of every bch wallet of a tx, with the rules of
+    `parse_wallet_history`.
+
+    senders / recipients: parsed inputs and outputs of the tx, see parse_utxo_to_tuple()
+    """
+
+    def __init__(self, txid, tx_fee=None, senders=None, recipients=None, proceed_with_zero_amount=False):
+        self.txid = txid
+        self.tx_fee = float(tx_fee) if type(tx_fee) is str else tx_fee
+        self.senders = senders or []
+        self.recipients = recipients or []
+        self.proceed_with_zero_amount = proceed_with_zero_amount
+
+        self.bch_prefix = 'bitcoincash:'
+        if settings.BCH_NETWORK != 'mainnet':
+            self.bch_prefix = 'bchtest:'
+
+        self._ct_token = None
+        self._ct_recipient_tokens = {}
+
+    def load(self):
+        """
+        One query for the Transaction rows of the tx, one for the wallets of its addresses
+        """
+        addresses = {info[0] for info in [*self.senders, *self.recipients] if info[0]}
+        self.set_rows(
+            load_transactions([self.txid]),
+            load_address_wallets(addresses),
+            load_price_logs([self.txid]),
+        )
+
+    def set_rows(self, txns, address_wallets, price_logs):
+        """
+        txns: Transaction rows created or spent by the tx, may include rows of other txs
+        address_wallets: { <address>: (<wallet id>, <wallet hash>) } of bch wallets
+        price_logs: { <txid>: <AssetPriceLog id> } of broadcasted txs
+        """
+        self.outputs = [txn for txn in txns if txn.txid == self.txid]
+        self.inputs = [txn for txn in txns if txn.spending_txid == self.txid and txn.txid != self.txid]
+
+        self.address_wallets = {}  # { <address>: <wallet id> }
+        self.wallet_hashes = {}  # { <wallet id>: <wallet hash> }
+        for info in [*self.senders, *self.recipients]:
+            if info[0] in address_wallets:
+                wallet_id, wallet_hash = address_wallets[info[0]]
+                self.address_wallets[info[0]] = wallet_id
+                self.wallet_hashes[wallet_id] = wallet_hash
+
+        self.price_log_id = price_logs.get(self.txid)
+
+    def get_ct_token(self):
+        if not self._ct_token:
+            self._ct_token, _ = Token.objects.get_or_create(tokenid=settings.WT_DEFAULT_CASHTOKEN_ID)
+        return self._ct_token
+
+    def is_consolidation(self, wallet_id):
+        """
+        All senders and recipients are from the same wallet (i.e. UTXO consolidation txs)
+        """
+        sender_addresses = {info[0] for info in self.senders if info[0]}
+        recipient_addresses = {info[0] for info in self.recipients if info[0]}
+        if not sender_addresses or not recipient_addresses:
+            return False
+        return all(
+            self.address_wallets.get(address) == wallet_id
+            for address in [*sender_addresses, *recipient_addresses]
+        )
+
+    def get_recipient_token(self, ct_recipient, ct_index):
+        """
+        Cashtoken records of a category only found in the recipients of the tx
+        """
+        cache_key = (*ct_recipient[2:], ct_index)
+        if cache_key in self._ct_recipient_tokens:
+            return self._ct_recipient_tokens[cache_key]
+
+        token_id = ct_recipient[2]
+        nft_capability = ct_recipient[4]
+        nft_commitment = ct_recipient[5]
+        cashtoken_ft, _ = CashFungibleToken.objects.get_or_create(category=token_id)
+        # Only fetch metadata if it doesn't exist, and handle errors gracefully
+        if not cashtoken_ft.info:
+            try:
+                cashtoken_ft.fetch_metadata()
+            except Exception as e:
+                LOGGER.warning(f'Error fetching cashtoken metadata for {token_id}: {str(e)}')
+
+        cashtoken_nft = None
+        if nft_capability:
+            cashtoken_nft, _ = CashNonFungibleToken.objects.get_or_create(
+                category=token_id,
+                capability=nft_capability,
+                commitment=nft_commitment,
+                current_txid=self.txid,
+                current_index=ct_index
+            )
+            cashtoken_nft.fetch_metadata()
+
+        self._ct_recipient_tokens[cache_key] = (cashtoken_ft, cashtoken_nft)
+        return cashtoken_ft, cashtoken_nft
+
+    def resolve_asset(self, key, data, processed_recipients):
+        """
+        Returns (txn, token, cashtoken_ft, cashtoken_nft) of a parsed key, None to skip it
+        """
+        txns = [
+            txn for txn in self.outputs
+            if txn.address and txn.address.address.startswith(self.bch_prefix)
+        ]
+        spent_txns = [
+            txn for txn in self.inputs
+            if txn.address and txn.address.address.startswith(self.bch_prefix)
+        ]
+        token_obj = None
+        cashtoken_ft = None
+        cashtoken_nft = None
+
+        if key == BCH_OR_SLP:
+            txns = [txn for txn in txns if txn.token and txn.token.name == 'bch']
+            spent_txns = [txn for txn in spent_txns if txn.token and txn.token.name == 'bch']
+        elif key.startswith("ct_nft/"):
+            nft_category = data.get('category')
+            nft_capability = data.get('capability')
+            nft_commitment = data.get('commitment')
+            if nft_category:
+                def is_nft(txn):
+                    nft = txn.cashtoken_nft
+                    return (
+                        nft is not None and
+                        nft.category == nft_category and
+                        (nft.capability == nft_capability if nft_capability else nft.capability is None) and
+                        (nft.commitment == nft_commitment if nft_commitment else nft.commitment is None)
+                    )
+
+                _txns = [txn for txn in txns if is_nft(txn)]
+                _spent_txns = [txn for txn in spent_txns if is_nft(txn)]
+                if not _txns and not _spent_txns:
+                    # No matching Transaction found - skip (Transaction required, same as FTs)
+                    return None
+
+                txns = _txns or txns
+                spent_txns = _spent_txns or spent_txns
+                nft_tx = last_transaction([txn for txn in txns if txn.cashtoken_nft_id])
+                if not nft_tx:
+                    nft_tx = last_transaction([txn for txn in spent_txns if txn.cashtoken_nft_id])
+                if nft_tx and nft_tx.cashtoken_nft:
+                    cashtoken_nft = nft_tx.cashtoken_nft
+                    token_obj = self.get_ct_token()
+        elif key.startswith("ct/"):
+            ct_category = key.split("ct/")[1]
+            _txns = [
+                txn for txn in txns
+                if txn.cashtoken_ft_id == ct_category or
+                (txn.cashtoken_nft and txn.cashtoken_nft.category == ct_category)
+            ]
+            if _txns:
+                txns = _txns
+                ft_tx = last_transaction([txn for txn in txns if txn.cashtoken_ft_id == ct_category])
+                if ft_tx:
+                    cashtoken_ft = ft_tx.cashtoken_ft
+                if not cashtoken_ft:
+                    nft_tx = last_transaction([
+                        txn for txn in txns
+                        if txn.cashtoken_nft and txn.cashtoken_nft.category == ct_category
+                    ])
+                    if nft_tx:
+                        cashtoken_nft = nft_tx.cashtoken_nft
+            else:
+                # Get the cashtoken record if transaction does not have this info
+                for ct_index, _recipient in enumerate(processed_recipients):
+                    if _recipient[2] == ct_category:
+                        token_obj = self.get_ct_token()
+                        if _recipient[2]:
+                            cashtoken_ft, cashtoken_nft = self.get_recipient_token(_recipient, ct_index)
+                        break
+
+        txn = last_transaction(txns)
+        spent_txn = last_transaction(spent_txns)
+        if not txn and not spent_txn:
+            return None
+
+        if not token_obj:
+            token_obj = (txn or spent_txn).token
+        return txn, token_obj, cashtoken_ft, cashtoken_nft
+
+    def build_records(self, wallet_id):
+        """
+        Returns the records of a wallet, as field values of WalletHistory with the
+        `txn` the record was resolved from
+        """
+        inputs = [txn for txn in self.inputs if txn.wallet_id == wallet_id]
+        outputs = [txn for txn in self.outputs if txn.wallet_id == wallet_id]
+        parsed_history = parse_wallet_transactions(inputs, outputs)
+
+        prefix_outputs = [
+            txn for txn in self.outputs
+            if txn.address and txn.address.address.startswith(self.bch_prefix)
+        ]
+        tx_timestamps = [txn.tx_timestamp for txn in prefix_outputs if txn.tx_timestamp]
+        dates_created = [txn.date_created for txn in prefix_outputs if txn.date_created]
+        tx_timestamp = max(tx_timestamps) if tx_timestamps else None
+        date_created = max(dates_created) if dates_created else None
+
+        records = []
+        for key, data in parsed_history.items():
+            is_nft_key = key.startswith("ct_nft/")
+            record_type = data['record_type']
+            amount = data['diff']
+            change_address = data['change_address']
+
+            _recipients = None
+            if change_address:
+                _recipients = [info for info in self.recipients if info[0] != change_address]
+
+            processed_recipients = process_history_recpts_or_senders(_recipients or self.recipients, key, BCH_OR_SLP)
+            processed_senders = process_history_recpts_or_senders(self.senders, key, BCH_OR_SLP)
+
+            # For NFTs, set amount to 1.0 or -1.0 (counted, not summed)
+            if is_nft_key:
+                if record_type == 'incoming':
+                    amount = 1.0
+                elif record_type == 'outgoing':
+                    amount = -1.0
+                else:
+                    amount = float(amount)
+
+            # Correct the amount for outgoing, subtract the miner fee if given and maintain negative sign
+            if record_type == 'outgoing':
+                if key == BCH_OR_SLP:
+                    amount = abs(amount) - ((self.tx_fee or 0) / 100000000)
+                    amount = round(amount, 8)
+                elif not is_nft_key:
+                    amount = abs(amount) * -1
+
+            # Don't save a record if resulting amount is zero
+            is_zero_amount = amount == 0
+            if is_zero_amount and not self.proceed_with_zero_amount:
+                continue
+            if is_zero_amount:
+                record_type = ''
+
+            asset = self.resolve_asset(key, data, processed_recipients)
+            if not asset:
+                continue
+            txn, token_obj, cashtoken_ft, cashtoken_nft = asset
+
+            record = {
+                'txn': txn,
+                'txid': self.txid,
+                'wallet_id': wallet_id,
+                'record_type': record_type,
+                'amount': amount,
+                'token_id': token_obj.id if token_obj else None,
+                'cashtoken_ft_id': cashtoken_ft.pk if cashtoken_ft else None,
+                'cashtoken_nft_id': cashtoken_nft.pk if cashtoken_nft else None,
+                'tx_fee': None,
+                'senders': None,
+                'recipients': None,
+                'tx_timestamp': tx_timestamp,
+                'date_created': date_created,
+                'price_log_id': self.price_log_id,
+            }
+            if self.tx_fee and processed_senders and processed_recipients:
+                record['tx_fee'] = self.tx_fee
+                record['senders'] = processed_senders
+                record['recipients'] = processed_recipients
+            records.append(record)
+
+        return records
+
+    def get_records(self):
+        """
+        Returns (records, ids of the wallets the tx is a UTXO consolidation of)
+        """
+        records = []
+        consolidated_wallet_ids = []
+        for wallet_id in self.wallet_hashes:
+            if self.is_consolidation(wallet_id):
+                consolidated_wallet_ids.append(wallet_id)
+                continue
+            records += self.build_records(wallet_id)
+        return records, consolidated_wallet_ids
+
+    def build(self):
+        """
+        Builds and saves the records of all the bch wallets of the tx.
+
+        Returns [(history, created, txn), ...]
+        """
+        self.load()
+        records, consolidated_wallet_ids = self.get_records()
+        if consolidated_wallet_ids:
+            # Remove wallet history record of these, if any
+            WalletHistory.objects.filter(txid=self.txid, wallet_id__in=consolidated_wallet_ids).delete()
+        return save_history_records(records)
+
+
+def merge_build_requests(older, newer):
+    """
+    Combines two (args, kwargs) requests of `build_tx_wallet_histories` for a txid, for
+    single_flight / task_dedupe. Keeps the senders and recipients with the most resolved
+    addresses (the newer ones on ties) and the newer tx_fee unless it is missing.
+    """
+    older, newer = [
+        inspect.signature(WalletHistoryBuilder).bind(*args, **kwargs).arguments
+        for args, kwargs in (older, newer)
+    ]
+    merged = { **older, **newer }
+    for key in ('senders', 'recipients'):
+        older_count, newer_count = [
+            len([info for info in (request.get(key) or []) if info[0]])
+            for request in (older, newer)
+        ]
+        if older_count > newer_count:
+            merged[key] = older[key]
+    if merged.get('tx_fee') is None:
+        merged['tx_fee'] = older.get('tx_fee')
+    return (), merged
+
+
+def load_transactions(txids):
+    """
+    Transaction rows created or spent by the txs
+    """
+    txns = []
+    for txids_chunk in chunks(list(txids), QUERY_CHUNK_SIZE):
+        txns += Transaction.objects.select_related(
+            'token', 'cashtoken_ft', 'cashtoken_nft', 'address',
+        ).filter(Q(txid__in=txids_chunk) | Q(spending_txid__in=txids_chunk))
+    return txns
+
+
+def load_address_wallets(addresses):
+    """
+    { <address>: (<wallet id>, <wallet hash>) } of the addresses of bch wallets
+    """
+    address_wallets = {}
+    for addresses_chunk in chunks(list(addresses), QUERY_CHUNK_SIZE):
+        wallet_addresses = Address.objects.filter(
+            address__in=addresses_chunk,
+            wallet__wallet_type='bch',
+        ).values_list('address', 'wallet_id', 'wallet__wallet_hash')
+        for address, wallet_id, wallet_hash in wallet_addresses:
+            address_wallets[address] = (wallet_id, wallet_hash)
+    return address_wallets
+
+
+def load_price_logs(txids):
+    price_logs = {}
+    for txids_chunk in chunks(list(txids), QUERY_CHUNK_SIZE):
+        broadcasts = TransactionBroadcast.objects.filter(
+            txid__in=txids_chunk,
+            price_log__isnull=False,
+        ).order_by('id').values_list('txid', 'price_log_id')
+        for txid, price_log_id in broadcasts:
+            price_logs.setdefault(txid, price_log_id)
+    return price_logs
+
+
+def upsert_history_records(records):
+    """
+    Updates the existing records of (wallet, txid, token, cashtoken_ft, cashtoken_nft)
+    and creates the others, in one statement.
+
+    Returns { <id>: <created> } of the written records
+    """
+    fields = [WalletHistory._meta.get_field(attname) for attname in UPSERT_FIELDS]
+    # typed placeholders, the columns of VALUES take the types of their first row
+    row_sql = ', '.join(f"%s::{field.db_type(connection)}" for field in fields)
+
+    params = []
+    for record in records:
+        for field_name, field in zip(UPSERT_FIELDS, fields):
+            value = record[field_name]
+            if value is not None and field_name in ('senders', 'recipients'):
+                value = field.get_db_prep_save(value, connection)
+            params.append(value)
+
+    sql = UPSERT_HISTORY_SQL.format(
+        columns=', '.join(UPSERT_FIELDS),
+        values=', '.join([f'({row_sql})'] * len(records)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return dict(cursor.fetchall())
+
+
+def save_history_records(records):
+    """
+    Upserts the records (one by one if a statement conflicts with other records of the
+    wallets), and sends post_save of the created ones.
+
+    Returns [(history, created, txn), ...]
+    """
+    results = {}
+    for records_chunk in chunks(records, UPSERT_CHUNK_SIZE):
+        try:
+            with trans.atomic():
+                results.update(upsert_history_records(records_chunk))
+            continue
+        except IntegrityError as exc:
+            if len(records_chunk) == 1:
+                LOGGER.exception(exc)
+                continue
+
+        for record in records_chunk:
+            try:
+                with trans.atomic():
+                    results.update(upsert_history_records([record]))
+            except IntegrityError as exc:
+                LOGGER.exception(exc)
+
+    if not results:
+        return []
+
+    txns = {
+        (record['txid'], record['wallet_id'], record['token_id'], record['cashtoken_ft_id'], record['cashtoken_nft_id']): record['txn']
+        for record in records
+    }
+    histories = []
+    for ids_chunk in chunks(list(results.keys()), QUERY_CHUNK_SIZE):
+        histories += WalletHistory.objects.select_related(
+            'wallet', 'token', 'cashtoken_ft', 'cashtoken_nft',
+        ).filter(id__in=ids_chunk)
+    histories.sort(key=lambda history: history.id)
+
+    saved = []
+    buffer = get_invalidation_buffer()
+    for history in histories:
+        created = results[history.id]
+        if created:
+            # the upsert does not call save(), send the signal of the created records
+            post_save.send(
+                sender=WalletHistory, instance=history, created=True,
+                update_fields=None, raw=False, using=connection.alias,
+            )
+        elif history.wallet:
+            buffer.add_wallet_history(history.wallet.wallet_hash)
+            schedule_flush()
+
+        txn = txns.get((history.txid, history.wallet_id, history.token_id, history.cashtoken_ft_id, history.cashtoken_nft_id))
+        saved.append((history, created, txn))
+    return saved
+
+
+def build_wallet_histories(txs, proceed_with_zero_amount=False):
+    """
+    WalletHistoryBuilder.build() of several txs at once, with the same number of
+    queries as a single tx (per QUERY_CHUNK_SIZE txids / addresses)
+
+    txs: [{ 'txid', 'tx_fee', 'senders', 'recipients' }, ...]
+
+    Returns [(history, created, txn), ...]
+    """
+    builders = [
+        WalletHistoryBuilder(
+            tx['txid'],
+            tx_fee=tx.get('tx_fee'),
+            senders=tx.get('senders'),
+            recipients=tx.get('recipients'),
+            proceed_with_zero_amount=proceed_with_zero_amount,
+        )
+        for tx in txs
+    ]
+    if not builders:
+        return []
+
+    txids = [builder.txid for builder in builders]
+    addresses = {
+        info[0]
+        for builder in builders
+        for info in [*builder.senders, *builder.recipients]
+        if info[0]
+    }
+    txns = load_transactions(txids)
+    address_wallets = load_address_wallets(addresses)
+    price_logs = load_price_logs(txids)
+
+    txns_by_txid = {}
+    for txn in txns:
+        txns_by_txid.setdefault(txn.txid, []).append(txn)
+        if txn.spending_txid and txn.spending_txid != txn.txid:
+            txns_by_txid.setdefault(txn.spending_txid, []).append(txn)
+
+    records = []
+    consolidated = None
+    for builder in builders:
+        builder.set_rows(txns_by_txid.get(builder.txid, []), address_wallets, price_logs)
+        tx_records, consolidated_wallet_ids = builder.get_records()
+        records += tx_records
+        if consolidated_wallet_ids:
+            tx_filter = Q(txid=builder.txid, wallet_id__in=consolidated_wallet_ids)
+            consolidated = tx_filter if consolidated is None else consolidated | tx_filter
+
+    if consolidated is not None:
+        # Remove wallet history record of the consolidation txs, if any
+        WalletHistory.objects.filter(consolidated).delete()
+    return save_history_records(records)
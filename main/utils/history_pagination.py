@@ -0,0 +1,103 @@
+"""
+Keyset (cursor) pagination of wallet history.
+
+History is ordered by (tx_timestamp desc nulls last, date_created desc, id desc).
+Each page seeks past the sort key of the last row of the previous page, carried in
+an opaque `next` cursor, on the wallet_history_wallet_seek_idx index, so deep pages
+cost the same as the first one instead of an OFFSET scan of every skipped row.
+"""
+import base64
+import json
+
+from django.db.models import DateTimeField, F, Func
+from django.utils.dateparse import parse_datetime
+
+MAX_PAGE_SIZE = 100
+
+# Same expression as the wallet_history_wallet_seek_idx index (migration 0134)
+SEEK_SQL = (
+    "(COALESCE(main_wallethistory.tx_timestamp, '-infinity'::timestamptz), "
+    "main_wallethistory.date_created, main_wallethistory.id) < "
+    "(COALESCE(%s::timestamptz, '-infinity'::timestamptz), %s::timestamptz, %s)"
+)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class SeekTimestamp(Func):
+    """
+    tx_timestamp with nulls sorted last in descending order
+    """
+    template = "COALESCE(%(expressions)s, '-infinity'::timestamptz)"
+    output_field = DateTimeField()
+
+
+def order_history(queryset):
+    """
+    Orders a WalletHistory queryset for either pagination mode
+    """
+    return queryset.annotate(
+        _seek_timestamp=SeekTimestamp("tx_timestamp"),
+    ).order_by(
+        F("_seek_timestamp").desc(),
+        F("date_created").desc(),
+        F("id").desc(),
+    )
+
+
+def encode_cursor(tx_timestamp, date_created, history_id):
+    data = json.dumps([
+        tx_timestamp.isoformat() if tx_timestamp else None,
+        date_created.isoformat(),
+        history_id,
+    ], separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Returns (tx_timestamp, date_created, id) of a cursor, raises InvalidCursor
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        tx_timestamp, date_created, history_id = json.loads(data)
+        if tx_timestamp is not None and not parse_datetime(tx_timestamp):
+            raise ValueError
+        if not parse_datetime(date_created) or not isinstance(history_id, int):
+            raise ValueError
+    except (TypeError, ValueError):
+        raise InvalidCursor("invalid cursor")
+    return tx_timestamp, date_created, history_id
+
+
+def parse_page_size(page_size, default=10):
+    try:
+        page_size = int(page_size)
+    except (TypeError, ValueError):
+        return default
+    return min(max(page_size, 1), MAX_PAGE_SIZE)
+
+
+def keyset_page(history, cursor_key, page_size, with_count=True):
+    """
+    history: ordered (see `order_history()`) WalletHistory queryset, may be a values() queryset
+    cursor_key: decoded cursor of the previous page, None for the first page
+
+    Returns (rows, next cursor or None, total count or None)
+    """
+    count = history.count() if with_count else None
+
+    if cursor_key:
+        history = history.extra(where=[SEEK_SQL], params=list(cursor_key))
+
+    # sort keys first, the annotations of the page rows are computed on the second query
+    keys = list(history.values_list("tx_timestamp", "date_created", "id")[:page_size + 1])
+    next_cursor = None
+    if len(keys) > page_size:
+        keys = keys[:page_size]
+        next_cursor = encode_cursor(*keys[-1])
+
+    rows = list(history.filter(id__in=[key[2] for key in keys])) if keys else []
+    return rows, next_cursor, count
@@ -5,35 +5,15 @@ import http.client
 
 from django.conf import settings
 from django.utils import timezone
+from main.utils.queries.fulcrum_client import get_fulcrum_client
+from main.utils.queries.raw_tx_cache import get_raw_tx_cache
+from main.utils.queries.rpc_client import RPCClient, get_rpc_client
 import math
 import socket
 import time
-import json
-from functools import wraps
 
-# Connect to Redis
-redis_client = settings.REDISKV
-
-
-def redis_cache(expiration_seconds=3600):  # Add expiration as a parameter
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            key = f"{func.__name__}:{args}:{kwargs}"
-            cached_value = redis_client.get(key)
-
-            if cached_value:
-                return json.loads(cached_value)  # Return cached value
-
-            result = func(*args, **kwargs)  # Call the function if not cached
-            redis_client.set(
-                key, json.dumps(result), ex=expiration_seconds
-            )  # Auto-expire after X seconds
-            return result
-
-        return wrapper
-
-    return decorator
+# Max number of calls sent in a single JSON-RPC batch request
+RPC_BATCH_SIZE = 500
 
 
 def retry(max_retries):
@@ -61,7 +41,12 @@ class BCHN(object):
         self.fulcrum = {"host": settings.BCHN_HOST, "port": settings.FULCRUM_PORT}
 
     def _get_rpc_connection(self):
-        """Create a new RPC connection for each request"""
+        """
+        Returns the process wide pooled keep-alive RPC client,
+        or a new connection for each request if BCHN_RPC_POOL is disabled
+        """
+        if settings.BCHN_RPC_POOL:
+            return get_rpc_client()
         return AuthServiceProxy(settings.BCHN_NODE, timeout=30)
 
     def _close_connection(self, connection):
@@ -82,6 +67,14 @@ class BCHN(object):
         finally:
             self._close_connection(connection)
 
+    @retry(max_retries=3)
+    def get_block_header(self, block_hash):
+        connection = self._get_rpc_connection()
+        try:
+            return connection.getblockheader(block_hash)
+        finally:
+            self._close_connection(connection)
+
     @retry(max_retries=3)
     def get_block_chain_info(self):
         connection = self._get_rpc_connection()
@@ -113,9 +106,17 @@ class BCHN(object):
         finally:
             self._close_connection(connection)
 
-    # Cache to prevent multiple requests when parsing transaction in '._parse_transaction()'
-    @redis_cache(expiration_seconds=60)
     def _get_raw_transaction(self, txid, verbosity: int = 2, max_retries: int = None):
+        # Cached by txid, confirmed transactions are kept without expiry (see raw_tx_cache)
+        raw_tx_cache = get_raw_tx_cache()
+        txn = raw_tx_cache.get(txid, verbosity=verbosity)
+        if txn is None:
+            txn = self._fetch_raw_transaction(txid, verbosity=verbosity, max_retries=max_retries)
+            if txn:
+                raw_tx_cache.set(txid, txn, verbosity=verbosity)
+        return txn
+
+    def _fetch_raw_transaction(self, txid, verbosity: int = 2, max_retries: int = None):
         retries = 0
         if max_retries is None:
             max_retries = self.max_retries
@@ -215,6 +216,17 @@ class BCHN(object):
         total_output_sats = 0
         can_calculate_fee = True
 
+        # Fetch all prevouts missing from the node's response in one request
+        missing_prevouts = [
+            (tx_input["txid"], tx_input["vout"])
+            for tx_input in txn["vin"]
+            if "coinbase" not in tx_input and (
+                "prevout" not in tx_input or
+                "address" not in tx_input["prevout"]["scriptPubKey"]
+            )
+        ]
+        inputs_details = self.get_inputs_details(missing_prevouts) if missing_prevouts else {}
+
         for tx_input in txn["vin"]:
             # Coinbase transactions are reward to miners when there is a new block mined
             if "coinbase" in tx_input:
@@ -243,9 +255,7 @@ class BCHN(object):
                 if "address" in scriptPubKey.keys():
                     input_address = scriptPubKey["address"]
                 else:
-                    _input_details = self.get_input_details(
-                        input_txid, tx_input["vout"]
-                    )
+                    _input_details = inputs_details.get((input_txid, tx_input["vout"]))
                     # for multisig input prevouts (no address given on data)
                     input_address = (
                         _input_details.get("address") if _input_details else None
@@ -254,7 +264,7 @@ class BCHN(object):
                 if "tokenData" in prevout.keys():
                     input_token_data = prevout["tokenData"]
             else:
-                _input_details = self.get_input_details(input_txid, tx_input["vout"])
+                _input_details = inputs_details.get((input_txid, tx_input["vout"]))
                 if _input_details and "value" in _input_details:
                     value = _input_details.get("value")
                     total_input_sats += value
@@ -358,41 +368,86 @@ class BCHN(object):
             previous_out = previous_tx["vout"][vout_index]
             return self._parse_output(previous_out)
 
-    def _recvall(self, sock):
-        BUFF_SIZE = 4096
-        data = bytearray()
-        while True:
-            packet = sock.recv(BUFF_SIZE)
-            data.extend(packet)
-            if data.endswith(bytes("\r\n", "utf-8")):
-                break
-        return data
+    def get_inputs_details(self, outpoints):
+        """
+        outpoints: list of (txid, vout_index)
+        Same as `get_input_details()` for many inputs, all previous transactions
+        are fetched in a single batched RPC request when the pooled client is enabled
+
+        Returns: { (txid, vout_index): details }
+        """
+        txids = list({ txid for txid, _ in outpoints })
+        if not txids:
+            return {}
+
+        connection = self._get_rpc_connection()
+        try:
+            # AuthServiceProxy has no batch call, it proxies any attribute as an RPC method
+            if not isinstance(connection, RPCClient):
+                return { (txid, vout): self.get_input_details(txid, vout) for txid, vout in outpoints }
+
+            raw_tx_cache = get_raw_tx_cache()
+            previous_txs = raw_tx_cache.get_many(txids)
+            txids = [txid for txid in txids if txid not in previous_txs]
+            for i in range(0, len(txids), RPC_BATCH_SIZE):
+                txids_batch = txids[i:i + RPC_BATCH_SIZE]
+                calls = [("getrawtransaction", [txid, 2]) for txid in txids_batch]
+                fetched_txs = dict(zip(txids_batch, connection.batch(calls, ignore_errors=True)))
+                raw_tx_cache.set_many(fetched_txs)
+                previous_txs.update(fetched_txs)
+        finally:
+            self._close_connection(connection)
+
+        details = {}
+        for txid, vout in outpoints:
+            previous_tx = previous_txs.get(txid)
+            if previous_tx:
+                details[(txid, vout)] = self._parse_output(previous_tx["vout"][vout])
+            else:
+                details[(txid, vout)] = None
+        return details
 
     def get_utxos(self, address):
-        data = '{ "id": 0, "method": "blockchain.address.listunspent",'
-        data += '"params": ["%s", "include_tokens"] }' % (address)
-
-        with socket.create_connection(
-            (self.fulcrum["host"], self.fulcrum["port"])
-        ) as sock:
-            sock.send(data.encode("utf-8") + b"\n")
-            response_byte = self._recvall(sock)
-            response = response_byte.decode()
-            response = json.loads(response.strip())
-            return response["result"]
+        return get_fulcrum_client().request(
+            "blockchain.address.listunspent", [address, "include_tokens"]
+        )
+
+    def get_utxos_many(self, addresses):
+        """
+        Batch version of `get_utxos()`, all requests are pipelined over one connection
+
+        Returns: { address: utxos }, utxos is None if the request failed
+        """
+        results = get_fulcrum_client().request_many(
+            [("blockchain.address.listunspent", [address, "include_tokens"]) for address in addresses],
+            ignore_errors=True,
+        )
+        return dict(zip(addresses, results))
+
+    def get_address_statuses(self, addresses):
+        """
+        Electrum status hash of the history of each address (None if the address has no history).
+        The status changes whenever a transaction touching the address is added or confirmed.
+        Each address is subscribed and immediately unsubscribed to read its status,
+        all requests are pipelined over one connection.
+
+        Returns: { address: status }, addresses whose request failed are left out
+        """
+        calls = []
+        for address in addresses:
+            calls.append(("blockchain.address.subscribe", [address]))
+            calls.append(("blockchain.address.unsubscribe", [address]))
+
+        failed = object()
+        results = get_fulcrum_client().request_many(calls, ignore_errors=True, default=failed)
+        statuses = {}
+        for address, status in zip(addresses, results[::2]):
+            if status is not failed:
+                statuses[address] = status
+        return statuses
 
     def get_address_transactions(self, address, limit=None, offset=None):
-        data = '{ "id": 0, "method": "blockchain.address.get_history",'
-        data += '"params": ["%s"] }' % (address)
-
-        with socket.create_connection(
-            (self.fulcrum["host"], self.fulcrum["port"])
-        ) as sock:
-            sock.send(data.encode("utf-8") + b"\n")
-            response_byte = self._recvall(sock)
-            response = response_byte.decode()
-            response = json.loads(response.strip())
-            return response["result"]
+        return get_fulcrum_client().request("blockchain.address.get_history", [address])
 
     def check_address_history(self, address):
         """
@@ -405,44 +460,32 @@ class BCHN(object):
         Returns:
             bool: True if address has transaction history, False otherwise
         """
-        data = '{ "id": 0, "method": "blockchain.address.get_first_use",'
-        data += '"params": ["%s"] }' % (address)
-
-        with socket.create_connection(
-            (self.fulcrum["host"], self.fulcrum["port"])
-        ) as sock:
-            sock.send(data.encode("utf-8") + b"\n")
-            response_byte = self._recvall(sock)
-            response = response_byte.decode()
-            response = json.loads(response.strip())
-            result = response.get("result")
-            # get_first_use returns [height, tx_hash, funding_tx_pos] if used, null if never used
-            return bool(result)
+        result = get_fulcrum_client().request("blockchain.address.get_first_use", [address])
+        # get_first_use returns [height, tx_hash, funding_tx_pos] if used, null if never used
+        return bool(result)
+
+    def check_addresses_history(self, addresses):
+        """
+        Batch version of `check_address_history()`, all requests are pipelined over one connection
+
+        Returns: { address: bool }, value is None if the request failed
+        """
+        failed = object()
+        results = get_fulcrum_client().request_many(
+            [("blockchain.address.get_first_use", [address]) for address in addresses],
+            ignore_errors=True,
+            default=failed,
+        )
+        return {
+            address: None if result is failed else bool(result)
+            for address, result in zip(addresses, results)
+        }
 
     def get_dsproof(self, identifier, limit=None, offset=None):
         """
         identifier: (str) tx hash or dsproof ID
         """
-        data = '{ "id": 0, "method": "blockchain.transaction.dsproof.get",'
-        data += '"params": ["%s"] }' % (identifier)
-
-        with socket.create_connection(
-            (self.fulcrum["host"], self.fulcrum["port"])
-        ) as sock:
-            sock.send(data.encode("utf-8") + b"\n")
-            response_byte = self._recvall(sock)
-            response = response_byte.decode()
-            response = json.loads(response.strip())
-            return response["result"]
+        return get_fulcrum_client().request("blockchain.transaction.dsproof.get", [identifier])
 
     def get_fulcrum_server_features(self, limit=None, offset=None):
-        data = '{ "id": 0, "method": "server.features" }'
-
-        with socket.create_connection(
-            (self.fulcrum["host"], self.fulcrum["port"])
-        ) as sock:
-            sock.send(data.encode("utf-8") + b"\n")
-            response_byte = self._recvall(sock)
-            response = response_byte.decode()
-            response = json.loads(response.strip())
-            return response["result"]
+        return get_fulcrum_client().request("server.features")
@@ -0,0 +1,171 @@
+import itertools
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+
+from django.conf import settings
+
+LOGGER = logging.getLogger(__name__)
+
+# Max number of requests written to a socket before reading the responses
+PIPELINE_SIZE = 200
+
+
+class FulcrumError(Exception):
+    def __init__(self, error):
+        self.error = error
+        message = error.get("message") if isinstance(error, dict) else str(error)
+        super().__init__(message)
+
+
+class FulcrumConnection(object):
+    """
+        A single newline delimited JSON-RPC connection to Fulcrum.
+        Requests are pipelined: all of them are written first, then responses are
+        read and matched by id. Messages without an id (subscription notifications)
+        are skipped.
+    """
+
+    def __init__(self, host, port, timeout=30):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+        self.ids = itertools.count(1)
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+    def pipeline(self, calls):
+        """
+            calls: [(method, [params]), ...]
+            Returns the JSON-RPC responses in the same order as `calls`
+        """
+        ids = []
+        data = bytearray()
+        for method, params in calls:
+            request_id = next(self.ids)
+            ids.append(request_id)
+            data += json.dumps({"id": request_id, "method": method, "params": list(params)}).encode()
+            data += b"\n"
+        self.sock.sendall(data)
+
+        pending = set(ids)
+        responses = {}
+        while pending:
+            line = self.reader.readline()
+            if not line:
+                raise ConnectionError("fulcrum connection closed")
+            message = json.loads(line)
+            request_id = message.get("id") if isinstance(message, dict) else None
+            if request_id not in pending:
+                continue
+            pending.remove(request_id)
+            responses[request_id] = message
+
+        return [responses[request_id] for request_id in ids]
+
+
+class FulcrumClient(object):
+    """
+        Thread-safe pool of persistent Fulcrum connections.
+
+        Usage:
+            client.request("blockchain.address.listunspent", [address, "include_tokens"])
+            client.request_many([
+                ("blockchain.address.get_first_use", [address]) for address in addresses
+            ])
+    """
+
+    def __init__(self, host, port, pool_size=5, timeout=30):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _acquire(self):
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            return FulcrumConnection(self.host, self.port, timeout=self.timeout)
+
+    def _release(self, connection):
+        try:
+            self.pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _pipeline(self, calls):
+        connection = self._acquire()
+        try:
+            responses = connection.pipeline(calls)
+        except (OSError, ValueError) as exception:
+            # pooled connection may have been dropped by the server, retry once on a new one
+            connection.close()
+            LOGGER.warning(f"Fulcrum connection error, reconnecting: {exception}")
+            connection = FulcrumConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                responses = connection.pipeline(calls)
+            except Exception:
+                connection.close()
+                raise
+        except Exception:
+            connection.close()
+            raise
+
+        self._release(connection)
+        return responses
+
+    def request(self, method, params=None):
+        response = self._pipeline([(method, params or [])])[0]
+        if response.get("error"):
+            raise FulcrumError(response["error"])
+        return response.get("result")
+
+    def request_many(self, calls, ignore_errors=False, default=None):
+        """
+            calls: [(method, [params]), ...]
+            Sends the calls pipelined over a single connection, results are returned
+            in the same order as `calls`.
+            Failed calls raise FulcrumError, or are returned as `default` if `ignore_errors`
+        """
+        results = []
+        for i in range(0, len(calls), PIPELINE_SIZE):
+            for response in self._pipeline(calls[i:i + PIPELINE_SIZE]):
+                if response.get("error"):
+                    if not ignore_errors:
+                        raise FulcrumError(response["error"])
+                    results.append(default)
+                    continue
+                results.append(response.get("result"))
+        return results
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_fulcrum_client():
+    """
+        Returns the process wide FulcrumClient, recreated after a fork (e.g. celery prefork workers)
+        so sockets are never shared between processes.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = FulcrumClient(
+                    settings.BCHN_HOST,
+                    settings.FULCRUM_PORT,
+                    pool_size=settings.FULCRUM_POOL_SIZE,
+                )
+                _client_pid = pid
+    return _client
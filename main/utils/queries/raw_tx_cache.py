@@ -0,0 +1,206 @@
+"""
+Two tier cache of `getrawtransaction` results keyed by txid and verbosity.
+
+A transaction's contents never change once it is confirmed, so confirmed
+transactions (and raw hex, which is the txid preimage) are stored without expiry.
+Mempool transactions are kept RAW_TX_MEMPOOL_TTL seconds, their block fields are
+still to be filled in. The `confirmations` count of a cached confirmed tx is the
+one at the time it was fetched, a lower bound of the current count.
+
+Lookups go through a process local LRU (RAW_TX_CACHE_SIZE entries) then the
+shared REDISKV tier. Both keep the encoded entry (main.utils.cache_codec), so
+each lookup returns a new copy that callers are free to modify.
+
+Hits of each tier and node fetches are counted per process and added to the
+RAW_TX_STATS_KEY hash every CACHE_CODEC_STATS_INTERVAL seconds,
+see the `raw_tx_cache_stats` command.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from main.utils import cache_codec
+
+LOGGER = logging.getLogger(__name__)
+
+RAW_TX_STATS_KEY = 'raw-tx:stats'
+
+
+def raw_tx_cache_key(txid, verbosity):
+    return f'raw-tx:{txid}:{verbosity}'
+
+
+def get_expiration(txn, verbosity):
+    """
+    Seconds `txn` may be cached for, None for no expiry
+    """
+    if not verbosity or txn.get('blockhash'):
+        return None
+    return settings.RAW_TX_MEMPOOL_TTL
+
+
+class LocalLRUCache(object):
+    """
+    Thread safe LRU of (expires_at, value) entries
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expiration=None):
+        expires_at = None if expiration is None else time.time() + expiration
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class RawTxCacheStats(object):
+
+    FIELDS = ('local_hits', 'redis_hits', 'misses')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counts = dict.fromkeys(self.FIELDS, 0)
+        self.last_flush = time.time()
+
+    def record(self, local_hits=0, redis_hits=0, misses=0):
+        with self.lock:
+            self.counts['local_hits'] += local_hits
+            self.counts['redis_hits'] += redis_hits
+            self.counts['misses'] += misses
+            if time.time() - self.last_flush < settings.CACHE_CODEC_STATS_INTERVAL:
+                return
+            counts = self.counts
+            self.reset()
+
+        try:
+            pipeline = settings.REDISKV.pipeline(transaction=False)
+            for field, value in counts.items():
+                if value:
+                    pipeline.hincrby(RAW_TX_STATS_KEY, field, value)
+            pipeline.execute()
+        except Exception:
+            LOGGER.exception('Failed to save raw tx cache stats')
+
+
+class RawTxCache(object):
+
+    def __init__(self, maxsize):
+        self.local = LocalLRUCache(maxsize)
+        self.stats = RawTxCacheStats()
+
+    def get_many(self, txids, verbosity=2):
+        """
+        Returns { txid: txn } of the cached transactions
+        """
+        results = {}
+        missing = []
+        for txid in txids:
+            value = self.local.get(raw_tx_cache_key(txid, verbosity))
+            if value is None:
+                missing.append(txid)
+            else:
+                results[txid] = cache_codec.decode(value)
+        local_hits = len(results)
+
+        if missing:
+            try:
+                values = settings.REDISKV.mget([raw_tx_cache_key(txid, verbosity) for txid in missing])
+            except Exception:
+                LOGGER.exception('Failed to read raw tx cache')
+                values = [None] * len(missing)
+
+            for txid, value in zip(missing, values):
+                if value is None:
+                    continue
+                try:
+                    txn = cache_codec.decode(value)
+                except Exception:
+                    LOGGER.exception(f'Failed to decode cached raw tx: {txid}')
+                    continue
+                results[txid] = txn
+                self.local.set(raw_tx_cache_key(txid, verbosity), value, get_expiration(txn, verbosity))
+
+        self.stats.record(
+            local_hits=local_hits,
+            redis_hits=len(results) - local_hits,
+            misses=len(txids) - len(results),
+        )
+        return results
+
+    def get(self, txid, verbosity=2):
+        return self.get_many([txid], verbosity=verbosity).get(txid)
+
+    def set_many(self, txns, verbosity=2):
+        """
+        txns: { txid: txn } fetched from the node, empty results are skipped
+        """
+        pipeline = settings.REDISKV.pipeline(transaction=False)
+        for txid, txn in txns.items():
+            if not txn:
+                continue
+            key = raw_tx_cache_key(txid, verbosity)
+            expiration = get_expiration(txn, verbosity)
+            value = cache_codec.encode(txn)
+            self.local.set(key, value, expiration)
+            pipeline.set(key, value, ex=expiration)
+
+        try:
+            pipeline.execute()
+        except Exception:
+            LOGGER.exception('Failed to save raw tx cache')
+
+    def set(self, txid, txn, verbosity=2):
+        self.set_many({ txid: txn }, verbosity=verbosity)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_raw_tx_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RawTxCache(settings.RAW_TX_CACHE_SIZE)
+    return _cache
+
+
+def get_raw_tx_cache_stats():
+    stats = settings.REDISKV.hgetall(RAW_TX_STATS_KEY)
+    stats = { key.decode() if isinstance(key, bytes) else key: int(value) for key, value in stats.items() }
+    for field in RawTxCacheStats.FIELDS:
+        stats.setdefault(field, 0)
+
+    lookups = sum(stats[field] for field in RawTxCacheStats.FIELDS)
+    hits = stats['local_hits'] + stats['redis_hits']
+    stats['lookups'] = lookups
+    stats['hit_ratio'] = hits / lookups if lookups else None
+    return stats
@@ -0,0 +1,255 @@
+import base64
+import bisect
+import http.client
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from decimal import Decimal
+from urllib.parse import urlparse
+
+from bitcoinrpc.authproxy import JSONRPCException
+from django.conf import settings
+
+LOGGER = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+# Errors of a keep-alive connection that was closed by the node, the request is retried once
+CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    http.client.ResponseNotReady,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+
+
+def _encode_decimal(value):
+    if isinstance(value, Decimal):
+        return float(round(value, 8))
+    raise TypeError(f"{repr(value)} is not JSON serializable")
+
+
+class RPCClient(object):
+    """
+        Thread-safe JSON-RPC client for BCHN that keeps a pool of HTTP keep-alive
+        connections instead of opening one per call like `AuthServiceProxy`.
+
+        Supports the same attribute style calls as `AuthServiceProxy`
+        (e.g. `client.getblockcount()`) plus JSON-RPC batch arrays:
+            client.batch([("getrawtransaction", [txid, 2]), ...])
+
+        Floats in responses are parsed as Decimal, same as `AuthServiceProxy`.
+        Up to `pool_size` idle connections are kept, extra connections opened under
+        load are closed once released.
+    """
+
+    def __init__(self, url, pool_size=10, timeout=30, stats_log_interval=None):
+        parsed_url = urlparse(url)
+        self.host = parsed_url.hostname
+        self.port = parsed_url.port or 80
+        self.path = parsed_url.path or "/"
+        auth = f"{parsed_url.username}:{parsed_url.password}".encode()
+        self.auth_header = b"Basic " + base64.b64encode(auth)
+
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+        self.ids = itertools.count(1)
+
+        self.lock = threading.Lock()
+        self.connections_created = 0
+        self.connections_in_use = 0
+        self.requests = 0
+        self.errors = 0
+        self.reconnects = 0
+        self.latencies = {}  # { method: [bucket counts] }
+        self.stats_log_interval = stats_log_interval
+        self.last_stats_log = time.time()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return lambda *params: self.call(name, *params)
+
+    def _new_connection(self):
+        with self.lock:
+            self.connections_created += 1
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self):
+        try:
+            connection = self.pool.get_nowait()
+        except queue.Empty:
+            connection = self._new_connection()
+        with self.lock:
+            self.connections_in_use += 1
+        return connection
+
+    def _release(self, connection, reuse=True):
+        with self.lock:
+            self.connections_in_use -= 1
+        if not reuse:
+            connection.close()
+            return
+        try:
+            self.pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _post(self, connection, body):
+        connection.request("POST", self.path, body, {
+            "Host": self.host,
+            "User-Agent": "watchtower-rpc",
+            "Authorization": self.auth_header,
+            "Content-type": "application/json",
+        })
+        response = connection.getresponse()
+        data = response.read()
+        if response.status == 401:
+            raise JSONRPCException({"code": -342, "message": "unauthorized"})
+        content_type = response.getheader("Content-Type") or ""
+        if "application/json" not in content_type:
+            raise JSONRPCException({
+                "code": -342,
+                "message": f"non-JSON HTTP response with '{response.status} {response.reason}' from server",
+            })
+        return json.loads(data.decode("utf8"), parse_float=Decimal)
+
+    def _request(self, payload, method_name):
+        body = json.dumps(payload, default=_encode_decimal)
+        start = time.perf_counter()
+        connection = self._acquire()
+        reuse = False
+        try:
+            try:
+                response = self._post(connection, body)
+            except CONNECTION_ERRORS:
+                # keep-alive connection was closed by the node, retry once on a new one
+                connection.close()
+                with self.lock:
+                    self.reconnects += 1
+                response = self._post(connection, body)
+            reuse = True
+            return response
+        except Exception:
+            with self.lock:
+                self.errors += 1
+            raise
+        finally:
+            self._release(connection, reuse=reuse)
+            self._record(method_name, time.perf_counter() - start)
+
+    def _record(self, method_name, duration):
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, duration * 1000)
+        with self.lock:
+            self.requests += 1
+            if method_name not in self.latencies:
+                self.latencies[method_name] = [0] * (len(LATENCY_BUCKETS) + 1)
+            self.latencies[method_name][bucket] += 1
+
+            log_stats = self.stats_log_interval and time.time() - self.last_stats_log >= self.stats_log_interval
+            if log_stats:
+                self.last_stats_log = time.time()
+        if log_stats:
+            LOGGER.info(f"BCHN RPC STATS | {self.get_stats()}")
+
+    def call(self, method, *params):
+        payload = {
+            "version": "1.1",
+            "method": method,
+            "params": list(params),
+            "id": next(self.ids),
+        }
+        response = self._request(payload, method)
+        if response.get("error") is not None:
+            raise JSONRPCException(response["error"])
+        if "result" not in response:
+            raise JSONRPCException({"code": -343, "message": "missing JSON-RPC result"})
+        return response["result"]
+
+    def batch(self, calls, ignore_errors=False):
+        """
+            calls: [(method, [params]), ...]
+            Sends all calls in a single JSON-RPC batch request, results are returned
+            in the same order as `calls`.
+            Failed calls raise JSONRPCException, or are returned as None if `ignore_errors`
+        """
+        if not calls:
+            return []
+
+        payload = []
+        for method, params in calls:
+            payload.append({
+                "jsonrpc": "2.0",
+                "method": method,
+                "params": list(params),
+                "id": next(self.ids),
+            })
+
+        methods = { method for method, _ in calls }
+        method_name = f"batch:{methods.pop()}" if len(methods) == 1 else "batch"
+        responses = self._request(payload, method_name)
+        if not isinstance(responses, list):
+            raise JSONRPCException(responses.get("error") or {"code": -343, "message": "invalid batch response"})
+
+        responses_map = { response.get("id"): response for response in responses }
+        results = []
+        for request in payload:
+            response = responses_map.get(request["id"], {})
+            if response.get("error") is not None or "result" not in response:
+                if not ignore_errors:
+                    raise JSONRPCException(response.get("error") or {"code": -343, "message": "missing JSON-RPC result"})
+                results.append(None)
+                continue
+            results.append(response["result"])
+        return results
+
+    def get_stats(self):
+        with self.lock:
+            latencies = {}
+            for method, counts in self.latencies.items():
+                labels = [f"<={bucket}ms" for bucket in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}ms"]
+                latencies[method] = dict(zip(labels, counts))
+
+            return dict(
+                pool_size=self.pool_size,
+                idle=self.pool.qsize(),
+                in_use=self.connections_in_use,
+                connections_created=self.connections_created,
+                requests=self.requests,
+                errors=self.errors,
+                reconnects=self.reconnects,
+                latencies=latencies,
+            )
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_rpc_client():
+    """
+        Returns the process wide RPCClient, recreated after a fork (e.g. celery prefork workers)
+        so connections are never shared between processes.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = RPCClient(
+                    settings.BCHN_NODE,
+                    pool_size=settings.BCHN_RPC_POOL_SIZE,
+                    timeout=settings.BCHN_RPC_TIMEOUT,
+                    stats_log_interval=settings.BCHN_RPC_STATS_LOG_INTERVAL,
+                )
+                _client_pid = pid
+    return _client
@@ -0,0 +1,161 @@
+"""
+Per key single-flight execution of tasks through REDISKV.
+
+`single_flight` runs at most one call per key at a time. Each key has its own lock
+(SET NX with a TTL, so a killed worker does not hold it forever). A call that finds
+the key locked stores its arguments under the key's pending entry and returns; the
+running call runs once more after it finishes, with the arguments of the latest
+request (or their combination by the decorator's `merge`), so the requests that
+arrived meanwhile are merged into a single re-run that sees their data. A run that
+raises still runs the merged requests before raising.
+
+Requests of a short window are merged at enqueue time with the `debounce` option of
+main.utils.task_dedupe.
+"""
+import logging
+import pickle
+import uuid
+from functools import wraps
+
+from celery import Task
+from django.conf import settings
+from redis.exceptions import WatchError
+
+LOGGER = logging.getLogger(__name__)
+
+REDIS_STORAGE = settings.REDISKV
+
+# Deletes `key` only if it still holds `value`, e.g. a lock that may have expired and been taken since
+DELETE_IF_EQUAL_SCRIPT = REDIS_STORAGE.register_script("""
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+""")
+
+
+def lock_key(key):
+    return f'single-flight:lock:{key}'
+
+
+def pending_key(key):
+    return f'single-flight:pending:{key}'
+
+
+def acquire_lock(key, ttl):
+    """
+    Returns the lock token if `key` was free, None otherwise
+    """
+    token = str(uuid.uuid4())
+    if REDIS_STORAGE.set(lock_key(key), token, nx=True, ex=ttl):
+        return token
+    return None
+
+
+def release_lock(key, token):
+    DELETE_IF_EQUAL_SCRIPT(keys=[lock_key(key)], args=[token])
+
+
+def dump_call(args, kwargs):
+    return pickle.dumps((tuple(args), kwargs))
+
+
+def load_call(payload):
+    return pickle.loads(payload)
+
+
+def store_pending(key, payload, ttl, merge=None, older=False):
+    """
+    Stores `payload` as the pending call of `key`. A call already pending is combined with
+    it by `merge(older call, newer call)`, or replaced (kept if `payload` is the `older`)
+    """
+    if not merge:
+        REDIS_STORAGE.set(pending_key(key), payload, nx=older, ex=ttl)
+        return
+
+    with REDIS_STORAGE.pipeline() as pipeline:
+        while True:
+            try:
+                pipeline.watch(pending_key(key))
+                pending = pipeline.get(pending_key(key))
+                if pending is not None:
+                    calls = (payload, pending) if older else (pending, payload)
+                    payload = dump_call(*merge(*[load_call(call) for call in calls]))
+                pipeline.multi()
+                pipeline.set(pending_key(key), payload, ex=ttl)
+                pipeline.execute()
+                return
+            except WatchError:
+                continue
+
+
+def take_pending(key):
+    """
+    Returns and clears the pending call of `key`, None if there is none
+    """
+    pipeline = REDIS_STORAGE.pipeline(transaction=True)
+    pipeline.get(pending_key(key))
+    pipeline.delete(pending_key(key))
+    payload, _ = pipeline.execute()
+    return payload
+
+
+def single_flight(key_func, ttl=300, merge=None):
+    """
+    Decorator, `key_func` gets the arguments of the call and returns its key.
+    The bound task of a `bind=True` task is not stored with the merged arguments,
+    the re-run gets the running call's.
+
+    merge: combines two merged requests, gets (older args, kwargs), (newer args, kwargs)
+        and returns the (args, kwargs) to re-run with. The newer request wins without it.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = key_func(*args, **kwargs)
+            bound = args[:1] if args and isinstance(args[0], Task) else ()
+            payload = dump_call(args[len(bound):], kwargs)
+
+            token = acquire_lock(key, ttl)
+            if not token:
+                store_pending(key, payload, ttl, merge=merge)
+                # the running call may have finished since, without seeing the pending call
+                token = acquire_lock(key, ttl)
+                if not token:
+                    LOGGER.info(f'{func.__name__} | {key} is already running, merged into its re-run')
+                    return f'already_running: {key}'
+                DELETE_IF_EQUAL_SCRIPT(keys=[pending_key(key)], args=[payload])
+
+            result = None
+            error = None
+            while True:
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as exc:
+                    LOGGER.info(f'{func.__name__} | {key} failed, running the merged requests before raising')
+                    error = error or exc
+                finally:
+                    release_lock(key, token)
+
+                payload = take_pending(key)
+                if payload is None:
+                    break
+
+                token = acquire_lock(key, ttl)
+                if not token:
+                    # another call took the lock meanwhile, hand the merged request over to it
+                    store_pending(key, payload, ttl, merge=merge, older=True)
+                    token = acquire_lock(key, ttl)
+                    if not token:
+                        break
+                    DELETE_IF_EQUAL_SCRIPT(keys=[pending_key(key)], args=[payload])
+
+                call_args, kwargs = load_call(payload)
+                args = (*bound, *call_args)
+                LOGGER.info(f'{func.__name__} | {key} was requested while running, running again')
+
+            if error is not None:
+                raise error
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,114 @@
+import logging
+import time
+
+from django.conf import settings
+
+from anyhedge.models import HedgePosition
+from main.models import Address
+from main.utils import cashaddr
+from main.utils.redis_address_manager import BCHAddressManager
+from main.utils.tx_decoder import (
+    TxDecodeError,
+    decode_transaction,
+    input_locking_bytecodes,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+
+def address_to_locking_bytecode(address):
+    """
+        Returns the locking bytecode (bytes) of a cash address, None if invalid
+    """
+    try:
+        return cashaddr.to_locking_bytecode(address)
+    except cashaddr.CashAddressError:
+        return None
+
+
+class SubscribedScripts(object):
+    """
+        In-memory set of the locking bytecodes of every subscribed address.
+        Used by the ZMQ listener to drop mempool transactions that do not touch
+        any of our addresses before anything is published or queried.
+
+        `refresh()` loads rows created since the last refresh (by id) every
+        MEMPOOL_FILTER_REFRESH_INTERVAL seconds and reloads everything every
+        MEMPOOL_FILTER_FULL_RELOAD_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self.scripts = {}  # { locking_bytecode: address }
+        self.last_address_id = 0
+        self.last_hedge_position_id = 0
+        self.last_refresh = 0
+        self.last_full_reload = 0
+
+    def __len__(self):
+        return len(self.scripts)
+
+    def add(self, address):
+        if not address:
+            return
+        locking_bytecode = address_to_locking_bytecode(address)
+        if locking_bytecode:
+            self.scripts[locking_bytecode] = address
+
+    def reload(self):
+        self.scripts = {}
+        self.last_address_id = 0
+        self.last_hedge_position_id = 0
+        self.last_full_reload = time.time()
+        self.refresh()
+        LOGGER.info(f"Loaded {len(self.scripts)} subscribed locking bytecodes")
+
+    def refresh(self):
+        self.last_refresh = time.time()
+
+        addresses = Address.objects.filter(id__gt=self.last_address_id) \
+            .order_by("id").values_list("id", "address").iterator()
+        for address_id, address in addresses:
+            self.add(address)
+            self.last_address_id = address_id
+
+        positions = HedgePosition.objects.filter(id__gt=self.last_hedge_position_id) \
+            .order_by("id").values_list("id", "address").iterator()
+        for position_id, address in positions:
+            self.add(address)
+            self.last_hedge_position_id = position_id
+
+        # addresses with websocket listeners that may not be subscribed
+        for address in BCHAddressManager.get_all_active_addresses():
+            self.add(address)
+
+    def maybe_refresh(self):
+        now = time.time()
+        if now - self.last_full_reload >= settings.MEMPOOL_FILTER_FULL_RELOAD_INTERVAL:
+            self.reload()
+        elif now - self.last_refresh >= settings.MEMPOOL_FILTER_REFRESH_INTERVAL:
+            self.refresh()
+
+    def match(self, raw_tx):
+        """
+            raw_tx: (bytes) serialized transaction
+            Returns the subscribed addresses found in the outputs and inputs of the tx.
+            Inputs are matched through the pubkey/redeem script in the unlocking script.
+        """
+        try:
+            tx = decode_transaction(raw_tx)
+        except TxDecodeError:
+            return []
+
+        addresses = set()
+        for tx_output in tx["outputs"]:
+            address = self.scripts.get(tx_output["locking_bytecode"])
+            if address:
+                addresses.add(address)
+
+        for tx_input in tx["inputs"]:
+            for locking_bytecode in input_locking_bytecodes(tx_input["script_sig"]):
+                address = self.scripts.get(locking_bytecode)
+                if address:
+                    addresses.add(address)
+
+        return list(addresses)
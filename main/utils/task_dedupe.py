@@ -0,0 +1,170 @@
+"""
+Deduplication of task requests at enqueue time through REDISKV.
+
+A task declared with `base=DedupeTask` and a `dedupe` option is queued once per key
+(the task name and the values of the `dedupe['args']` arguments) at a time:
+
+    @shared_task(queue='rescan_utxos', base=DedupeTask, dedupe={ 'args': ('wallet_hash', 'full', 'force') })
+    def rescan_utxos(wallet_hash, full=False, force=False):
+
+Arguments changing the result of a call belong in the key, only debounced tasks may
+leave some out (see below).
+
+The first request of a key stores its task id under the key for `window` seconds
+(TASK_DEDUPE_WINDOW by default), requests made meanwhile are dropped and get the
+AsyncResult of the queued task. The key is released when the task starts, so a request
+made while it runs is queued again and sees the data written meanwhile.
+
+With `'debounce': True` the first request is delayed by the window, the requests of the
+window are merged into it: their arguments are stored with the key and the task runs with
+those of the latest request, or their combination by `dedupe['merge']` (same hook as
+`main.utils.single_flight`).
+
+Retries and direct calls are never deduplicated. Counts of queued and deduplicated
+requests per task are kept in the DEDUPE_STATS_KEY hash.
+"""
+import inspect
+import logging
+
+from celery import Task
+from celery.utils import uuid
+from django.conf import settings
+
+from main.utils.single_flight import dump_call, load_call
+
+LOGGER = logging.getLogger(__name__)
+
+REDIS_STORAGE = settings.REDISKV
+
+DEDUPE_STATS_KEY = 'task-dedupe:stats'
+
+# Seconds the merged requests of a debounced task are kept after its window, in case it runs late
+PAYLOAD_TTL = 3600
+
+# Stores the task id under the key if free, returns the id of the task queued for the key.
+# A deduplicated request appends its arguments (ARGV[4], if any) to the key's payloads.
+QUEUE_SCRIPT = REDIS_STORAGE.register_script("""
+    if redis.call('set', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+        redis.call('hincrby', KEYS[2], ARGV[3] .. ':queued', 1)
+        return ARGV[1]
+    end
+    redis.call('hincrby', KEYS[2], ARGV[3] .. ':deduplicated', 1)
+    if ARGV[4] ~= '' then
+        redis.call('rpush', KEYS[3], ARGV[4])
+        redis.call('pexpire', KEYS[3], ARGV[2] + ARGV[5])
+    end
+    return redis.call('get', KEYS[1])
+""")
+
+# Deletes the key only if it is still held by the task id (it may have expired and been taken
+# since), returns and clears the payloads of the key
+RELEASE_SCRIPT = REDIS_STORAGE.register_script("""
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        redis.call('del', KEYS[1])
+    end
+    local payloads = redis.call('lrange', KEYS[2], 0, -1)
+    redis.call('del', KEYS[2])
+    return payloads
+""")
+
+
+def dedupe_key(task_name, values):
+    return f'task-dedupe:{task_name}:' + ':'.join(str(value) for value in values)
+
+
+def payload_key(key):
+    return f'{key}:payloads'
+
+
+class DedupeTask(Task):
+    """
+    dedupe: {
+        'args': names of the arguments identifying the work of a call
+        'window': seconds a key is held at most, 0 disables (default: TASK_DEDUPE_WINDOW)
+        'debounce': delay the first call by the window (default: False)
+        'merge': combines the arguments of two requests of a debounced key, gets
+            (older args, kwargs), (newer args, kwargs) and returns the (args, kwargs) to run
+            with (default: the newer request wins)
+    }
+    """
+    dedupe = None
+
+    def get_dedupe_key(self, args, kwargs):
+        """
+        Returns None if the arguments do not match the task, its call fails as it would otherwise
+        """
+        try:
+            call = inspect.signature(self.run).bind(*(args or ()), **(kwargs or {}))
+        except TypeError:
+            return None
+        call.apply_defaults()
+        return dedupe_key(self.name, [call.arguments[name] for name in self.dedupe['args']])
+
+    def apply_async(self, args=None, kwargs=None, task_id=None, **options):
+        if not self.dedupe or not settings.TASK_DEDUPE_ENABLED or options.get('retries'):
+            return super().apply_async(args, kwargs, task_id=task_id, **options)
+
+        window = self.dedupe.get('window', settings.TASK_DEDUPE_WINDOW)
+        key = self.get_dedupe_key(args, kwargs)
+        if not window or key is None:
+            return super().apply_async(args, kwargs, task_id=task_id, **options)
+
+        task_id = task_id or uuid()
+        payload = dump_call(args or (), kwargs or {}) if self.dedupe.get('debounce') else ''
+        try:
+            queued_id = QUEUE_SCRIPT(
+                keys=[key, DEDUPE_STATS_KEY, payload_key(key)],
+                args=[task_id, int(window * 1000), self.name, payload, PAYLOAD_TTL * 1000],
+            )
+        except Exception:
+            LOGGER.exception(f'{self.name} | failed to deduplicate {key}, queueing it')
+            queued_id = task_id
+
+        if isinstance(queued_id, bytes):
+            queued_id = queued_id.decode()
+        if queued_id and queued_id != task_id:
+            LOGGER.info(f'{self.name} | {key} is already queued as {queued_id}')
+            return self.AsyncResult(queued_id)
+
+        if self.dedupe.get('debounce') and 'countdown' not in options and 'eta' not in options:
+            options['countdown'] = window
+        return super().apply_async(args, kwargs, task_id=task_id, **options)
+
+    def __call__(self, *args, **kwargs):
+        task_id = self.request.id
+        if not task_id:
+            # called directly, Task.__call__ pushes the request of the call
+            return super().__call__(*args, **kwargs)
+
+        if self.dedupe:
+            key = self.get_dedupe_key(args, kwargs)
+            payloads = []
+            if key:
+                try:
+                    payloads = RELEASE_SCRIPT(keys=[key, payload_key(key)], args=[task_id])
+                except Exception:
+                    LOGGER.exception(f'{self.name} | failed to release {key}')
+
+            if payloads:
+                merge = self.dedupe.get('merge') or (lambda older, newer: newer)
+                args, kwargs = tuple(args), kwargs
+                for payload in payloads:
+                    args, kwargs = merge((args, kwargs), load_call(payload))
+                LOGGER.info(f'{self.name} | running {key} with the {len(payloads)} request(s) merged into it')
+                # a retry re-sends the merged arguments
+                self.request.args, self.request.kwargs = list(args), kwargs
+
+        # the tracer (worker or apply()) already pushed the task's request, Task.__call__ would
+        # push another one on top of it without its id and retries, breaking self.retry()
+        return self.run(*args, **kwargs)
+
+def get_dedupe_stats():
+    """
+    Returns { task name: { 'queued': int, 'deduplicated': int } }
+    """
+    stats = {}
+    for field, value in REDIS_STORAGE.hgetall(DEDUPE_STATS_KEY).items():
+        field = field.decode() if isinstance(field, bytes) else field
+        task_name, counter = field.rsplit(':', 1)
+        stats.setdefault(task_name, { 'queued': 0, 'deduplicated': 0 })[counter] = int(value)
+    return stats
@@ -1,8 +1,7 @@
 import logging
-from django.db import models
-from main.models import Transaction
+from django.db import connection
 
-from .cache import clear_cache_for_spent_transactions
+from .cache_buffer import get_invalidation_buffer, schedule_flush
 
 LOGGER = logging.getLogger(__name__)
 
@@ -20,9 +19,99 @@ def mark_transaction_inputs_as_spent(bch_tx):
     return mark_transactions_as_spent(spent_txs_list, bch_tx['txid'])
 
 
+# Outputs whose spent state changed, with what their cached balances/histories are keyed on
+SPENT_KEYS_SQL = """
+    WITH updated AS (
+        {update}
+        RETURNING txn.id, txn.address_id, txn.wallet_id, txn.cashtoken_ft_id
+    )
+    SELECT updated.id, address.address, wallet.wallet_hash, updated.cashtoken_ft_id
+    FROM updated
+    LEFT JOIN main_address AS address ON address.id = updated.address_id
+    LEFT JOIN main_wallet AS wallet ON wallet.id = COALESCE(updated.wallet_id, address.wallet_id)
+"""
+
+MARK_OUTPOINTS_SPENT_SQL = SPENT_KEYS_SQL.format(update="""
+        UPDATE main_transaction AS txn
+        SET spent = true, spending_txid = outpoint.spending_txid
+        FROM unnest(%s::varchar[], %s::integer[], %s::varchar[]) AS outpoint(txid, index, spending_txid)
+        WHERE txn.txid = outpoint.txid AND txn.index = outpoint.index
+            AND (NOT txn.spent OR txn.spending_txid IS DISTINCT FROM outpoint.spending_txid)
+""")
+
+MARK_IDS_SPENT_SQL = SPENT_KEYS_SQL.format(update="""
+        UPDATE main_transaction AS txn
+        SET spent = true
+        WHERE txn.id = ANY(%s) AND NOT txn.spent
+""")
+
+
+def _mark_spent(sql, params):
+    """
+    Runs one of the spend marking statements and queues the cache invalidations of
+    the updated outputs (flushed once the DB transaction commits).
+
+    Returns { 'transaction_ids': [...], 'addresses': set, 'wallets': { wallet_hash: set of asset keys } },
+    asset keys being 'bch' or the cashtoken category.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    result = { 'transaction_ids': [], 'addresses': set(), 'wallets': {} }
+    buffer = get_invalidation_buffer()
+    for transaction_id, address, wallet_hash, category in rows:
+        result['transaction_ids'].append(transaction_id)
+        if address:
+            result['addresses'].add(address)
+            buffer.add_address_balance(address)
+        if wallet_hash:
+            result['wallets'].setdefault(wallet_hash, set()).add(category or 'bch')
+            buffer.add_wallet_balance(wallet_hash, [category] if category else [])
+            buffer.add_wallet_history(wallet_hash)
+            buffer.add_last_address_index(wallet_hash)
+
+    if rows:
+        schedule_flush()
+    return result
+
+
+def mark_outpoints_spent(outpoints):
+    """
+    Marks the outputs of `outpoints` as spent in one statement, joined against the
+    list of outpoints instead of an OR per input. Outputs already spent by the same
+    tx are left as is, those marked spent without their spending txid (see
+    `mark_transaction_ids_spent()`) get it.
+
+    Args:
+        outpoints: iterable of (txid, index, spending_txid)
+
+    Returns: see `_mark_spent()`
+    """
+    outpoints = { (txid, index): spending_txid for txid, index, spending_txid in outpoints }
+    if not outpoints:
+        return { 'transaction_ids': [], 'addresses': set(), 'wallets': {} }
+
+    txids, indexes = zip(*outpoints.keys())
+    return _mark_spent(
+        MARK_OUTPOINTS_SPENT_SQL,
+        [list(txids), list(indexes), list(outpoints.values())],
+    )
+
+
+def mark_transaction_ids_spent(transaction_ids):
+    """
+    Same as `mark_outpoints_spent()` for Transaction ids, the spending txid is left as is.
+    """
+    transaction_ids = list(transaction_ids)
+    if not transaction_ids:
+        return { 'transaction_ids': [], 'addresses': set(), 'wallets': {} }
+    return _mark_spent(MARK_IDS_SPENT_SQL, [transaction_ids])
+
+
 def mark_transactions_as_spent(transactions, spending_txid):
     """
-    Clear cache and mark transactions as spent.
+    Mark transactions as spent and clear their cache.
 
     Args:
         transactions: List of tuples (txid, index) representing transactions to mark as spent
@@ -30,12 +119,4 @@ def mark_transactions_as_spent(transactions, spending_txid):
     """
     if not transactions: return
     LOGGER.info(f"MARKING TRANSACTIONS AS SPENT: {spending_txid} | {transactions}")
-
-    # Build Q filter for all transactions
-    inputs_filter = models.Q()
-    for txid, index in transactions:
-        inputs_filter = inputs_filter | models.Q(txid=txid, index=index)
-    
-    transaction_queryset = Transaction.objects.filter(inputs_filter)
-    clear_cache_for_spent_transactions(transaction_queryset)
-    transaction_queryset.update(spent=True, spending_txid=spending_txid)
+    return mark_outpoints_spent((txid, index, spending_txid) for txid, index in transactions)
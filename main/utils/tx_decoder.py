@@ -0,0 +1,341 @@
+"""
+In-process decoder for raw BCH transactions, used instead of the node's
+`decoderawtransaction` RPC on hot paths (ZMQ/mempool listeners, broadcast).
+
+Parsing is done over a memoryview of the raw bytes so scripts are not copied
+until they are needed, e.g. when formatted as an address.
+"""
+import hashlib
+
+from django.conf import settings
+
+from main.utils import cashaddr
+
+OP_0 = 0x00
+OP_PUSHDATA1 = 0x4c
+OP_PUSHDATA2 = 0x4d
+OP_PUSHDATA4 = 0x4e
+OP_16 = 0x60
+OP_RETURN = 0x6a
+OP_DUP = 0x76
+OP_EQUAL = 0x87
+OP_EQUALVERIFY = 0x88
+OP_HASH160 = 0xa9
+OP_HASH256 = 0xaa
+OP_CHECKSIG = 0xac
+
+# CashToken outputs prefix the locking bytecode with PREFIX_TOKEN
+PREFIX_TOKEN = 0xef
+HAS_AMOUNT = 0x10
+HAS_NFT = 0x20
+HAS_COMMITMENT_LENGTH = 0x40
+NULL_HASH = bytes(32)
+NFT_CAPABILITIES = {
+    0x00: "none",
+    0x01: "mutable",
+    0x02: "minting",
+}
+
+
+class TxDecodeError(Exception):
+    pass
+
+
+def sha256(data):
+    return hashlib.sha256(data).digest()
+
+
+def hash256(data):
+    return sha256(sha256(data))
+
+
+def ripemd160(data):
+    try:
+        return hashlib.new("ripemd160", data).digest()
+    except ValueError:
+        # OpenSSL 3 builds may not provide ripemd160
+        from Crypto.Hash import RIPEMD160
+        return RIPEMD160.new(data).digest()
+
+
+def hash160(data):
+    return ripemd160(sha256(data))
+
+
+def read_varint(data, offset):
+    prefix = data[offset]
+    if prefix < 0xfd:
+        return prefix, offset + 1
+    if prefix == 0xfd:
+        size = 2
+    elif prefix == 0xfe:
+        size = 4
+    else:
+        size = 8
+    end = offset + 1 + size
+    if end > len(data):
+        raise TxDecodeError("varint out of range")
+    return int.from_bytes(data[offset + 1:end], "little"), end
+
+
+def to_hex(data, reverse=False):
+    data = bytes(data)
+    if reverse:
+        data = data[::-1]
+    return data.hex()
+
+
+def read_bytes(data, offset, size):
+    end = offset + size
+    if end > len(data):
+        raise TxDecodeError("read out of range")
+    return data[offset:end], end
+
+
+def split_token_prefix(script):
+    """
+        Returns (token_prefix, locking_bytecode) of an output script.
+        token_prefix is empty for outputs without CashTokens.
+    """
+    if not len(script) or script[0] != PREFIX_TOKEN:
+        return script[:0], script
+
+    offset = 1 + 32  # PREFIX_TOKEN + category id
+    if offset >= len(script):
+        raise TxDecodeError("invalid token prefix")
+    bitfield = script[offset]
+    offset += 1
+    if bitfield & HAS_COMMITMENT_LENGTH:
+        length, offset = read_varint(script, offset)
+        offset += length
+    if bitfield & HAS_AMOUNT:
+        _, offset = read_varint(script, offset)
+    if offset > len(script):
+        raise TxDecodeError("invalid token prefix")
+    return script[:offset], script[offset:]
+
+
+def parse_token_prefix(token_prefix):
+    """
+        Returns the token data of an output in the same format as BCHN's `tokenData`:
+        {category, amount, nft?: {capability, commitment}}, None if there is no prefix
+    """
+    if not len(token_prefix):
+        return None
+
+    offset = 1
+    category, offset = read_bytes(token_prefix, offset, 32)
+    bitfield = token_prefix[offset]
+    offset += 1
+
+    commitment = b""
+    if bitfield & HAS_COMMITMENT_LENGTH:
+        length, offset = read_varint(token_prefix, offset)
+        commitment, offset = read_bytes(token_prefix, offset, length)
+
+    amount = 0
+    if bitfield & HAS_AMOUNT:
+        amount, offset = read_varint(token_prefix, offset)
+
+    token_data = {
+        "category": to_hex(category, reverse=True),
+        "amount": str(amount),
+    }
+    if bitfield & HAS_NFT:
+        token_data["nft"] = {
+            "capability": NFT_CAPABILITIES.get(bitfield & 0x0f, "none"),
+            "commitment": to_hex(commitment),
+        }
+    return token_data
+
+
+def decode_transaction(raw):
+    """
+        raw: (bytes) serialized transaction
+        Returns {txid, size, version, locktime,
+            inputs: [{txid, vout, script_sig, sequence, coinbase}],
+            outputs: [{index, value, locking_bytecode, token_prefix}]}
+        Scripts are memoryviews over `raw`.
+    """
+    if not isinstance(raw, bytes):
+        raw = bytes(raw)
+    data = memoryview(raw)
+
+    try:
+        offset = 4
+        version = int.from_bytes(data[:4], "little")
+
+        inputs = []
+        count, offset = read_varint(data, offset)
+        for _ in range(count):
+            prev_hash, offset = read_bytes(data, offset, 32)
+            vout, offset = read_bytes(data, offset, 4)
+            script_length, offset = read_varint(data, offset)
+            script_sig, offset = read_bytes(data, offset, script_length)
+            sequence, offset = read_bytes(data, offset, 4)
+            inputs.append(dict(
+                txid=to_hex(prev_hash, reverse=True),
+                vout=int.from_bytes(vout, "little"),
+                script_sig=script_sig,
+                sequence=int.from_bytes(sequence, "little"),
+                coinbase=prev_hash == NULL_HASH,
+            ))
+
+        outputs = []
+        count, offset = read_varint(data, offset)
+        for index in range(count):
+            value, offset = read_bytes(data, offset, 8)
+            script_length, offset = read_varint(data, offset)
+            script, offset = read_bytes(data, offset, script_length)
+            token_prefix, locking_bytecode = split_token_prefix(script)
+            outputs.append(dict(
+                index=index,
+                value=int.from_bytes(value, "little"),
+                locking_bytecode=locking_bytecode,
+                token_prefix=token_prefix,
+            ))
+
+        locktime, offset = read_bytes(data, offset, 4)
+    except IndexError:
+        raise TxDecodeError("unexpected end of transaction")
+
+    return dict(
+        txid=to_hex(hash256(data[:offset]), reverse=True),
+        size=offset,
+        version=version,
+        locktime=int.from_bytes(locktime, "little"),
+        inputs=inputs,
+        outputs=outputs,
+    )
+
+
+def calc_txid(tx_hex):
+    return to_hex(hash256(bytes.fromhex(tx_hex)), reverse=True)
+
+
+def get_input_outpoints(tx_hex):
+    """ Returns [(txid, vout), ...] of the inputs of a raw transaction """
+    tx = decode_transaction(bytes.fromhex(tx_hex))
+    return [
+        (tx_input["txid"], tx_input["vout"])
+        for tx_input in tx["inputs"] if not tx_input["coinbase"]
+    ]
+
+
+def get_pushes(script):
+    """
+        Returns the data pushes of a push-only script (e.g. an unlocking script),
+        None if the script contains any other opcode.
+    """
+    pushes = []
+    offset = 0
+    try:
+        while offset < len(script):
+            opcode = script[offset]
+            offset += 1
+            if opcode == OP_0:
+                pushes.append(b"")
+                continue
+            if opcode < OP_PUSHDATA1:
+                size = opcode
+            elif opcode == OP_PUSHDATA1:
+                size = script[offset]
+                offset += 1
+            elif opcode == OP_PUSHDATA2:
+                size = int.from_bytes(script[offset:offset + 2], "little")
+                offset += 2
+            elif opcode == OP_PUSHDATA4:
+                size = int.from_bytes(script[offset:offset + 4], "little")
+                offset += 4
+            elif opcode <= OP_16:
+                # OP_1NEGATE, OP_RESERVED, OP_1 .. OP_16
+                pushes.append(bytes([opcode]))
+                continue
+            else:
+                return None
+
+            data, offset = read_bytes(script, offset, size)
+            pushes.append(data)
+    except (IndexError, TxDecodeError):
+        return None
+    return pushes
+
+
+def p2pkh_locking_bytecode(pubkey_hash):
+    return bytes([OP_DUP, OP_HASH160, 20]) + pubkey_hash + bytes([OP_EQUALVERIFY, OP_CHECKSIG])
+
+
+def p2sh_locking_bytecode(script_hash):
+    if len(script_hash) == 32:
+        return bytes([OP_HASH256, 32]) + script_hash + bytes([OP_EQUAL])
+    return bytes([OP_HASH160, 20]) + script_hash + bytes([OP_EQUAL])
+
+
+def input_locking_bytecodes(script_sig):
+    """
+        Candidate locking bytecodes of the output spent by an input, derived
+        from its unlocking script:
+            - P2PKH: <signature> <pubkey>
+            - P2SH/P2SH32: ... <redeem script>
+    """
+    pushes = get_pushes(script_sig)
+    if not pushes:
+        return []
+
+    last_push = pushes[-1]
+    candidates = []
+    if len(pushes) == 2 and len(last_push) in (33, 65):
+        candidates.append(p2pkh_locking_bytecode(hash160(last_push)))
+    if last_push:
+        candidates.append(p2sh_locking_bytecode(hash160(last_push)))
+        candidates.append(p2sh_locking_bytecode(hash256(last_push)))
+    return candidates
+
+
+def locking_bytecode_to_address(locking_bytecode, testnet=None):
+    """
+        Returns the cash address of a P2PKH/P2SH/P2SH32 locking bytecode, None for other scripts
+    """
+    if testnet is None:
+        testnet = settings.BCH_NETWORK != "mainnet"
+    return cashaddr.from_locking_bytecode(bytes(locking_bytecode), testnet=testnet)
+
+
+def parse_output(tx_output, testnet=None):
+    """
+        Formats an output of `decode_transaction()` the same way as `BCHN._parse_output()`
+    """
+    details = {
+        "index": tx_output["index"],
+        "token_data": parse_token_prefix(tx_output["token_prefix"]),
+        "value": tx_output["value"],
+    }
+
+    locking_bytecode = tx_output["locking_bytecode"]
+    address = locking_bytecode_to_address(locking_bytecode, testnet=testnet)
+    if address:
+        details["address"] = address
+    elif len(locking_bytecode) and locking_bytecode[0] == OP_RETURN:
+        details["op_return"] = to_hex(locking_bytecode[1:])
+    else:
+        details["script"] = to_hex(locking_bytecode)
+
+    return details
+
+
+def decode_raw_transaction(tx_hex, testnet=None):
+    """
+        Local replacement of `BCHN._decode_raw_transaction()` for callers that only need
+        txid, outpoints and outputs.
+        Returns {txid, size, inputs: [{txid, vout}], outputs: [`BCHN._parse_output()` format]}
+    """
+    tx = decode_transaction(bytes.fromhex(tx_hex))
+    return dict(
+        txid=tx["txid"],
+        size=tx["size"],
+        inputs=[
+            dict(txid=tx_input["txid"], vout=tx_input["vout"])
+            for tx_input in tx["inputs"] if not tx_input["coinbase"]
+        ],
+        outputs=[parse_output(tx_output, testnet=testnet) for tx_output in tx["outputs"]],
+    )
@@ -1,7 +1,74 @@
 from main.models import Transaction
+from django.db import connection
 from django.db.models import Sum, Q
 from django.conf import settings
 
+# Totals of a tx for a wallet (or address) in one round trip, one row per
+#   'bch': bch outputs and inputs (excluding the cashtoken dust outputs)
+#   'ct': fungible cashtokens of a category
+#   'ct_nft': cashtoken NFTs of a (category, capability, commitment)
+# with the change address of each kind: the latest output of the kind to a wallet with inputs of the kind
+HISTORY_TOTALS_SQL = """
+    WITH rows AS (
+        SELECT
+            txn.id,
+            txn.txid = %(txid)s AS is_output,
+            txn.value,
+            txn.amount,
+            txn.date_created,
+            txn.cashtoken_ft_id,
+            nft.category AS nft_category,
+            COALESCE(nft.capability, '') AS nft_capability,
+            COALESCE(nft.commitment, '') AS nft_commitment,
+            address.address,
+            address.wallet_id AS address_wallet_id,
+            token.tokenid IS DISTINCT FROM %(ct_token_id)s AS is_bch
+        FROM main_transaction AS txn
+        LEFT JOIN main_token AS token ON token.id = txn.token_id
+        LEFT JOIN main_cashnonfungibletoken AS nft ON nft.id = txn.cashtoken_nft_id
+        LEFT JOIN main_address AS address ON address.id = txn.address_id
+        WHERE (txn.txid = %(txid)s OR txn.spending_txid = %(txid)s)
+            AND {owner_filter}
+    ), kinds AS (
+        SELECT rows.*, kind.kind
+        FROM rows
+        CROSS JOIN LATERAL (
+            VALUES
+                ('bch', rows.is_bch),
+                ('ct', rows.cashtoken_ft_id IS NOT NULL),
+                ('ct_nft', rows.nft_category IS NOT NULL)
+        ) AS kind (kind, included)
+        WHERE kind.included
+    ), change_addresses AS (
+        SELECT DISTINCT ON (output.kind) output.kind, output.address
+        FROM kinds AS output
+        WHERE %(with_change_address)s
+            AND output.is_output
+            AND EXISTS (
+                SELECT 1 FROM kinds AS input
+                WHERE input.kind = output.kind
+                    AND NOT input.is_output
+                    AND input.address_wallet_id = output.address_wallet_id
+            )
+        ORDER BY output.kind, output.date_created DESC, output.id DESC
+    ), totals AS (
+        SELECT
+            kind,
+            CASE kind WHEN 'ct' THEN cashtoken_ft_id WHEN 'ct_nft' THEN nft_category END AS category,
+            CASE kind WHEN 'ct_nft' THEN nft_capability END AS capability,
+            CASE kind WHEN 'ct_nft' THEN nft_commitment END AS commitment,
+            count(*) FILTER (WHERE NOT is_output) AS input_count,
+            count(*) FILTER (WHERE is_output) AS output_count,
+            COALESCE(sum(CASE kind WHEN 'bch' THEN value ELSE amount END) FILTER (WHERE NOT is_output), 0)::bigint AS input_total,
+            COALESCE(sum(CASE kind WHEN 'bch' THEN value ELSE amount END) FILTER (WHERE is_output), 0)::bigint AS output_total
+        FROM kinds
+        GROUP BY 1, 2, 3, 4
+    )
+    SELECT totals.*, change_addresses.address
+    FROM totals
+    LEFT JOIN change_addresses ON change_addresses.kind = totals.kind
+"""
+
 
 class HistoryParser(object):
 
@@ -232,7 +299,84 @@ class HistoryParser(object):
         return results
 
 
+    def get_totals(self):
+        """
+        Rows of HISTORY_TOTALS_SQL as dicts
+        """
+        if self.address:
+            owner_filter = "address.address = %(address)s"
+        else:
+            owner_filter = "txn.wallet_id IN (SELECT id FROM main_wallet WHERE wallet_hash = %(wallet_hash)s)"
+
+        params = dict(
+            txid=self.txid,
+            wallet_hash=self.wallet_hash,
+            address=self.address,
+            ct_token_id=settings.WT_DEFAULT_CASHTOKEN_ID,
+            with_change_address=bool(self.wallet_hash),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(HISTORY_TOTALS_SQL.format(owner_filter=owner_filter), params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+    def get_bch_total(self, total, count):
+        # round down to zero if value sum is equal to or lesser than dust
+        if not count or total <= 546:
+            return 0
+        return total / (10 ** 8)
+
+
     def parse(self):
+        """
+        Same result as parse_with_orm(), from the totals of a single query
+        """
+        results = {
+            'bch_or_slp': {
+                'record_type': '',
+                'change_address': None,
+                'diff': 0,
+            },
+        }
+
+        for row in self.get_totals():
+            kind = row['kind']
+            if kind == 'bch':
+                total_outputs = self.get_bch_total(row['output_total'], row['output_count'])
+                total_inputs = self.get_bch_total(row['input_total'], row['input_count'])
+                diff = self.get_txn_diff(total_outputs, total_inputs)
+                results['bch_or_slp'] = {
+                    'record_type': self.get_record_type(diff),
+                    'change_address': row['address'],
+                    'diff': diff,
+                }
+            elif kind == 'ct':
+                diff = self.get_txn_diff(row['output_total'], row['input_total'])
+                results[f"ct/{row['category']}"] = dict(
+                    record_type=self.get_record_type(diff),
+                    change_address=row['address'],
+                    diff=diff,
+                )
+            elif kind == 'ct_nft':
+                category, capability, commitment = row['category'], row['capability'], row['commitment']
+                diff = row['output_count'] - row['input_count']
+                results[f"ct_nft/{category}/{capability}/{commitment}"] = dict(
+                    record_type=self.get_record_type(diff),
+                    change_address=row['address'],
+                    diff=float(diff),
+                    category=category,
+                    capability=capability if capability else None,
+                    commitment=commitment if commitment else None,
+                )
+
+        return results
+
+
+    def parse_with_orm(self):
+        """
+        Reference implementation of parse(), with a query per kind of input and output
+        """
         outputs, ct_outputs, ct_nft_outputs = self.get_relevant_outputs()
         inputs, ct_inputs, ct_nft_inputs = self.get_relevant_inputs()
 
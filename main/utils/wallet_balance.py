@@ -0,0 +1,107 @@
+"""
+Reads and reconciliation of the WalletBalance ledger.
+
+Balances are kept up to date by triggers on the transaction table (migration 0136),
+so a wallet's balance is a single row lookup whatever its number of UTXOs.
+"""
+import logging
+
+from django.db import connection, transaction
+
+from main.models import WalletBalance
+
+LOGGER = logging.getLogger(__name__)
+
+# Same asset and counted rows as the triggers in migration 0136
+ASSET_SQL = """
+    CASE
+        WHEN txn.cashtoken_ft_id IS NOT NULL THEN 'ct/' || txn.cashtoken_ft_id
+        WHEN lower(token.name) = 'bch' THEN 'bch'
+        ELSE 'slp/' || token.tokenid
+    END
+"""
+
+COMPUTE_BALANCES_SQL = f"""
+    SELECT
+        txn.wallet_id,
+        {ASSET_SQL} AS asset,
+        SUM(txn.value),
+        SUM(COALESCE(txn.amount, 0)),
+        COUNT(*)
+    FROM main_transaction AS txn
+    JOIN main_token AS token ON token.id = txn.token_id
+    WHERE txn.wallet_id = ANY(%s) AND NOT txn.spent AND (
+        txn.cashtoken_ft_id IS NOT NULL OR
+        lower(token.name) = 'bch' OR
+        (txn.cashtoken_nft_id IS NULL AND token.tokenid <> '')
+    )
+    GROUP BY txn.wallet_id, asset
+"""
+
+
+def get_wallet_balance(wallet, asset=WalletBalance.ASSET_BCH):
+    """
+    Returns (value, amount, utxo_count) of `asset` in `wallet`, zeros if it has none
+    """
+    balance = WalletBalance.objects.filter(wallet=wallet, asset=asset).values_list(
+        'value', 'amount', 'utxo_count',
+    ).first()
+    if not balance:
+        return 0, 0, 0
+
+    value, amount, utxo_count = balance
+    return value, int(amount), utxo_count
+
+
+def reconcile_wallet_balances(wallet_ids, fix=True):
+    """
+    Compares the ledger of `wallet_ids` with balances computed from Transaction,
+    and replaces it when they differ if `fix`.
+
+    Returns the ids of the wallets whose ledger differed
+    """
+    wallet_ids = list(wallet_ids)
+    if not wallet_ids:
+        return []
+
+    with transaction.atomic():
+        if fix:
+            # waits for in-flight writes to the ledger and holds back new ones until commit,
+            # they are applied on top of the rebuilt rows
+            with connection.cursor() as cursor:
+                cursor.execute("LOCK TABLE main_walletbalance IN SHARE ROW EXCLUSIVE MODE")
+
+        with connection.cursor() as cursor:
+            cursor.execute(COMPUTE_BALANCES_SQL, [wallet_ids])
+            computed = {
+                (wallet_id, asset): (value, int(amount), utxo_count)
+                for wallet_id, asset, value, amount, utxo_count in cursor.fetchall()
+            }
+
+        ledger = {
+            (wallet_id, asset): (value, int(amount), utxo_count)
+            for wallet_id, asset, value, amount, utxo_count in WalletBalance.objects.filter(
+                wallet_id__in=wallet_ids,
+            ).values_list('wallet_id', 'asset', 'value', 'amount', 'utxo_count')
+            # spent out assets leave zeroed rows
+            if value or amount or utxo_count
+        }
+
+        mismatched = {
+            wallet_id for wallet_id, asset in computed.keys() | ledger.keys()
+            if computed.get((wallet_id, asset)) != ledger.get((wallet_id, asset))
+        }
+
+        if fix and mismatched:
+            WalletBalance.objects.filter(wallet_id__in=mismatched).delete()
+            WalletBalance.objects.bulk_create([
+                WalletBalance(wallet_id=wallet_id, asset=asset, value=value, amount=amount, utxo_count=utxo_count)
+                for (wallet_id, asset), (value, amount, utxo_count) in computed.items()
+                if wallet_id in mismatched
+            ])
+
+    mismatched = sorted(mismatched)
+
+    if mismatched:
+        LOGGER.info(f"Wallet balance ledger differed for {len(mismatched)} wallet(s)")
+    return mismatched
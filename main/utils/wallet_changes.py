@@ -0,0 +1,120 @@
+"""
+Reads and pruning of the per wallet change feed.
+
+Triggers on the transaction and wallet history tables (migration 0135) bump a wallet's
+WalletChangeSequence once per statement that writes its rows, and log the written rows
+under the new sequence in WalletChange. A client that synced up to a sequence reads the
+rows changed after it instead of downloading every history and UTXO page again.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from main.models import WalletChange, WalletChangeSequence
+
+LOGGER = logging.getLogger(__name__)
+
+PRUNE_BATCH_SIZE = 10000
+
+# Deletes a batch of expired changes, and moves the pruned sequence of their wallets past them
+PRUNE_CHANGES_SQL = """
+    WITH pruned AS (
+        DELETE FROM main_walletchange
+        WHERE id IN (
+            SELECT id FROM main_walletchange WHERE date_created < %s ORDER BY id LIMIT %s
+        )
+        RETURNING wallet_id, sequence
+    ), pruned_wallets AS (
+        SELECT wallet_id, max(sequence) AS sequence FROM pruned GROUP BY wallet_id
+    ), updated AS (
+        UPDATE main_walletchangesequence AS seq
+        SET pruned_sequence = GREATEST(seq.pruned_sequence, pruned_wallets.sequence)
+        FROM pruned_wallets
+        WHERE seq.wallet_id = pruned_wallets.wallet_id
+    )
+    SELECT count(*) FROM pruned
+"""
+
+
+def get_wallet_sequence(wallet):
+    """
+    Returns (sequence, pruned_sequence) of `wallet`, zeros before its first change
+    """
+    sequences = WalletChangeSequence.objects.filter(wallet=wallet).values_list(
+        'sequence', 'pruned_sequence',
+    ).first()
+    return sequences or (0, 0)
+
+
+def get_wallet_changes(wallet, since, limit):
+    """
+    Changes of `wallet` after sequence `since`, up to `limit` logged rows. The changes of
+    a sequence are never split, so a page can exceed `limit` by the rows of its last sequence.
+
+    Returns (changes, sequence, has_more, reset)
+        changes: { (kind, object_id): (key, deleted) } latest change of each changed row
+        sequence: sequence to resume from
+        reset: `since` is no longer (or not yet) in the feed, the client has to resync
+    """
+    sequence, pruned_sequence = get_wallet_sequence(wallet)
+    if since is None or since < pruned_sequence or since > sequence:
+        return {}, sequence, False, True
+
+    rows = list(
+        WalletChange.objects.filter(
+            wallet=wallet,
+            sequence__gt=since,
+            sequence__lte=sequence,
+        ).order_by('sequence', 'id').values_list(
+            'sequence', 'kind', 'object_id', 'key', 'deleted',
+        )[:limit + 1]
+    )
+
+    has_more = len(rows) > limit
+    if has_more:
+        # end at the last sequence that is complete in the page, or read the first one whole
+        last_sequence = rows[limit][0]
+        if rows[0][0] == last_sequence:
+            rows = list(
+                WalletChange.objects.filter(
+                    wallet=wallet,
+                    sequence=last_sequence,
+                ).order_by('id').values_list(
+                    'sequence', 'kind', 'object_id', 'key', 'deleted',
+                )
+            )
+        else:
+            rows = [row for row in rows if row[0] < last_sequence]
+        has_more = rows[-1][0] < sequence
+        sequence = rows[-1][0]
+
+    changes = {}
+    for _, kind, object_id, key, deleted in rows:
+        changes[(kind, object_id)] = (key, deleted)
+    return changes, sequence, has_more, False
+
+
+def prune_wallet_changes(retention_days=None):
+    """
+    Deletes the changes older than `retention_days` (WALLET_CHANGE_RETENTION_DAYS),
+    returns the number of deleted changes
+    """
+    if retention_days is None:
+        retention_days = settings.WALLET_CHANGE_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=retention_days)
+
+    total = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(PRUNE_CHANGES_SQL, [cutoff, PRUNE_BATCH_SIZE])
+            deleted = cursor.fetchone()[0]
+        total += deleted
+        if deleted < PRUNE_BATCH_SIZE:
+            break
+
+    if total:
+        LOGGER.info(f"Pruned {total} wallet change(s) older than {retention_days} day(s)")
+    return total
@@ -24,6 +24,7 @@ from main.views.view_status import *
 from main.views.view_wallet_shard import *
 from main.views.view_live_updates import *
 from main.views.view_wallet_addresses import *
+from main.views.view_wallet_changes import *
 from main.views.view_app_version import *
 from main.views.view_wallet_address_app import *
 from main.views.view_app_control import *
@@ -9,13 +9,15 @@ from rest_framework.response import Response
 
 from drf_yasg.utils import swagger_auto_schema
 
-from main.utils.queries.node import Node
+from main.utils.address_discovery import (
+    AddressDiscovery,
+    AddressDiscoveryError,
+    InvalidXpubKeyError,
+)
 from main import serializers
 
 LOGGER = logging.getLogger(__name__)
 
-NODE = Node()
-
 
 class WalletAddressDiscoverViewSet(viewsets.GenericViewSet):
     serializer_class = serializers.WalletAddressDiscoverSerializer
@@ -29,9 +31,20 @@ class WalletAddressDiscoverViewSet(viewsets.GenericViewSet):
         Checks a batch of address sets for transaction history against the BCH node.
 
         For each address set (receiving + change), efficiently queries the Electrum/Fulcrum
-        server to determine if the address has any transaction history. Uses blockchain.address.get_first_use
-        for O(1) checks instead of loading full transaction history — efficient even for
-        addresses with thousands of transactions (e.g., exchange hot wallets).
+        server to determine if the address has any transaction history. Address sets are
+        checked in batches of `gap_limit` indexes, each batch in a single pipelined round trip.
+        Uses blockchain.address.get_first_use for O(1) checks instead of loading full
+        transaction history — efficient even for addresses with thousands of transactions
+        (e.g., exchange hot wallets).
+
+        Scanning stops once `gap_limit` consecutive indexes have no history. Without
+        `gap_limit`, all provided address sets are checked. At most
+        ADDRESS_DISCOVER_MAX_INDEXES indexes are checked per request, `truncated` is set
+        when the scan stopped there, the client continues from the next index.
+
+        Instead of address sets, an account level `xpubkey` (m/44'/145'/0') can be given,
+        receiving (0/index) and change (1/index) addresses are then derived server-side
+        starting at `start_index`, with a default gap limit of ADDRESS_DISCOVER_GAP_LIMIT.
 
         An address with zero balance but transaction history is still flagged as having
         history — important for recovering wallets used by other software (e.g., Electron
@@ -44,57 +57,29 @@ class WalletAddressDiscoverViewSet(viewsets.GenericViewSet):
         Request body:
             wallet_hash: str
             project_id: str (optional)
-            address_sets: list of { address_index: int, receiving: str, change: str }
+            address_sets: list of { address_index: int, receiving: str, change: str } (optional if xpubkey)
+            xpubkey: str (optional)
+            gap_limit: int (optional)
+            start_index: int (optional, xpubkey only)
         """
         serializer = self.get_serializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        address_sets = serializer.validated_data["address_sets"]
-        wallet_hash = serializer.validated_data.get("wallet_hash", "")
-
-        results = []
-        for address_set in address_sets:
-            address_index = address_set["address_index"]
-            receiving_address = address_set.get("receiving")
-            change_address = address_set.get("change")
-
-            receiving_has_history = False
-            change_has_history = False
-
-            result = {
-                "address_index": address_index
-            }
-
-            if receiving_address:
-                try:
-                    receiving_has_history = NODE.BCH.check_address_history(
-                        receiving_address
-                    )
-                    result["receiving"] = {
-                        "address": receiving_address,
-                        "has_history": receiving_has_history
-                    }
-
-                except Exception:
-                    LOGGER.warning(
-                        "Failed to check transaction history for receiving address: %s",
-                        receiving_address,
-                    )
-
-            if change_address:
-                try:
-                    change_has_history = NODE.BCH.check_address_history(change_address)
-                    result["change"] = {
-                        "address": change_address,
-                        "has_history": change_has_history
-                    }
-                except Exception:
-                    LOGGER.warning(
-                        "Failed to check transaction history for change address: %s",
-                        change_address,
-                    )
-
-            results.append(result)
-
-        return Response({"results": results}, status=status.HTTP_200_OK)
+        data = serializer.validated_data
+        try:
+            discovery = AddressDiscovery(
+                address_sets=data.get("address_sets"),
+                xpubkey=data.get("xpubkey"),
+                gap_limit=data.get("gap_limit"),
+                start_index=data["start_index"],
+            )
+        except InvalidXpubKeyError:
+            LOGGER.warning("Invalid xpubkey for address discovery of wallet: %s", data.get("wallet_hash"))
+            return Response({"xpubkey": ["Invalid xpubkey."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            results = discovery.run()
+        except AddressDiscoveryError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(results, status=status.HTTP_200_OK)
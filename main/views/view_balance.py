@@ -1,6 +1,6 @@
 from django.conf import settings
 from drf_yasg.utils import swagger_auto_schema
-from main.models import Transaction, Wallet, Token, CashFungibleToken, CashNonFungibleToken
+from main.models import Transaction, Wallet, WalletBalance, Token, CashFungibleToken, CashNonFungibleToken
 from django.db.models import Q, Sum, F, Count
 from django.utils import timezone
 from django.db.models.functions import Coalesce
@@ -11,6 +11,9 @@ from rest_framework.views import APIView
 from main.utils.address_validator import *
 from main.utils.address_converter import *
 from main.utils.bch_yield import compute_wallet_yield
+from main.utils import cache_codec
+from main.utils.cache import wallet_token_balance_cache_key
+from main.utils.wallet_balance import get_wallet_balance
 from main import serializers
 from main.tasks import rescan_utxos
 from main.utils.tx_fee import (
@@ -213,10 +216,10 @@ class Balance(APIView):
             # Add caching for address-based balance queries
             cache = settings.REDISKV
             cache_key = f'address:balance:bch:{bchaddress}:{include_token_sats}'
-            cached_data = cache.get(cache_key)
+            cached_data = cache_codec.get_cached(cache, cache_key)
             
             if cached_data:
-                data = json.loads(cached_data)
+                data = cached_data
             else:
                 query = Q(address__address=data['address']) & Q(spent=False)
                 qs_balance, qs_count = _get_bch_balance(query, include_token_sats=include_token_sats)
@@ -233,7 +236,7 @@ class Balance(APIView):
                 
                 # Cache: 5min (mainnet) / 1min (chipnet/testnet) for faster balance updates
                 cache_ttl = 60 if settings.BCH_NETWORK != 'mainnet' else 60 * 5
-                cache.set(cache_key, json.dumps(data), ex=cache_ttl)
+                cache.set(cache_key, cache_codec.encode(data, serializer=cache_codec.JSON), ex=cache_ttl)
 
         if wallet_hash:
             try:
@@ -245,12 +248,12 @@ class Balance(APIView):
             if wallet.wallet_type == 'slp':
                 if tokenid_or_category:
                     multiple = False
-                    query = Q(wallet=wallet) & Q(spent=False) & Q(token__tokenid=tokenid_or_category)
+                    _, amount, _ = get_wallet_balance(wallet, WalletBalance.slp_asset(tokenid_or_category))
+                    qs_balance = { 'amount__sum': amount }
                 else:
                     multiple = True
                     query =  Q(wallet=wallet) & Q(spent=False)
-
-                qs_balance = _get_slp_balance(query, multiple_tokens=multiple)
+                    qs_balance = _get_slp_balance(query, multiple_tokens=multiple)
 
                 if multiple:
                     pass
@@ -303,22 +306,24 @@ class Balance(APIView):
                     else:
                         query = query & Q(cashtoken_ft__category=_category)
 
-                    ct_cache_key = f'wallet:balance:token:{wallet_hash}:{_category}'
+                    ct_cache_key = wallet_token_balance_cache_key(wallet_hash, _category)
                     cached_data = cache.get(ct_cache_key)
                     if not cached_data:
-                        qs_balance = _get_ct_balance(query, multiple_tokens=False)
+                        if is_cashtoken_nft:
+                            qs_balance = _get_ct_balance(query, multiple_tokens=False)
+                        else:
+                            _, amount, _ = get_wallet_balance(wallet, WalletBalance.cashtoken_asset(_category))
+                            qs_balance = { 'amount__sum': amount }
                 else:
                     is_bch = True
-                    query = Q(wallet=wallet) & Q(spent=False)
                 
                 if is_bch:
                     bch_cache_key = f'wallet:balance:bch:{wallet_hash}'
-                    cached_data = cache.get(bch_cache_key)
+                    cached_data = cache_codec.get_cached(cache, bch_cache_key)
                     if cached_data:
-                        data = json.loads(cached_data)
+                        data = cached_data
                     else:
-                        qs_balance, qs_count = _get_bch_balance(query, exclude_dust=False)
-                        bch_balance = qs_balance['balance'] or 0
+                        bch_balance, _, qs_count = get_wallet_balance(wallet)
                         bch_balance = bch_balance / (10 ** 8)
 
                         data['spendable'] = int(bch_to_satoshi(bch_balance)) - get_tx_fee_sats(p2pkh_input_count=qs_count)
@@ -331,12 +336,12 @@ class Balance(APIView):
                         data['valid'] = True
 
                         cache_ttl = 60 if settings.BCH_NETWORK != 'mainnet' else 60 * 5
-                        cache.set(bch_cache_key, json.dumps(data), ex=cache_ttl)
+                        cache.set(bch_cache_key, cache_codec.encode(data, serializer=cache_codec.JSON), ex=cache_ttl)
                 else:
-                    ct_cache_key = f'wallet:balance:token:{wallet_hash}:{_category}'
-                    cached_data = cache.get(ct_cache_key)
+                    ct_cache_key = wallet_token_balance_cache_key(wallet_hash, _category)
+                    cached_data = cache_codec.get_cached(cache, ct_cache_key)
                     if cached_data:
-                        data = json.loads(cached_data) 
+                        data = cached_data
                     else:
                         cache_ttl = 60 if settings.BCH_NETWORK != 'mainnet' else 60 * 5
                         try:
@@ -366,14 +371,14 @@ class Balance(APIView):
                                 data['commitment'] = token.commitment
                                 data['capability'] = token.capability
 
-                            cache.set(ct_cache_key, json.dumps(data), ex=cache_ttl)
+                            cache.set(ct_cache_key, cache_codec.encode(data, serializer=cache_codec.JSON), ex=cache_ttl)
                         except ObjectDoesNotExist:
                             # Token not found, return zero balance
                             data['balance'] = 0
                             data['spendable'] = 0
                             data['token_id'] = _category
                             data['valid'] = True
-                            cache.set(ct_cache_key, json.dumps(data), ex=cache_ttl)
+                            cache.set(ct_cache_key, cache_codec.encode(data, serializer=cache_codec.JSON), ex=cache_ttl)
 
             # Update last_balance_check timestamp
             wallet.last_balance_check = timezone.now()
@@ -410,8 +415,8 @@ class SpendableBalance(APIView):
             if wallet.wallet_type != 'bch':
                 return Response({ 'detail': 'Invalid wallet type' }, status=400)
 
-            query = Q(wallet=wallet) & Q(spent=False)
-            qs_balance, qs_count = _get_bch_balance(query, exclude_dust=False)
+            value, _, qs_count = get_wallet_balance(wallet)
+            qs_balance = { 'balance': value }
 
         qs_balance = qs_balance['balance'] or 0
         bch_balance = qs_balance / (10 ** 8)
@@ -7,6 +7,7 @@ from rest_framework import generics
 from main import serializers
 from main.models import BlockHeight
 from main.tasks import get_latest_block
+from main.utils.block_catchup import get_catchup_status
 
 
 
@@ -27,3 +28,11 @@ class BlockHeightViewSet(generics.GenericAPIView):
         if serializer.is_valid():
             return Response(serializer.data, status=status.HTTP_200_OK)            
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class BlockHeightStatusView(generics.GenericAPIView):
+    permission_classes = [AllowAny,]
+
+    def get(self, request, format=None):
+        # Block scanning progress: tip, last processed block, pending blocks & lag
+        return Response(get_catchup_status(), status=status.HTTP_200_OK)
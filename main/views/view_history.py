@@ -13,9 +13,6 @@ from django.db.models import (
     CharField,
     IntegerField,
 )
-import pickle
-import base64
-import json
 from django.conf import settings
 from django.db.models.functions import Substr, Cast, Floor
 from django.db.models import ExpressionWrapper, FloatField, Subquery, OuterRef
@@ -31,6 +28,15 @@ from django.core.paginator import Paginator
 from main.serializers import PaginatedWalletHistorySerializer
 from main.throttles import RebuildHistoryThrottle
 from main.tasks import rebuild_wallet_history
+from main.utils import cache_codec
+from main.utils.cache import last_address_index_cache_key, wallet_history_cache_key
+from main.utils.history_pagination import (
+    InvalidCursor,
+    decode_cursor,
+    keyset_page,
+    order_history,
+    parse_page_size,
+)
 
 POS_ID_MAX_DIGITS = 4
 
@@ -101,26 +107,14 @@ def expand_token_from_dict(
 
 
 def store_object(key, obj, cache):
-    """Serialize an object using pickle and store it in Redis as a string."""
-    # Serialize the object to binary
-    pickled_data = pickle.dumps(obj)
-    # Convert binary to Base64 string
-    encoded_data = base64.b64encode(pickled_data).decode("utf-8")
-    # Store in Redis
+    """Serialize an object using pickle and store it in Redis, see main.utils.cache_codec."""
     cache_ttl = 60 if settings.BCH_NETWORK != 'mainnet' else 60 * 5
-    cache.set(key, encoded_data, ex=cache_ttl)
+    cache.set(key, cache_codec.encode(obj), ex=cache_ttl)
 
 
 def retrieve_object(key, cache):
-    """Retrieve an object from Redis and deserialize it using pickle."""
-    # Get the Base64 string from Redis
-    encoded_data = cache.get(key)
-    if encoded_data is None:
-        return None
-    # Convert Base64 string back to binary
-    pickled_data = base64.b64decode(encoded_data)
-    # Deserialize the binary back to an object
-    return pickle.loads(pickled_data)
+    """Retrieve an object from Redis and deserialize it."""
+    return cache_codec.get_cached(cache, key)
 
 
 class ContractHistoryView(APIView):
@@ -171,10 +165,7 @@ class ContractHistoryView(APIView):
         if len(txids):
             qs = qs.filter(txid__in=txids)
 
-        qs = qs.order_by(
-            F("tx_timestamp").desc(nulls_last=True),
-            F("date_created").desc(nulls_last=True),
-        )
+        qs = order_history(qs)
         history = qs.values(
             "record_type",
             "txid",
@@ -216,6 +207,21 @@ class WalletHistoryView(APIView):
                 in_=openapi.IN_QUERY,
                 default=10,
             ),
+            openapi.Parameter(
+                name="cursor",
+                type=openapi.TYPE_STRING,
+                in_=openapi.IN_QUERY,
+                required=False,
+                description="Keyset pagination: `next` of the previous page, empty for the first page. Replaces page",
+            ),
+            openapi.Parameter(
+                name="count",
+                type=openapi.TYPE_BOOLEAN,
+                in_=openapi.IN_QUERY,
+                default=True,
+                required=False,
+                description="With cursor, if false the total count of records is not returned",
+            ),
             openapi.Parameter(
                 name="posid",
                 type=openapi.TYPE_NUMBER,
@@ -326,6 +332,10 @@ class WalletHistoryView(APIView):
         txid = kwargs.get("txid", None)
         page = request.query_params.get("page", 1)
         page_size = request.query_params.get("page_size", 10)
+        cursor = request.query_params.get("cursor", None)
+        with_count = (
+            str(request.query_params.get("count", "true")).strip().lower() == "true"
+        )
         record_type = request.query_params.get("type", "all")
         posid = request.query_params.get("posid", None)
         txids = request.query_params.get("txids", "")
@@ -371,6 +381,22 @@ class WalletHistoryView(APIView):
                 data={"error": "Wallet not found"}, status=status.HTTP_404_NOT_FOUND
             )
 
+        # Keyset pagination when a cursor is given, an empty cursor is the first page
+        keyset = cursor is not None and wallet.version > 1
+        cursor_key = None
+        if keyset:
+            if cursor:
+                try:
+                    cursor_key = decode_cursor(cursor)
+                except InvalidCursor as exc:
+                    return Response(
+                        data={"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST
+                    )
+            page_size = parse_page_size(page_size)
+            page_component = f"cursor:{cursor}:{page_size}:{int(with_count)}"
+        else:
+            page_component = f"{page}:{page_size}"
+
         # Route to combined history if all=true and no specific token is requested
         if return_all and not token_id_or_category and not category:
             return self._get_combined_history(
@@ -391,10 +417,16 @@ class WalletHistoryView(APIView):
                 asset_filter,
                 token_ids_raw,
                 categorize,
+                keyset=keyset,
+                cursor_key=cursor_key,
+                with_count=with_count,
+                page_component=page_component,
             )
 
         cache_key = None
         history = []
+        next_cursor = None
+        count = None
         data = None
         use_cache = (
             record_type == "all"
@@ -418,7 +450,7 @@ class WalletHistoryView(APIView):
                     or category
                     or (token_type if token_type else "bch")
                 )
-                cache_key = f"wallet:history:{wallet_hash}:{token_key}:{str(page)}:{str(page_size)}"
+                cache_key = wallet_history_cache_key(wallet_hash, token_key, page_component)
                 data = retrieve_object(cache_key, cache)
 
         if not data:
@@ -479,10 +511,7 @@ class WalletHistoryView(APIView):
                         status=status.HTTP_400_BAD_REQUEST,
                     )
 
-            qs = qs.order_by(
-                F("tx_timestamp").desc(nulls_last=True),
-                F("date_created").desc(nulls_last=True),
-            )
+            qs = order_history(qs)
 
             if include_attrs:
                 qs = qs.annotate_attributes(
@@ -636,7 +665,12 @@ class WalletHistoryView(APIView):
                         )
 
                     # Post-process to expand token field
-                    history = list(history)
+                    if keyset:
+                        history, next_cursor, count = keyset_page(
+                            history, cursor_key, page_size, with_count
+                        )
+                    else:
+                        history = list(history)
                     for item in history:
                         is_nft_value = bool(item.get("is_nft", False))
                         expand_token_from_dict(
@@ -742,7 +776,12 @@ class WalletHistoryView(APIView):
                     )
 
                     # Post-process to expand token field
-                    history = list(history)
+                    if keyset:
+                        history, next_cursor, count = keyset_page(
+                            history, cursor_key, page_size, with_count
+                        )
+                    else:
+                        history = list(history)
                     for item in history:
                         is_nft_value = bool(item.get("is_nft", False))
                         expand_token_from_dict(
@@ -828,7 +867,12 @@ class WalletHistoryView(APIView):
                     )
 
                     # Post-process to expand token field
-                    history = list(history)
+                    if keyset:
+                        history, next_cursor, count = keyset_page(
+                            history, cursor_key, page_size, with_count
+                        )
+                    else:
+                        history = list(history)
                     for item in history:
                         is_nft_value = bool(item.get("is_nft", False))
                         expand_token_from_dict(
@@ -926,7 +970,12 @@ class WalletHistoryView(APIView):
                     )
 
                     # Post-process to expand token field
-                    history = list(history)
+                    if keyset:
+                        history, next_cursor, count = keyset_page(
+                            history, cursor_key, page_size, with_count
+                        )
+                    else:
+                        history = list(history)
                     for item in history:
                         is_nft_value = bool(item.get("is_nft", False))
                         expand_token_from_dict(
@@ -987,6 +1036,18 @@ class WalletHistoryView(APIView):
 
             if wallet.version == 1:
                 return Response(data=history, status=status.HTTP_200_OK)
+            elif keyset:
+                data = {
+                    "history": history,
+                    "page_size": page_size,
+                    "next": next_cursor,
+                    "has_next": next_cursor is not None,
+                }
+                if count is not None:
+                    data["count"] = count
+
+                if use_cache:
+                    store_object(cache_key, data, cache)
             else:
                 pages = Paginator(history, page_size)
                 page_obj = pages.page(int(page))
@@ -1049,12 +1110,18 @@ class WalletHistoryView(APIView):
         asset_filter=None,
         token_ids_raw="",
         categorize=False,
+        keyset=False,
+        cursor_key=None,
+        with_count=True,
+        page_component=None,
     ):
         """
         Get combined history for BCH and all tokens.
         """
         # Check cache if applicable
         cache_key = None
+        next_cursor = None
+        count = None
         data = None
         use_cache = (
             record_type == "all"
@@ -1072,15 +1139,13 @@ class WalletHistoryView(APIView):
             if use_cache:
                 cache = settings.REDISKV
                 # Include the sorted exclude fields so different exclude variants
-                # do not collide. Invalidation still works because
-                # clear_wallet_history_cache clears by the
-                # `wallet:history:{wallet_hash}:*` prefix, which covers this key.
+                # do not collide, all variants are in the "all" asset namespace
+                page_component = page_component or f"{page}:{page_size}"
                 exclude_component = ""
                 if exclude_fields:
                     exclude_component = ":exclude:" + ",".join(sorted(exclude_fields))
-                cache_key = (
-                    f"wallet:history:{wallet_hash}:all:{str(page)}:{str(page_size)}"
-                    f"{exclude_component}"
+                cache_key = wallet_history_cache_key(
+                    wallet_hash, "all", f"{page_component}{exclude_component}"
                 )
                 data = retrieve_object(cache_key, cache)
 
@@ -1165,10 +1230,7 @@ class WalletHistoryView(APIView):
                     | token_filters
                 )
 
-        qs = qs.order_by(
-            F("tx_timestamp").desc(nulls_last=True),
-            F("date_created").desc(nulls_last=True),
-        )
+        qs = order_history(qs)
 
         if include_attrs:
             qs = qs.annotate_attributes(
@@ -1288,7 +1350,12 @@ class WalletHistoryView(APIView):
             )
 
         # Post-process to expand token field
-        history = list(history)
+        if keyset:
+            history, next_cursor, count = keyset_page(
+                history, cursor_key, page_size, with_count
+            )
+        else:
+            history = list(history)
         for item in history:
             # Convert is_nft from integer (1/0) to boolean
             is_nft_value = bool(item.get("is_nft", False))
@@ -1358,14 +1425,24 @@ class WalletHistoryView(APIView):
             history = self._apply_categories(history)
 
         # Paginate
-        pages = Paginator(history, page_size)
-        page_obj = pages.page(int(page))
-        data = {
-            "history": page_obj.object_list,
-            "page": page,
-            "num_pages": pages.num_pages,
-            "has_next": page_obj.has_next(),
-        }
+        if keyset:
+            data = {
+                "history": history,
+                "page_size": page_size,
+                "next": next_cursor,
+                "has_next": next_cursor is not None,
+            }
+            if count is not None:
+                data["count"] = count
+        else:
+            pages = Paginator(history, page_size)
+            page_obj = pages.page(int(page))
+            data = {
+                "history": page_obj.object_list,
+                "page": page,
+                "num_pages": pages.num_pages,
+                "has_next": page_obj.has_next(),
+            }
 
         # Cache the response if applicable
         if use_cache and wallet.version > 1:
@@ -1425,10 +1502,10 @@ class LastAddressIndexView(APIView):
 
         # Check cache first
         cache = settings.REDISKV
-        cache_key = f"wallet:last_address_index:{wallet_hash}:{with_tx}:{exclude_pos}:{posid}"
-        cached_result = cache.get(cache_key)
+        cache_key = last_address_index_cache_key(wallet_hash, f"{with_tx}:{exclude_pos}:{posid}")
+        cached_result = cache_codec.get_cached(cache, cache_key)
         if cached_result:
-            return Response(json.loads(cached_result))
+            return Response(cached_result)
 
         # Get all addresses for the wallet that are NOT advance subscribed
         base_queryset = Address.objects.filter(
@@ -1556,7 +1633,7 @@ class LastAddressIndexView(APIView):
         # 1. New addresses are added to the wallet
         # 2. Addresses receive transactions (which may affect with_tx variant)
         # 3. advance_subscription flag changes on addresses
-        cache.set(cache_key, json.dumps(data), 86400)
+        cache.set(cache_key, cache_codec.encode(data, serializer=cache_codec.JSON), 86400)
 
         return Response(data)
 
@@ -0,0 +1,157 @@
+from django.conf import settings
+from django.db.models import F, Q
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from main.models import Wallet, WalletChange, WalletHistory
+from main.utils.wallet_changes import get_wallet_changes
+from main.views.view_utxo import _get_bch_utxos, _get_ct_utxos, _get_token_utxos
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+
+class WalletChangesView(APIView):
+    """
+    Rows of a wallet changed after a change sequence, for incremental sync.
+
+    Without `since` only the current sequence is returned (with `reset`), a client
+    syncs the history and UTXO endpoints after reading it then polls from there.
+    `reset` is also set when `since` was pruned from the feed.
+    """
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                name="since",
+                type=openapi.TYPE_INTEGER,
+                in_=openapi.IN_QUERY,
+                required=False,
+                description="`sequence` of the previous response",
+            ),
+            openapi.Parameter(
+                name="limit",
+                type=openapi.TYPE_INTEGER,
+                in_=openapi.IN_QUERY,
+                default=DEFAULT_LIMIT,
+                required=False,
+            ),
+        ]
+    )
+    def get(self, request, *args, **kwargs):
+        wallet_hash = kwargs.get("wallethash", None)
+        since = request.query_params.get("since", None)
+        limit = request.query_params.get("limit", DEFAULT_LIMIT)
+
+        try:
+            since = int(since) if since not in (None, "") else None
+            limit = min(max(int(limit), 1), MAX_LIMIT)
+        except (TypeError, ValueError):
+            return Response(
+                data={"error": "since and limit must be integers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            wallet = Wallet.objects.get(wallet_hash=wallet_hash)
+        except Wallet.DoesNotExist:
+            return Response(
+                data={"error": "Wallet not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        changes, sequence, has_more, reset = get_wallet_changes(wallet, since, limit)
+        history_changes = {
+            object_id: key
+            for (kind, object_id), (key, deleted) in changes.items()
+            if kind == WalletChange.KIND_HISTORY
+        }
+        utxo_changes = {
+            object_id: key
+            for (kind, object_id), (key, deleted) in changes.items()
+            if kind == WalletChange.KIND_TRANSACTION
+        }
+
+        history = self.get_history(wallet, list(history_changes))
+        found_history_ids = {item["id"] for item in history}
+        utxos, unspent_keys = self.get_utxos(wallet, list(utxo_changes))
+
+        data = {
+            "sequence": sequence,
+            "has_more": has_more,
+            "reset": reset,
+            "history": history,
+            "removed_history": [
+                {"id": object_id, "txid": key}
+                for object_id, key in history_changes.items()
+                if object_id not in found_history_ids
+            ],
+            "utxos": utxos,
+            "removed_utxos": [
+                {"txid": key.rsplit(":", 1)[0], "vout": int(key.rsplit(":", 1)[1])}
+                for key in sorted(set(utxo_changes.values()) - unspent_keys)
+            ],
+        }
+        return Response(data=data, status=status.HTTP_200_OK)
+
+    def get_history(self, wallet, ids):
+        if not ids:
+            return []
+
+        history = WalletHistory.objects.filter(id__in=ids, wallet=wallet).annotate(
+            _token=F("token__tokenid"),
+            _cashtoken_category=F("cashtoken_ft__category"),
+            _cashtoken_nft_category=F("cashtoken_nft__category"),
+            _cashtoken_nft_commitment=F("cashtoken_nft__commitment"),
+        ).order_by("id").values(
+            "id",
+            "record_type",
+            "txid",
+            "amount",
+            "_token",
+            "_cashtoken_category",
+            "_cashtoken_nft_category",
+            "_cashtoken_nft_commitment",
+            "tx_fee",
+            "senders",
+            "recipients",
+            "date_created",
+            "tx_timestamp",
+            "usd_price",
+            "market_prices",
+        )
+
+        results = []
+        for item in history:
+            ft_category = item.pop("_cashtoken_category")
+            nft_category = item.pop("_cashtoken_nft_category")
+            item["token_id"] = item.pop("_token")
+            item["category"] = ft_category or nft_category
+            item["commitment"] = item.pop("_cashtoken_nft_commitment")
+            results.append(item)
+        return results
+
+    def get_utxos(self, wallet, ids):
+        """
+        Returns (utxos, { 'txid:index' of the returned utxos }) of the changed outputs
+        still unspent in the wallet, in the formats of the UTXO endpoint. Outputs the UTXO
+        endpoint leaves out (e.g. bch dust) are reported as removed.
+        """
+        if not ids:
+            return [], set()
+
+        query = Q(id__in=ids) & Q(wallet=wallet) & Q(spent=False) & ~Q(address__address_path="")
+        if wallet.wallet_type == "slp":
+            utxos = list(_get_token_utxos(query, show_address_index=True))
+        else:
+            utxos = list(_get_bch_utxos(query, show_address_index=True))
+            utxos += list(
+                _get_ct_utxos(
+                    query & Q(token__tokenid=settings.WT_DEFAULT_CASHTOKEN_ID),
+                    show_address_index=True,
+                )
+            )
+        unspent_keys = {f"{utxo['txid']}:{utxo['vout']}" for utxo in utxos}
+        return utxos, unspent_keys
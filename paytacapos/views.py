@@ -36,6 +36,8 @@ from .utils.cash_out import fetch_unspent_merchant_transactions, generate_payout
 
 from .models import Location, Category, Merchant, PosDevice, CashOutPaymentMethod
 from main.models import Address, Transaction, Wallet, WalletHistory, TransactionMetaAttribute
+from main.utils import cache_codec
+from main.utils.cache import pos_wallet_history_cache_key
 from rampp2p.models import MarketPrice
 from .tasks import process_cashout_input_txns
 
@@ -643,34 +645,27 @@ class PosWalletHistoryViewSet(viewsets.GenericViewSet, mixins.ListModelMixin):
             .annotate(posid=F('pos_wallet_history__posid'))
 
     def get_cache_key(self):
+        if getattr(self, '_cache_key', None):
+            return self._cache_key
+
         # Serialize the object to binary
         pickled_params = pickle.dumps(self.request.GET.dict())
         # Convert binary to Base64 string
         encoded_params = base64.b64encode(pickled_params).decode('utf-8')
 
         wallet_hash = self._get_wallet_hash()
-        return f"wallet:history:{wallet_hash}:pos:{encoded_params}"
+        posid = self.request.GET.get('posid')
+        self._cache_key = pos_wallet_history_cache_key(wallet_hash, posid, encoded_params)
+        return self._cache_key
 
     def get_cached_response(self):
         redis_cache = settings.REDISKV
         cache_key = self.get_cache_key()
 
-        cached_data = redis_cache.get(cache_key)
-        if cached_data is None:
-            return None
-
-        # Try JSON first (faster deserialization)
         try:
-            if isinstance(cached_data, bytes):
-                cached_data = cached_data.decode('utf-8')
-            return json.loads(cached_data)
-        except (json.JSONDecodeError, AttributeError, TypeError):
-            # Fallback to pickle for backward compatibility
-            try:
-                pickled_data = base64.b64decode(cached_data)
-                return pickle.loads(pickled_data)
-            except Exception:
-                return None
+            return cache_codec.decode(redis_cache.get(cache_key))
+        except Exception:
+            return None
 
     def save_cached_response(self, data):
         redis_cache = settings.REDISKV
@@ -678,14 +673,12 @@ class PosWalletHistoryViewSet(viewsets.GenericViewSet, mixins.ListModelMixin):
 
         # Use JSON instead of pickle for faster serialization
         try:
-            json_data = json.dumps(data)
-            # Cache for 30 minutes instead of 5
-            redis_cache.set(cache_key, json_data, ex=60 * 30)
+            encoded_data = cache_codec.encode(data, serializer=cache_codec.JSON)
         except (TypeError, ValueError):
             # Fallback to pickle if JSON serialization fails
-            pickled_data = pickle.dumps(data)
-            encoded_data = base64.b64encode(pickled_data).decode('utf-8')
-            redis_cache.set(cache_key, encoded_data, ex=60 * 30)
+            encoded_data = cache_codec.encode(data, serializer=cache_codec.PICKLE)
+        # Cache for 30 minutes instead of 5
+        redis_cache.set(cache_key, encoded_data, ex=60 * 30)
 
     def list(self, request, *args, **kwargs):
         # Check full response cache first
@@ -1,44 +1 @@
-from collections import OrderedDict
-from rest_framework import pagination, response
-
-class CustomLimitOffsetPagination(pagination.LimitOffsetPagination):
-    default_limit = 10
-    max_limit = 50
-
-    def get_paginated_response(self, data):
-        return response.Response(OrderedDict([
-            ('count', self.count),
-            ('limit', self.limit),
-            ('offset', self.offset),
-            ('next', self.get_next_link()),
-            ('previous', self.get_previous_link()),
-            ('results', data)
-        ]))
-
-    def get_paginated_response_schema(self, schema):
-        return {
-            'type': 'object',
-            'properties': {
-                'count': {
-                    'type': 'integer',
-                    'example': 123,
-                },
-                'limit': {
-                    'type': 'integer',
-                    'example': 10,
-                },
-                'offset': {
-                    'type': 'integer',
-                    'example': 0,
-                },
-                'next': {
-                    'type': 'string',
-                    'nullable': True,
-                },
-                'previous': {
-                    'type': 'string',
-                    'nullable': True,
-                },
-                'results': schema,
-            },
-        }
+from main.pagination import CustomLimitOffsetPagination
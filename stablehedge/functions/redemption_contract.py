@@ -1,4 +1,3 @@
-import json
 import math
 import decimal
 from django.utils import timezone
@@ -15,6 +14,7 @@ from stablehedge.utils.wallet import wif_to_cash_address, is_valid_wif, get_bch_
 from stablehedge.utils.transaction import tx_model_to_cashscript, utxo_data_to_cashscript, validate_utxo_data, InvalidUtxoException
 
 from main import models as main_models
+from main.utils import cache_codec
 
 from .treasury_contract import get_funding_wif
 
@@ -125,12 +125,12 @@ def get_volume_data(
         if cached_value:
             LOGGER.debug(f"Cached volume data | {REDIS_KEY} | {cached_value}")
             try:
-                data = json.loads(cached_value)
+                data = cache_codec.decode(cached_value)
                 for index, record in enumerate(data):
                     data[index]["satoshis"] = decimal.Decimal(record["satoshis"])
                     data[index]["count"] = int(record["count"])
                 return data
-            except (TypeError, AttributeError, decimal.InvalidOperation) as exception:
+            except (TypeError, ValueError, AttributeError, decimal.InvalidOperation) as exception:
                 LOGGER.exception(exception)
 
     token_category_subquery = models.RedemptionContract.objects \
@@ -156,7 +156,7 @@ def get_volume_data(
         .values("transaction_type", "satoshis", "count").distinct()
 
     parsed_data = [*data]
-    REDIS_STORAGE.set(REDIS_KEY, str(json.dumps(parsed_data, default=str)), ex=ttl)
+    REDIS_STORAGE.set(REDIS_KEY, cache_codec.encode(parsed_data), ex=ttl)
     return parsed_data
 
 
@@ -0,0 +1,95 @@
+"""
+In memory stand-in for the REDISKV commands used by main.utils.single_flight and
+main.utils.task_dedupe, their Lua scripts are patched with the `*_script` methods.
+Expirations are not simulated.
+"""
+
+
+class FakePipeline(object):
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+        self.watching = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.commands = []
+
+    def watch(self, *keys):
+        # commands run immediately between watch() and multi(), like redis-py
+        self.watching = True
+
+    def multi(self):
+        self.watching = False
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            if self.watching:
+                return getattr(self.redis, name)(*args, **kwargs)
+            self.commands.append((getattr(self.redis, name), args, kwargs))
+            return self
+        return command
+
+    def execute(self):
+        results = [command(*args, **kwargs) for command, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
+
+class FakeRedis(object):
+
+    def __init__(self):
+        self.data = {}
+
+    @staticmethod
+    def _bytes(value):
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode()
+
+    def set(self, key, value, nx=False, ex=None, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = self._bytes(value)
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    def hincrby(self, key, field, amount=1):
+        values = self.data.setdefault(key, {})
+        values[self._bytes(field)] = values.get(self._bytes(field), 0) + amount
+        return values[self._bytes(field)]
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def delete_if_equal_script(self, keys, args):
+        if self.get(keys[0]) == self._bytes(args[0]):
+            return self.delete(keys[0])
+        return 0
+
+    def dedupe_queue_script(self, keys, args):
+        key, stats_key, payloads_key = keys
+        task_id, _, task_name, payload, _ = args
+        if self.set(key, task_id, nx=True):
+            self.hincrby(stats_key, f'{task_name}:queued')
+            return self._bytes(task_id)
+        self.hincrby(stats_key, f'{task_name}:deduplicated')
+        if payload:
+            self.data.setdefault(payloads_key, []).append(payload)
+        return self.get(key)
+
+    def dedupe_release_script(self, keys, args):
+        key, payloads_key = keys
+        self.delete_if_equal_script([key], args)
+        return self.data.pop(payloads_key, [])
@@ -0,0 +1,59 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from main.utils import address_discovery
+from main.utils.address_discovery import (
+    AddressDiscovery,
+    AddressDiscoveryError,
+    InvalidXpubKeyError,
+    XpubAddressDeriver,
+)
+
+
+def address_sets(count):
+    return [
+        { "address_index": index, "receiving": f"bitcoincash:r{index}", "change": f"bitcoincash:c{index}" }
+        for index in range(count)
+    ]
+
+
+@override_settings(ADDRESS_DISCOVER_GAP_LIMIT=20, ADDRESS_DISCOVER_MAX_INDEXES=2000)
+class AddressDiscoveryTestCase(SimpleTestCase):
+
+    def run_discovery(self, check_addresses_history, **kwargs):
+        with mock.patch.object(address_discovery.NODE, "BCH") as bch:
+            bch.check_addresses_history.side_effect = check_addresses_history
+            return AddressDiscovery(**kwargs).run(), bch.check_addresses_history
+
+    def test_stops_at_gap_limit(self):
+        used = { "bitcoincash:r1" }
+        result, check = self.run_discovery(
+            lambda addresses: { address: address in used for address in addresses },
+            address_sets=address_sets(10), gap_limit=3,
+        )
+        self.assertEqual(result["last_used_index"], 1)
+        self.assertEqual(len(result["results"]), 5)
+        self.assertFalse(result["truncated"])
+
+    def test_failed_batch_aborts(self):
+        with self.assertRaises(AddressDiscoveryError):
+            self.run_discovery(
+                lambda addresses: { address: None for address in addresses },
+                address_sets=address_sets(10), gap_limit=3,
+            )
+
+        with self.assertRaises(AddressDiscoveryError):
+            self.run_discovery(ConnectionError, address_sets=address_sets(10), gap_limit=3)
+
+    def test_truncated_address_sets(self):
+        result, _ = self.run_discovery(
+            lambda addresses: { address: True for address in addresses },
+            address_sets=address_sets(10), max_indexes=4,
+        )
+        self.assertEqual(len(result["results"]), 4)
+        self.assertTrue(result["truncated"])
+
+    def test_invalid_xpubkey(self):
+        with self.assertRaises(InvalidXpubKeyError):
+            XpubAddressDeriver("xpub-invalid")
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import pytz
+from django.test import TestCase
+
+from main.models import Address, BlockHeight, Project, Token, Transaction, Wallet, WalletHistory
+from main.utils.block_ingestion import BlockIngestor
+from main.utils.cache_buffer import InvalidationBuffer
+
+TXID = "a" * 64
+BLOCK_TIME = 1700000000
+
+
+class FillTxTimestampsTestCase(TestCase):
+
+    def setUp(self):
+        project = Project.objects.create(name="paytaca")
+        self.wallet = Wallet.objects.create(wallet_hash="wallet_a", wallet_type="bch", version=2, project=project)
+        address = Address.objects.create(
+            address="bitcoincash:q0",
+            address_path="0/0",
+            wallet=self.wallet,
+            project=project,
+        )
+        Transaction.objects.create(
+            txid=TXID,
+            index=0,
+            address=address,
+            wallet=self.wallet,
+            value=1000,
+            token=Token.objects.create(name="bch", tokenid=""),
+            source="test",
+            spending_txid="",
+        )
+        WalletHistory.objects.create(wallet=self.wallet, txid=TXID, record_type=WalletHistory.INCOMING, amount=0.00001)
+        self.ingestor = BlockIngestor(BlockHeight.objects.create(number=800000), [], block_time=BLOCK_TIME)
+
+    def test_invalidates_updated_rows(self):
+        buffer = InvalidationBuffer()
+        self.ingestor.fill_tx_timestamps([TXID], buffer)
+
+        tx_timestamp = datetime.fromtimestamp(BLOCK_TIME).replace(tzinfo=pytz.UTC)
+        self.assertEqual(WalletHistory.objects.get(txid=TXID).tx_timestamp, tx_timestamp)
+        self.assertEqual(Transaction.objects.get(txid=TXID).tx_timestamp, tx_timestamp)
+        self.assertEqual(buffer.addresses, {"bitcoincash:q0"})
+        self.assertEqual(buffer.wallet_balances, {"wallet_a": set()})
+        self.assertEqual(buffer.wallet_histories, {"wallet_a": None})
+
+        # rows that already have a block time are left alone
+        buffer = InvalidationBuffer()
+        self.ingestor.fill_tx_timestamps([TXID], buffer)
+        self.assertFalse(buffer)
@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.test import TestCase
+
+from main.utils.cache_buffer import get_invalidation_buffer, schedule_flush
+
+
+class InvalidationBufferRollbackTestCase(TestCase):
+    """
+    Runs inside the test case transaction, so the flush stays registered on its commit
+    """
+
+    def setUp(self):
+        get_invalidation_buffer().reset()
+
+    def tearDown(self):
+        get_invalidation_buffer().reset()
+
+    def add_invalidations(self):
+        buffer = get_invalidation_buffer()
+        buffer.add_wallet_history("wallet_a", asset_key="bch")
+        buffer.add_post_save_task("a" * 64, "bitcoincash:q0", 1, wallet_hash="wallet_a")
+        schedule_flush()
+
+    def test_kept_until_commit(self):
+        with transaction.atomic():
+            self.add_invalidations()
+        self.assertTrue(get_invalidation_buffer())
+
+    def test_dropped_on_rollback(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.add_invalidations()
+                raise RuntimeError()
+
+        buffer = get_invalidation_buffer()
+        self.assertFalse(buffer)
+        self.assertEqual(buffer.post_save_tasks, {})
@@ -0,0 +1,33 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from main.utils import cache_codec
+from main.utils.cache_codec import CacheDecodeError, decode, encode, get_cached
+from tests.fake_redis import FakeRedis
+
+VALUE = { "balance": 1.5, "history": ["a" * 64] * 20 }
+
+
+@override_settings(CACHE_CODEC_COMPRESS_THRESHOLD=10, CACHE_CODEC_COMPRESSION="zlib", CACHE_CODEC_STATS_INTERVAL=3600)
+class CacheCodecTestCase(SimpleTestCase):
+
+    def test_round_trip(self):
+        for serializer in (cache_codec.PICKLE, cache_codec.JSON):
+            data = encode(VALUE, serializer=serializer)
+            self.assertEqual(data[0] & 0x07, cache_codec.COMPRESSORS["zlib"][0])
+            self.assertEqual(decode(data), VALUE)
+
+    def test_unavailable_compressor_is_a_miss(self):
+        redis = FakeRedis()
+        redis.set("key", encode(VALUE))
+        # written by a host with the compressor, read by one without it
+        with mock.patch.dict(cache_codec.DECOMPRESSORS_BY_ID, clear=True):
+            with self.assertRaises(CacheDecodeError):
+                decode(redis.get("key"))
+            self.assertIsNone(get_cached(redis, "key"))
+        self.assertIsNone(redis.get("key"))
+
+        redis.set("key", bytes([cache_codec.HEADER_FLAG | 7 << 3]) + b"{}")
+        self.assertIsNone(get_cached(redis, "key"))
+        self.assertIsNone(get_cached(redis, "missing"))
@@ -0,0 +1,46 @@
+from django.test import SimpleTestCase
+
+from main.utils import cashaddr
+
+# cashaddr spec and CashTokens CHIP test vectors
+HASH160 = bytes.fromhex("76a04053bda0a88bda5177b86a15c3b29f559873")
+P2PKH_ADDRESS = "bitcoincash:qpm2qsznhks23z7629mms6s4cwef74vcwvy22gdx6a"
+P2SH_ADDRESS = "bitcoincash:ppm2qsznhks23z7629mms6s4cwef74vcwvn0h829pq"
+LEGACY_ADDRESS = "1BpEi6DfDAUFd7GtittLSdBeYJvcoaVggu"
+BCH_ADDRESS = "bitcoincash:qr7fzmep8g7h7ymfxy74lgc0v950j3r2959lhtxxsl"
+TOKEN_ADDRESS = "bitcoincash:zr7fzmep8g7h7ymfxy74lgc0v950j3r295z4y4gq0v"
+
+
+class CashAddrTestCase(SimpleTestCase):
+
+    def test_encode_decode(self):
+        self.assertEqual(cashaddr.encode("bitcoincash", cashaddr.P2PKH, HASH160), P2PKH_ADDRESS)
+        self.assertEqual(cashaddr.encode("bitcoincash", cashaddr.P2SH, HASH160), P2SH_ADDRESS)
+        self.assertEqual(cashaddr.decode(P2SH_ADDRESS.upper()), ("bitcoincash", cashaddr.P2SH, HASH160))
+
+    def test_is_valid(self):
+        self.assertTrue(cashaddr.is_valid(BCH_ADDRESS))
+        self.assertFalse(cashaddr.is_valid(BCH_ADDRESS, token=True))
+        self.assertTrue(cashaddr.is_valid(TOKEN_ADDRESS, token=True))
+        self.assertFalse(cashaddr.is_valid(TOKEN_ADDRESS))
+        self.assertFalse(cashaddr.is_valid(P2PKH_ADDRESS[:-1] + "b"))
+        self.assertFalse(cashaddr.is_valid("bitcoincash:QPM2QSZNHKS23Z7629MMS6S4CWEF74VCWVY22GDX6A"))
+        self.assertFalse(cashaddr.is_valid(LEGACY_ADDRESS))
+
+    def test_convert(self):
+        self.assertEqual(cashaddr.convert(BCH_ADDRESS), TOKEN_ADDRESS)
+        self.assertEqual(cashaddr.convert(TOKEN_ADDRESS), TOKEN_ADDRESS)
+        self.assertEqual(cashaddr.convert(TOKEN_ADDRESS, to_token=False), BCH_ADDRESS)
+        self.assertEqual(
+            cashaddr.convert_many([BCH_ADDRESS, "invalid"]),
+            {BCH_ADDRESS: TOKEN_ADDRESS, "invalid": None},
+        )
+
+    def test_locking_bytecode(self):
+        p2pkh = "76a914" + HASH160.hex() + "88ac"
+        self.assertEqual(cashaddr.to_locking_bytecode(P2PKH_ADDRESS).hex(), p2pkh)
+        self.assertEqual(cashaddr.to_locking_bytecode(LEGACY_ADDRESS).hex(), p2pkh)
+        self.assertEqual(cashaddr.to_locking_bytecode(P2SH_ADDRESS).hex(), "a914" + HASH160.hex() + "87")
+        self.assertEqual(cashaddr.to_locking_bytecode(TOKEN_ADDRESS), cashaddr.to_locking_bytecode(BCH_ADDRESS))
+        self.assertEqual(cashaddr.from_locking_bytecode(bytes.fromhex(p2pkh)), P2PKH_ADDRESS)
+        self.assertIsNone(cashaddr.from_locking_bytecode(bytes([0x6a])))
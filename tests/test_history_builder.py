@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase, override_settings
+
+from main.utils.history_builder import (
+    BCH_OR_SLP,
+    WalletHistoryBuilder,
+    last_transaction,
+    merge_build_requests,
+    parse_wallet_transactions,
+)
+
+TXID = "a" * 64
+BCH = SimpleNamespace(id=1, name="bch", tokenid="")
+CT = SimpleNamespace(id=2, name="", tokenid="wt_cashtoken_token_id")
+NOW = datetime(2024, 1, 1)
+
+_ids = iter(range(1, 1000))
+
+
+def txn(wallet_id, address, value=0, spent_by=None, token=BCH, ft=None, amount=0, nft=None, date_created=NOW):
+    return SimpleNamespace(
+        id=next(_ids),
+        txid="b" * 64 if spent_by else TXID,
+        spending_txid=spent_by,
+        wallet_id=wallet_id,
+        address=SimpleNamespace(address=address, wallet_id=wallet_id),
+        value=value,
+        amount=amount,
+        token=token,
+        cashtoken_ft_id=ft,
+        cashtoken_ft=SimpleNamespace(pk=ft, category=ft) if ft else None,
+        cashtoken_nft_id=nft and nft.pk,
+        cashtoken_nft=nft,
+        date_created=date_created,
+        tx_timestamp=None,
+    )
+
+
+@override_settings(WT_DEFAULT_CASHTOKEN_ID="wt_cashtoken_token_id", BCH_NETWORK="mainnet")
+class ParseWalletTransactionsTestCase(SimpleTestCase):
+    def test_bch_payment_with_change(self):
+        inputs = [txn(1, "bitcoincash:a0", 10 ** 8, spent_by=TXID)]
+        outputs = [txn(1, "bitcoincash:a1", 3 * 10 ** 7)]
+        parsed = parse_wallet_transactions(inputs, outputs)
+        self.assertEqual(parsed[BCH_OR_SLP], {
+            "record_type": "outgoing",
+            "change_address": "bitcoincash:a1",
+            "diff": -0.7,
+        })
+
+    def test_dust_is_zero(self):
+        parsed = parse_wallet_transactions([], [txn(1, "bitcoincash:a0", 546)])
+        self.assertEqual(parsed[BCH_OR_SLP]["diff"], 0)
+        self.assertEqual(parsed[BCH_OR_SLP]["record_type"], "")
+
+    def test_cashtokens(self):
+        nft = SimpleNamespace(pk=5, category="cat", capability="none", commitment="")
+        outputs = [
+            txn(1, "bitcoincash:a0", 1000, token=CT, ft="cat", amount=40),
+            txn(1, "bitcoincash:a1", 1000, token=CT, ft="cat", amount=2),
+            txn(1, "bitcoincash:a2", 1000, token=CT, nft=nft),
+        ]
+        parsed = parse_wallet_transactions([], outputs)
+        self.assertEqual(parsed[BCH_OR_SLP]["diff"], 0)
+        self.assertEqual(parsed["ct/cat"]["diff"], 42)
+        self.assertEqual(parsed["ct/cat"]["record_type"], "incoming")
+        self.assertEqual(parsed["ct_nft/cat/none/"]["diff"], 1.0)
+        self.assertIsNone(parsed["ct_nft/cat/none/"]["commitment"])
+
+    def test_last_transaction_is_earliest(self):
+        earliest = txn(1, "bitcoincash:a0", date_created=NOW - timedelta(days=1))
+        txns = [txn(1, "bitcoincash:a1"), earliest, txn(1, "bitcoincash:a2", date_created=None)]
+        self.assertIs(last_transaction(txns), earliest)
+        self.assertIsNone(last_transaction([]))
+
+
+@override_settings(WT_DEFAULT_CASHTOKEN_ID="wt_cashtoken_token_id", BCH_NETWORK="mainnet")
+class WalletHistoryBuilderTestCase(SimpleTestCase):
+    def setUp(self):
+        senders = [["bitcoincash:a0", 10 ** 8]]
+        recipients = [["bitcoincash:a1", 3 * 10 ** 7], ["bitcoincash:b0", 69999000]]
+        self.builder = WalletHistoryBuilder(
+            TXID, tx_fee=1000, senders=senders, recipients=recipients,
+        )
+        self.builder.inputs = [txn(1, "bitcoincash:a0", 10 ** 8, spent_by=TXID)]
+        self.builder.outputs = [
+            txn(1, "bitcoincash:a1", 3 * 10 ** 7),
+            txn(2, "bitcoincash:b0", 69999000),
+        ]
+        self.builder.price_log_id = None
+
+    def test_records_of_each_wallet(self):
+        sent = self.builder.build_records(1)
+        received = self.builder.build_records(2)
+
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0]["record_type"], "outgoing")
+        # the fee is not part of the sent amount
+        self.assertEqual(sent[0]["amount"], 0.69999)
+        self.assertEqual(sent[0]["token_id"], BCH.id)
+        # the change output is left out of the recipients
+        self.assertEqual([info[0] for info in sent[0]["recipients"]], ["bitcoincash:b0"])
+
+        self.assertEqual(len(received), 1)
+        self.assertEqual(received[0]["record_type"], "incoming")
+        self.assertEqual(received[0]["amount"], 0.69999)
+
+    def test_zero_amount_is_skipped(self):
+        self.assertEqual(self.builder.build_records(3), [])
+        self.builder.proceed_with_zero_amount = True
+        self.assertEqual(self.builder.build_records(3)[0]["record_type"], "")
+
+    def test_consolidation(self):
+        self.builder.address_wallets = {"bitcoincash:a0": 1, "bitcoincash:a1": 1, "bitcoincash:b0": 2}
+        self.assertFalse(self.builder.is_consolidation(1))
+        self.builder.address_wallets["bitcoincash:b0"] = 1
+        self.assertTrue(self.builder.is_consolidation(1))
+
+
+class MergeBuildRequestsTestCase(SimpleTestCase):
+    def test_keeps_most_complete_inputs(self):
+        resolved = [("bitcoincash:a0", 1000, None)]
+        unresolved = [(None, 1000, None)]
+        older = ((TXID, 220, resolved, unresolved), {})
+        newer = ((TXID,), { "recipients": resolved + unresolved })
+
+        _, merged = merge_build_requests(older, newer)
+        self.assertEqual(merged["senders"], resolved)
+        self.assertEqual(merged["recipients"], resolved + unresolved)
+        self.assertEqual(merged["tx_fee"], 220)
+
+        # the newer inputs win ties
+        _, merged = merge_build_requests(older, ((TXID, 250, [("bitcoincash:a1", 1, None)]), {}))
+        self.assertEqual((merged["tx_fee"], merged["senders"][0][0]), (250, "bitcoincash:a1"))
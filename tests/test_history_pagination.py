@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+
+from django.test import SimpleTestCase
+
+from main.utils.history_pagination import (
+    InvalidCursor,
+    decode_cursor,
+    encode_cursor,
+    parse_page_size,
+)
+
+
+class HistoryCursorTestCase(SimpleTestCase):
+
+    def test_round_trip(self):
+        tx_timestamp = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        date_created = datetime(2024, 5, 1, 12, 31, tzinfo=timezone.utc)
+        cursor = encode_cursor(tx_timestamp, date_created, 42)
+        self.assertEqual(
+            decode_cursor(cursor),
+            (tx_timestamp.isoformat(), date_created.isoformat(), 42),
+        )
+
+    def test_round_trip_without_timestamp(self):
+        date_created = datetime(2024, 5, 1, tzinfo=timezone.utc)
+        cursor = encode_cursor(None, date_created, 7)
+        self.assertEqual(decode_cursor(cursor), (None, date_created.isoformat(), 7))
+
+    def test_invalid_cursor(self):
+        for cursor in ('garbage', encode_cursor(None, datetime(2024, 5, 1), 1)[:-4], 'W10'):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_page_size_bounds(self):
+        self.assertEqual(parse_page_size('25'), 25)
+        self.assertEqual(parse_page_size('0'), 1)
+        self.assertEqual(parse_page_size('1000'), 100)
+        self.assertEqual(parse_page_size('abc'), 10)
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta, timezone
+
+from django.test import TestCase, override_settings
+
+from main.models import (
+    Address,
+    CashFungibleToken,
+    CashNonFungibleToken,
+    Project,
+    Token,
+    Transaction,
+    Wallet,
+)
+from main.utils.wallet import HistoryParser
+
+TXID = "a" * 64
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@override_settings(WT_DEFAULT_CASHTOKEN_ID="wt_cashtoken_token_id", BCH_NETWORK="mainnet")
+class HistoryParserTestCase(TestCase):
+    """
+    The aggregated query of `parse` against the reference `parse_with_orm`
+    """
+
+    def setUp(self):
+        self.project = Project.objects.create(name="paytaca")
+        self.bch = Token.objects.create(name="bch", tokenid="")
+        self.ct = Token.objects.create(tokenid="wt_cashtoken_token_id")
+        self.category = "c" * 64
+        self.ft = CashFungibleToken.objects.create(category=self.category)
+        self.nft = CashNonFungibleToken.objects.create(
+            category=self.category,
+            capability="minting",
+            commitment="ab",
+            current_txid=TXID,
+            current_index=3,
+        )
+        self.wallets = [
+            Wallet.objects.create(wallet_hash=f"wallet_{i}", wallet_type="bch", version=2, project=self.project)
+            for i in range(3)
+        ]
+        self.addresses = [
+            Address.objects.create(
+                address=f"bitcoincash:q{i}",
+                address_path=f"0/{i}",
+                wallet=self.wallets[i % 2],
+                project=self.project,
+            )
+            for i in range(4)
+        ]
+        self.seconds = 0
+
+    def _create_txn(self, address, value, spending_txid="", **kwargs):
+        self.seconds += 1
+        return Transaction.objects.create(
+            txid=kwargs.pop("txid", TXID),
+            index=self.seconds,
+            address=address,
+            wallet=address.wallet,
+            value=value,
+            token=kwargs.pop("token", self.bch),
+            source="test",
+            spent=bool(spending_txid),
+            spending_txid=spending_txid,
+            date_created=NOW + timedelta(seconds=self.seconds),
+            **kwargs,
+        )
+
+    def assertParsedSame(self):
+        owners = [{"wallet_hash": wallet.wallet_hash} for wallet in self.wallets]
+        owners += [{"address": address.address} for address in self.addresses]
+        for owner in owners:
+            parser = HistoryParser(TXID, **owner)
+            with self.subTest(**owner):
+                self.assertEqual(parser.parse(), parser.parse_with_orm())
+
+    def test_bch_payment_with_change(self):
+        sender, change, recipient = self.addresses[0], self.addresses[2], self.addresses[1]
+        self._create_txn(sender, 10 ** 8, txid="b" * 64, spending_txid=TXID)
+        self._create_txn(change, 3 * 10 ** 7)
+        self._create_txn(recipient, 69999000)
+        self._create_txn(recipient, 546)
+        self.assertParsedSame()
+
+        parsed = HistoryParser(TXID, wallet_hash=self.wallets[0].wallet_hash).parse()
+        self.assertEqual(parsed["bch_or_slp"]["record_type"], "outgoing")
+        self.assertEqual(parsed["bch_or_slp"]["change_address"], change.address)
+
+    def test_cashtokens(self):
+        self._create_txn(
+            self.addresses[0], 1000, txid="b" * 64, spending_txid=TXID,
+            token=self.ct, cashtoken_ft=self.ft, amount=50, cashtoken_nft=self.nft,
+        )
+        self._create_txn(self.addresses[0], 5000, txid="c" * 64, spending_txid=TXID)
+        self._create_txn(self.addresses[2], 1000, token=self.ct, cashtoken_ft=self.ft, amount=20)
+        self._create_txn(self.addresses[1], 1000, token=self.ct, cashtoken_ft=self.ft, amount=30)
+        self._create_txn(self.addresses[1], 1000, token=self.ct, cashtoken_nft=self.nft)
+        self._create_txn(self.addresses[2], 2000)
+        self.assertParsedSame()
+
+        parsed = HistoryParser(TXID, wallet_hash=self.wallets[1].wallet_hash).parse()
+        self.assertEqual(parsed[f"ct/{self.category}"]["diff"], 30)
+        self.assertEqual(parsed[f"ct_nft/{self.category}/minting/ab"]["record_type"], "incoming")
+
+    def test_unknown_txid(self):
+        self.assertParsedSame()
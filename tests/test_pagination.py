@@ -0,0 +1,34 @@
+from django.test import SimpleTestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from main.pagination import COUNT_ESTIMATE, COUNT_EXACT, COUNT_NONE, CustomLimitOffsetPagination
+
+
+class EstimatedCountView(object):
+    pagination_count_mode = COUNT_ESTIMATE
+
+
+class CountModeTestCase(SimpleTestCase):
+
+    def get_request(self, **params):
+        return Request(APIRequestFactory().get('/', params))
+
+    def test_query_param_selects_mode(self):
+        paginator = CustomLimitOffsetPagination()
+        self.assertEqual(paginator.get_count_mode(self.get_request()), COUNT_EXACT)
+        self.assertEqual(paginator.get_count_mode(self.get_request(count_mode='none')), COUNT_NONE)
+        self.assertEqual(paginator.get_count_mode(self.get_request(count_mode='bogus')), COUNT_EXACT)
+
+    def test_view_default_mode(self):
+        paginator = CustomLimitOffsetPagination()
+        view = EstimatedCountView()
+        self.assertEqual(paginator.get_count_mode(self.get_request(), view), COUNT_ESTIMATE)
+        self.assertEqual(paginator.get_count_mode(self.get_request(count_mode='exact'), view), COUNT_EXACT)
+
+    def test_lists_are_counted_exactly(self):
+        paginator = CustomLimitOffsetPagination()
+        results = paginator.paginate_queryset(list(range(25)), self.get_request(count_mode='none', limit=10))
+        self.assertEqual(results, list(range(10)))
+        self.assertEqual(paginator.count, 25)
+        self.assertTrue(paginator.count_exact)
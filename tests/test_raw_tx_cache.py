@@ -0,0 +1,32 @@
+from django.test import SimpleTestCase, override_settings
+
+from main.utils.queries.raw_tx_cache import LocalLRUCache, get_expiration
+
+
+class LocalLRUCacheTestCase(SimpleTestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LocalLRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_expired_entry(self):
+        cache = LocalLRUCache(maxsize=2)
+        cache.set('a', 1, expiration=-1)
+        self.assertIsNone(cache.get('a'))
+
+
+@override_settings(RAW_TX_MEMPOOL_TTL=30)
+class RawTxExpirationTestCase(SimpleTestCase):
+
+    def test_confirmed_tx_never_expires(self):
+        self.assertIsNone(get_expiration({ 'txid': 'a', 'blockhash': '00' }, 2))
+        self.assertIsNone(get_expiration('0200', 0))
+
+    def test_mempool_tx_expires(self):
+        self.assertEqual(get_expiration({ 'txid': 'a' }, 2), 30)
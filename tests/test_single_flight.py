@@ -0,0 +1,81 @@
+from unittest import mock
+
+from celery import Task
+from django.test import SimpleTestCase
+
+from main.utils import single_flight as single_flight_module
+from main.utils.single_flight import single_flight, lock_key, pending_key
+from tests.fake_redis import FakeRedis
+
+
+class SingleFlightTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patches = [
+            mock.patch.object(single_flight_module, 'REDIS_STORAGE', self.redis),
+            mock.patch.object(single_flight_module, 'DELETE_IF_EQUAL_SCRIPT', self.redis.delete_if_equal_script),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.calls = []
+        self.requests_while_running = []
+
+        @single_flight(lambda txid, *args, **kwargs: txid)
+        def parse(txid, senders=None, fail=False):
+            self.calls.append((txid, senders))
+            # requests made by other workers while this call runs
+            while self.requests_while_running:
+                self.assertEqual(parse(*self.requests_while_running.pop(0)), f'already_running: {txid}')
+            if fail:
+                raise ValueError(txid)
+            return senders
+
+        self.parse = parse
+
+    def test_rerun_with_latest_arguments(self):
+        self.requests_while_running = [('a', ['first']), ('a', ['latest'])]
+        self.assertEqual(self.parse('a', []), ['latest'])
+        self.assertEqual(self.calls, [('a', []), ('a', ['latest'])])
+        self.assertEqual(self.redis.data, {})
+
+    def test_failed_run_still_runs_merged_requests(self):
+        self.requests_while_running = [('a', ['merged'])]
+        with self.assertRaises(ValueError):
+            self.parse('a', [], fail=True)
+        self.assertEqual(self.calls, [('a', []), ('a', ['merged'])])
+        self.assertNotIn(lock_key('a'), self.redis.data)
+        self.assertNotIn(pending_key('a'), self.redis.data)
+
+    def test_bound_task_is_not_stored(self):
+        task = Task()
+        calls = []
+
+        @single_flight(lambda self, txid, *args, **kwargs: txid)
+        def bound_parse(self, txid, senders=None):
+            calls.append((self, senders))
+            if len(calls) == 1:
+                bound_parse(self, txid, ['merged'])
+
+        bound_parse(task, 'a', [])
+        self.assertEqual(calls, [(task, []), (task, ['merged'])])
+
+    def test_merge(self):
+        calls = []
+
+        def merge(older, newer):
+            (_, older_senders), (txid, newer_senders) = older[0], newer[0]
+            return (txid, older_senders + newer_senders), {}
+
+        @single_flight(lambda txid, senders: txid, merge=merge)
+        def parse(txid, senders):
+            calls.append(senders)
+            if len(calls) == 1:
+                parse(txid, ['b'])
+                parse(txid, ['c'])
+
+        parse('a', ['a'])
+        self.assertEqual(calls, [['a'], ['b', 'c']])
+        self.assertEqual(self.redis.data, {})
@@ -0,0 +1,136 @@
+from unittest import mock
+
+from celery import Task, shared_task
+from celery.exceptions import MaxRetriesExceededError
+from celery.result import AsyncResult
+from django.test import SimpleTestCase, override_settings
+
+from main.utils import task_dedupe
+from main.utils.task_dedupe import DedupeTask, dedupe_key, get_dedupe_stats, payload_key
+from tests.fake_redis import FakeRedis
+
+
+@shared_task(bind=True, base=DedupeTask, dedupe={ 'args': ('wallet_hash', 'full') })
+def dedupe_test_task(self, wallet_hash, full=False, force=False):
+    return wallet_hash
+
+
+@shared_task(bind=True, base=DedupeTask, dedupe={ 'args': ('txid',), 'window': 2, 'debounce': True })
+def debounce_test_task(self, txid, senders=None):
+    return senders
+
+
+@shared_task(bind=True, base=DedupeTask, dedupe={ 'args': ('txid',), 'debounce': True }, max_retries=2)
+def retry_test_task(self, txid, senders=None):
+    retry_test_task.runs.append((self.request.retries, senders))
+    self.retry(countdown=0)
+
+
+def merge_senders(older, newer):
+    (txid, older_senders), (_, newer_senders) = older[0], newer[0]
+    return (txid, older_senders + newer_senders), {}
+
+
+@shared_task(bind=True, base=DedupeTask, dedupe={ 'args': ('txid',), 'debounce': True, 'merge': merge_senders })
+def merge_test_task(self, txid, senders=None):
+    return senders
+
+
+class DedupeKeyTestCase(SimpleTestCase):
+
+    def test_key_of_selected_args(self):
+        key = dedupe_key(dedupe_test_task.name, ['wallet_a', False])
+        self.assertEqual(dedupe_test_task.get_dedupe_key(('wallet_a',), {}), key)
+        self.assertEqual(dedupe_test_task.get_dedupe_key((), { 'wallet_hash': 'wallet_a', 'force': True }), key)
+        self.assertNotEqual(dedupe_test_task.get_dedupe_key(('wallet_a', True), {}), key)
+
+    def test_invalid_args(self):
+        self.assertIsNone(dedupe_test_task.get_dedupe_key((), {}))
+        self.assertIsNone(dedupe_test_task.get_dedupe_key(('wallet_a',), { 'unknown': 1 }))
+
+
+@override_settings(TASK_DEDUPE_ENABLED=True, TASK_DEDUPE_WINDOW=60)
+class DedupeTaskTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.queued = []
+
+        def apply_async(args=None, kwargs=None, task_id=None, **options):
+            self.queued.append((args, kwargs, options))
+            return AsyncResult(task_id or 'direct')
+
+        patches = [
+            mock.patch.object(task_dedupe, 'REDIS_STORAGE', self.redis),
+            mock.patch.object(task_dedupe, 'QUEUE_SCRIPT', self.redis.dedupe_queue_script),
+            mock.patch.object(task_dedupe, 'RELEASE_SCRIPT', self.redis.dedupe_release_script),
+            mock.patch.object(Task, 'apply_async', side_effect=apply_async),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def run_task(self, task, task_id, *args, **kwargs):
+        task.push_request(id=task_id)
+        try:
+            return task(*args, **kwargs)
+        finally:
+            task.pop_request()
+
+    def test_duplicates_dropped_in_window(self):
+        first = dedupe_test_task.delay('wallet_a')
+        self.assertEqual(dedupe_test_task.delay('wallet_a', full=False).id, first.id)
+        other = dedupe_test_task.delay('wallet_a', full=True)
+        self.assertNotEqual(other.id, first.id)
+        self.assertEqual([args for args, _, _ in self.queued], [('wallet_a',), ('wallet_a',)])
+        self.assertEqual(self.queued[0][2], {})
+
+        self.assertEqual(get_dedupe_stats(), {
+            dedupe_test_task.name: { 'queued': 2, 'deduplicated': 1 },
+        })
+
+    def test_released_when_started(self):
+        first = dedupe_test_task.delay('wallet_a')
+        self.run_task(dedupe_test_task, 'another_task', 'wallet_a')
+        # only the queued task releases its key
+        self.assertEqual(dedupe_test_task.delay('wallet_a').id, first.id)
+
+        self.run_task(dedupe_test_task, first.id, 'wallet_a')
+        self.assertNotEqual(dedupe_test_task.delay('wallet_a').id, first.id)
+        self.assertEqual(len(self.queued), 2)
+
+    def test_retries_and_disabled_bypass(self):
+        first = dedupe_test_task.delay('wallet_a')
+        self.assertNotEqual(dedupe_test_task.apply_async(('wallet_a',), retries=1).id, first.id)
+        with override_settings(TASK_DEDUPE_ENABLED=False):
+            dedupe_test_task.delay('wallet_a')
+        self.assertEqual(len(self.queued), 3)
+        self.assertEqual(get_dedupe_stats()[dedupe_test_task.name], { 'queued': 1, 'deduplicated': 0 })
+
+    def test_debounce(self):
+        first = debounce_test_task.delay('a', ['first'])
+        debounce_test_task.delay('a', senders=['second'])
+        debounce_test_task.delay('a', ['latest'])
+        debounce_test_task.apply_async(('b',), countdown=5)
+        self.assertEqual([options for _, _, options in self.queued], [{ 'countdown': 2 }, { 'countdown': 5 }])
+
+        # runs with the arguments of the latest request
+        self.assertEqual(self.run_task(debounce_test_task, first.id, 'a', ['first']), ['latest'])
+        self.assertNotIn(payload_key(debounce_test_task.get_dedupe_key(('a',), {})), self.redis.data)
+        self.assertEqual(self.run_task(debounce_test_task, 'next_task', 'a', ['next']), ['next'])
+
+    def test_debounce_merge(self):
+        first = merge_test_task.delay('a', ['first'])
+        merge_test_task.delay('a', ['second'])
+        merge_test_task.delay('a', ['third'])
+        self.assertEqual(self.run_task(merge_test_task, first.id, 'a', ['first']), ['first', 'second', 'third'])
+
+    def test_retry(self):
+        retry_test_task.runs = []
+        first = retry_test_task.delay('a', ['first'])
+        retry_test_task.delay('a', ['latest'])
+
+        result = retry_test_task.apply(('a', ['first']), task_id=first.id)
+        self.assertIsInstance(result.result, MaxRetriesExceededError)
+        # each retry is scheduled with the merged arguments
+        self.assertEqual(retry_test_task.runs, [(0, ['latest']), (1, ['latest']), (2, ['latest'])])
@@ -0,0 +1,55 @@
+from django.db import connection
+from django.test import TestCase
+
+from main.models import Address, Project, Token, Transaction, Wallet
+from main.utils.cache_buffer import get_invalidation_buffer
+from main.utils.transaction_processing import mark_outpoints_spent, mark_transaction_ids_spent
+
+TXID = "a" * 64
+SPENDING_TXID = "b" * 64
+
+
+class MarkSpentTestCase(TestCase):
+
+    def setUp(self):
+        get_invalidation_buffer().reset()
+        project = Project.objects.create(name="paytaca")
+        wallet = Wallet.objects.create(wallet_hash="wallet_a", wallet_type="bch", version=2, project=project)
+        address = Address.objects.create(address="bitcoincash:q0", address_path="0/0", wallet=wallet, project=project)
+        bch = Token.objects.create(name="bch", tokenid="")
+        self.outputs = Transaction.objects.bulk_create([
+            Transaction(
+                txid=TXID,
+                index=index,
+                address=address,
+                wallet=wallet,
+                value=1000,
+                token=bch,
+                source="test",
+                spending_txid="",
+            )
+            for index in range(2)
+        ])
+
+    def tearDown(self):
+        get_invalidation_buffer().reset()
+
+    def test_spending_txid_set_after_marked_by_id(self):
+        # rows of older deployments have a NULL spending txid
+        with connection.cursor() as cursor:
+            cursor.execute("ALTER TABLE main_transaction ALTER COLUMN spending_txid DROP NOT NULL")
+        Transaction.objects.filter(index=1).update(spending_txid=None)
+
+        ids = [txn.id for txn in self.outputs]
+        self.assertEqual(sorted(mark_transaction_ids_spent(ids)["transaction_ids"]), ids)
+        self.assertEqual(get_invalidation_buffer().last_address_indexes, {"wallet_a"})
+
+        result = mark_outpoints_spent([(TXID, 0, SPENDING_TXID), (TXID, 1, SPENDING_TXID)])
+        self.assertEqual(sorted(result["transaction_ids"]), ids)
+        self.assertEqual(
+            list(Transaction.objects.order_by("index").values_list("spent", "spending_txid")),
+            [(True, SPENDING_TXID), (True, SPENDING_TXID)],
+        )
+
+        # already spent by the same tx
+        self.assertEqual(mark_outpoints_spent([(TXID, 0, SPENDING_TXID)])["transaction_ids"], [])
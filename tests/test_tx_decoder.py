@@ -0,0 +1,98 @@
+from django.test import SimpleTestCase, override_settings
+
+from main.utils.tx_decoder import (
+    calc_txid,
+    decode_raw_transaction,
+    decode_transaction,
+    get_input_outpoints,
+    hash160,
+    input_locking_bytecodes,
+    locking_bytecode_to_address,
+    p2pkh_locking_bytecode,
+    p2sh_locking_bytecode,
+)
+
+# Genesis coinbase transaction
+GENESIS_TX_HEX = (
+    "01000000010000000000000000000000000000000000000000000000000000000000000000ffffffff4d04ffff001d01"
+    "04455468652054696d65732030332f4a616e2f32303039204368616e63656c6c6f72206f6e206272696e6b206f6620"
+    "7365636f6e64206261696c6f757420666f722062616e6b73ffffffff0100f2052a01000000434104678afdb0fe5548"
+    "271967f1a67130b7105cd6a828e03909a67962e0ea1f61deb649f6bc3f4cef38c4f35504e51ec112de5c384df7ba0b"
+    "8d578a4c702b6bf11d5fac00000000"
+)
+GENESIS_TXID = "4a5e1e4baab89f3a32518a88c31bc87f618f76673e2cc77ab2127b7afdeda33b"
+
+# cashaddr spec test vector
+HASH160 = bytes.fromhex("76a04053bda0a88bda5177b86a15c3b29f559873")
+P2PKH_ADDRESS = "bitcoincash:qpm2qsznhks23z7629mms6s4cwef74vcwvy22gdx6a"
+P2SH_ADDRESS = "bitcoincash:ppm2qsznhks23z7629mms6s4cwef74vcwvn0h829pq"
+
+
+def _serialize_tx(inputs, outputs):
+    raw = (2).to_bytes(4, "little") + bytes([len(inputs)])
+    for prev_hash, vout, script_sig in inputs:
+        raw += prev_hash + vout.to_bytes(4, "little") + bytes([len(script_sig)]) + script_sig + b"\xff" * 4
+    raw += bytes([len(outputs)])
+    for value, script in outputs:
+        raw += value.to_bytes(8, "little") + bytes([len(script)]) + script
+    return raw + bytes(4)
+
+
+@override_settings(BCH_NETWORK="mainnet")
+class TxDecoderTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.pubkey = bytes.fromhex("02" + "11" * 32)
+        self.script_sig = bytes([71]) + b"\x30" * 71 + bytes([33]) + self.pubkey
+        self.token_prefix = (
+            bytes([0xef]) + bytes(range(32)) +
+            bytes([0x10 | 0x20 | 0x40 | 0x02]) +  # amount, nft, commitment, minting
+            bytes([2]) + b"hi" +
+            bytes([0xfd, 0xe8, 0x03])  # 1000
+        )
+        self.locking_bytecode = p2pkh_locking_bytecode(HASH160)
+        self.raw_tx = _serialize_tx(
+            [(b"\x22" * 32, 1, self.script_sig)],
+            [
+                (1000, self.locking_bytecode),
+                (800, self.token_prefix + p2sh_locking_bytecode(HASH160)),
+                (0, bytes([0x6a, 4]) + b"test"),
+            ],
+        )
+
+    def test_genesis_txid(self):
+        tx = decode_raw_transaction(GENESIS_TX_HEX)
+        self.assertEqual(tx["txid"], GENESIS_TXID)
+        self.assertEqual(calc_txid(GENESIS_TX_HEX), GENESIS_TXID)
+        self.assertEqual(tx["outputs"][0]["value"], 5000000000)
+        self.assertIn("script", tx["outputs"][0])
+        self.assertEqual(get_input_outpoints(GENESIS_TX_HEX), [])
+
+    def test_addresses(self):
+        self.assertEqual(locking_bytecode_to_address(p2pkh_locking_bytecode(HASH160)), P2PKH_ADDRESS)
+        self.assertEqual(locking_bytecode_to_address(p2sh_locking_bytecode(HASH160)), P2SH_ADDRESS)
+        self.assertIsNone(locking_bytecode_to_address(bytes([0x6a])))
+
+    def test_outputs(self):
+        tx = decode_raw_transaction(self.raw_tx.hex())
+        self.assertEqual(tx["inputs"], [{"txid": "22" * 32, "vout": 1}])
+        self.assertEqual(tx["outputs"], [
+            {"index": 0, "token_data": None, "value": 1000, "address": P2PKH_ADDRESS},
+            {
+                "index": 1,
+                "token_data": {
+                    "category": bytes(range(32))[::-1].hex(),
+                    "amount": "1000",
+                    "nft": {"capability": "minting", "commitment": "6869"},
+                },
+                "value": 800,
+                "address": P2SH_ADDRESS,
+            },
+            {"index": 2, "token_data": None, "value": 0, "op_return": "0474657374"},
+        ])
+
+    def test_input_locking_bytecodes(self):
+        tx = decode_transaction(self.raw_tx)
+        candidates = input_locking_bytecodes(tx["inputs"][0]["script_sig"])
+        self.assertIn(p2pkh_locking_bytecode(hash160(self.pubkey)), candidates)
+        self.assertEqual(tx["outputs"][1]["locking_bytecode"], p2sh_locking_bytecode(HASH160))
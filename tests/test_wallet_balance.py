@@ -0,0 +1,106 @@
+from importlib import import_module
+
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from main.models import (
+    Address,
+    CashFungibleToken,
+    CashNonFungibleToken,
+    Project,
+    Token,
+    Transaction,
+    Wallet,
+    WalletBalance,
+)
+from main.utils.wallet_balance import get_wallet_balance, reconcile_wallet_balances
+
+# test_settings disables migrations, the triggers are installed by each test
+walletbalance = import_module('main.migrations.0136_walletbalance_counted_rows')
+
+
+class WalletBalanceTriggerTestCase(TestCase):
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute(walletbalance.CREATE_TRIGGERS_SQL)
+
+        self.project = Project.objects.create(name="paytaca")
+        self.bch = Token.objects.create(name="bch", tokenid="")
+        self.ct = Token.objects.create(tokenid="wt_cashtoken_token_id")
+        self.slp = Token.objects.create(name="spice", tokenid="s" * 64)
+        self.category = "c" * 64
+        self.ft = CashFungibleToken.objects.create(category=self.category)
+        self.nft = CashNonFungibleToken.objects.create(
+            category=self.category,
+            capability="none",
+            current_txid="a" * 64,
+            current_index=0,
+        )
+        self.wallet = Wallet.objects.create(wallet_hash="wallet_a", wallet_type="bch", version=2, project=self.project)
+        self.address = Address.objects.create(
+            address="bitcoincash:q0",
+            address_path="0/0",
+            wallet=self.wallet,
+            project=self.project,
+        )
+        self.index = 0
+
+    def _create_txn(self, value, token=None, **kwargs):
+        self.index += 1
+        return Transaction.objects.create(
+            txid="a" * 64,
+            index=self.index,
+            address=self.address,
+            wallet=self.wallet,
+            value=value,
+            token=token or self.bch,
+            source="test",
+            spending_txid="",
+            **kwargs,
+        )
+
+    def test_insert(self):
+        self._create_txn(1000)
+        self._create_txn(2000)
+        self._create_txn(1000, token=self.ct, cashtoken_ft=self.ft, amount=50)
+        self._create_txn(1000, token=self.slp, amount=7)
+
+        self.assertEqual(get_wallet_balance(self.wallet), (3000, 0, 2))
+        self.assertEqual(get_wallet_balance(self.wallet, WalletBalance.cashtoken_asset(self.category)), (1000, 50, 1))
+        self.assertEqual(get_wallet_balance(self.wallet, f"slp/{self.slp.tokenid}"), (1000, 7, 1))
+
+    @override_settings(WT_DEFAULT_CASHTOKEN_ID="another_cashtoken_token_id")
+    def test_nft_only_outputs_not_counted(self):
+        self._create_txn(1000, token=self.ct, cashtoken_nft=self.nft)
+        self.assertFalse(WalletBalance.objects.filter(wallet=self.wallet).exists())
+
+    def test_spend(self):
+        txn = self._create_txn(1000)
+        self._create_txn(2000)
+        Transaction.objects.filter(id=txn.id).update(spent=True, spending_txid="b" * 64)
+        self.assertEqual(get_wallet_balance(self.wallet), (2000, 0, 1))
+
+    def test_amount_update(self):
+        txn = self._create_txn(1000, token=self.ct, cashtoken_ft=self.ft, amount=50)
+        Transaction.objects.filter(id=txn.id).update(amount=80)
+        self.assertEqual(get_wallet_balance(self.wallet, WalletBalance.cashtoken_asset(self.category)), (1000, 80, 1))
+
+    def test_delete(self):
+        txn = self._create_txn(1000)
+        self._create_txn(2000)
+        Transaction.objects.filter(id=txn.id).delete()
+        self.assertEqual(get_wallet_balance(self.wallet), (2000, 0, 1))
+
+    def test_reconcile(self):
+        self._create_txn(1000)
+        self._create_txn(1000, token=self.ct, cashtoken_ft=self.ft, amount=50)
+        self.assertEqual(reconcile_wallet_balances([self.wallet.id]), [])
+
+        WalletBalance.objects.filter(wallet=self.wallet, asset=WalletBalance.ASSET_BCH).update(value=5, utxo_count=3)
+        self.assertEqual(reconcile_wallet_balances([self.wallet.id], fix=False), [self.wallet.id])
+        self.assertEqual(get_wallet_balance(self.wallet), (5, 0, 3))
+
+        self.assertEqual(reconcile_wallet_balances([self.wallet.id]), [self.wallet.id])
+        self.assertEqual(get_wallet_balance(self.wallet), (1000, 0, 1))
+        self.assertEqual(reconcile_wallet_balances([self.wallet.id]), [])
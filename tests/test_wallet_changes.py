@@ -0,0 +1,121 @@
+from datetime import timedelta
+from importlib import import_module
+
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from main.models import (
+    Address,
+    Project,
+    Token,
+    Transaction,
+    Wallet,
+    WalletChange,
+    WalletChangeSequence,
+)
+from main.utils.wallet_changes import get_wallet_changes, prune_wallet_changes
+
+# test_settings disables migrations, the triggers are installed by each test
+walletchange = import_module('main.migrations.0135_walletchange')
+
+TXID = "a" * 64
+
+
+class WalletChangesTestCase(TestCase):
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            for table in walletchange.TABLES:
+                cursor.execute(walletchange.create_triggers_sql(*table))
+
+        self.project = Project.objects.create(name="paytaca")
+        self.bch = Token.objects.create(name="bch", tokenid="")
+        self.wallet = Wallet.objects.create(wallet_hash="wallet_a", wallet_type="bch", version=2, project=self.project)
+        self.other_wallet = Wallet.objects.create(wallet_hash="wallet_b", wallet_type="bch", version=2, project=self.project)
+        self.address = Address.objects.create(
+            address="bitcoincash:q0",
+            address_path="0/0",
+            wallet=self.wallet,
+            project=self.project,
+        )
+        self.index = 0
+
+    def _txn(self, value=1000, wallet=None):
+        self.index += 1
+        return Transaction(
+            txid=TXID,
+            index=self.index,
+            address=self.address,
+            wallet=wallet or self.wallet,
+            value=value,
+            token=self.bch,
+            source="test",
+            spending_txid="",
+        )
+
+    def _sequence(self, wallet=None):
+        return WalletChangeSequence.objects.get(wallet=wallet or self.wallet).sequence
+
+    def test_one_sequence_per_statement(self):
+        first, second = Transaction.objects.bulk_create([self._txn(), self._txn()])
+        self.assertEqual(self._sequence(), 1)
+        self.assertEqual(
+            set(WalletChange.objects.filter(wallet=self.wallet, sequence=1).values_list("object_id", "key", "deleted")),
+            { (first.id, f"{TXID}:1", False), (second.id, f"{TXID}:2", False) },
+        )
+
+        Transaction.objects.filter(id=first.id).update(spent=True, spending_txid="b" * 64)
+        self.assertEqual(self._sequence(), 2)
+        self.assertEqual(
+            list(WalletChange.objects.filter(wallet=self.wallet, sequence=2).values_list("object_id", "deleted")),
+            [(first.id, False)],
+        )
+
+    def test_moved_and_deleted_rows(self):
+        txn = self._txn()
+        txn.save()
+        Transaction.objects.filter(id=txn.id).update(wallet=self.other_wallet)
+        self.assertTrue(WalletChange.objects.filter(wallet=self.wallet, object_id=txn.id, deleted=True).exists())
+        self.assertTrue(WalletChange.objects.filter(wallet=self.other_wallet, object_id=txn.id, deleted=False).exists())
+
+        Transaction.objects.filter(id=txn.id).delete()
+        self.assertEqual(self._sequence(self.other_wallet), 2)
+        self.assertTrue(WalletChange.objects.filter(wallet=self.other_wallet, sequence=2, deleted=True).exists())
+
+    def test_paging_keeps_sequences_whole(self):
+        Transaction.objects.bulk_create([self._txn(), self._txn()])
+        self._txn().save()
+        self._txn().save()
+
+        changes, sequence, has_more, reset = get_wallet_changes(self.wallet, 0, 3)
+        # the page ends before the third sequence rather than splitting one
+        self.assertEqual((len(changes), sequence, has_more, reset), (3, 2, True, False))
+
+        changes, sequence, has_more, reset = get_wallet_changes(self.wallet, sequence, 3)
+        self.assertEqual((len(changes), sequence, has_more, reset), (1, 3, False, False))
+
+        # a sequence larger than the limit is read whole
+        changes, sequence, has_more, _ = get_wallet_changes(self.wallet, 0, 1)
+        self.assertEqual((len(changes), sequence, has_more), (2, 1, True))
+
+    def test_reset(self):
+        self._txn().save()
+        self.assertEqual(get_wallet_changes(self.wallet, None, 10)[1:], (1, False, True))
+        self.assertTrue(get_wallet_changes(self.wallet, 5, 10)[3])
+
+        WalletChange.objects.update(date_created=timezone.now() - timedelta(days=30))
+        self.assertEqual(prune_wallet_changes(retention_days=7), 1)
+        self._txn().save()
+        self.assertTrue(get_wallet_changes(self.wallet, 0, 10)[3])
+        self.assertEqual(get_wallet_changes(self.wallet, 1, 10)[1:], (2, False, False))
+
+    def test_dust_reported_as_removed(self):
+        Transaction.objects.bulk_create([self._txn(value=5000), self._txn(value=546)])
+
+        url = reverse("wallet-changes", kwargs={ "wallethash": self.wallet.wallet_hash })
+        data = APIClient().get(url, { "since": 0 }).json()
+        self.assertEqual([utxo["vout"] for utxo in data["utxos"]], [1])
+        self.assertEqual(data["removed_utxos"], [{ "txid": TXID, "vout": 2 }])